@@ -1,9 +1,10 @@
 from dataclasses import dataclass
 from pathlib import Path
-from typing import Iterable
+from typing import IO, Iterable, Iterator, Optional, Tuple
 
 from tqdm import tqdm
 
+from ..bloom import BloomFilter
 from ..transformers import TracerouteFlatIPTransformer
 
 
@@ -16,16 +17,49 @@ class KaparFormatter:
             insert_none=True,
         )
 
-    def format_record(self, record: dict) -> str:
+    def format_path(self, record: dict) -> Tuple[str, str]:
+        """Return the (flattened) IP path of a record, and the corresponding trace."""
         record = self.transformer(record)
+        path = "\n".join(replies[0] or "0.0.0.0" for replies in record["hops"])
         # See kapar/lib/PathLoader.cc#436 for the format of the comment line.
-        lines = [f"# trace: {record['from']} -> {record['dst_addr']}"]
-        for replies in record["hops"]:
-            lines.append(replies[0] or "0.0.0.0")
-        return "\n".join(lines)
+        comment = f"# trace: {record['from']} -> {record['dst_addr']}"
+        return path, f"{comment}\n{path}" if path else comment
 
-    def format_records(self, records: Iterable[dict], progress: bool = False) -> str:
-        lines = []
+    def format_record(self, record: dict) -> str:
+        return self.format_path(record)[1]
+
+    def iter_records(
+        self,
+        records: Iterable[dict],
+        seen: Optional[BloomFilter] = None,
+        progress: bool = False,
+    ) -> Iterator[str]:
+        """
+        Format the records one by one.
+        If `seen` is specified, the traces whose path has already been seen are dropped.
+        """
         for record in tqdm(records, disable=not progress, desc="KaparFormatter"):
-            lines.append(self.format_record(record))
-        return "\n".join(lines)
+            path, trace = self.format_path(record)
+            if seen is None or seen.add(path):
+                yield trace
+
+    def format_records(self, records: Iterable[dict], progress: bool = False) -> str:
+        return "\n".join(self.iter_records(records, progress=progress))
+
+    def write_records(
+        self,
+        records: Iterable[dict],
+        file: IO[str],
+        seen: Optional[BloomFilter] = None,
+        progress: bool = False,
+    ) -> int:
+        """
+        Stream the formatted records to `file`, without keeping them in memory.
+        Returns the number of traces written.
+        """
+        n = 0
+        for trace in self.iter_records(records, seen, progress):
+            file.write(trace)
+            file.write("\n")
+            n += 1
+        return n
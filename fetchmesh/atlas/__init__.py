@@ -1,2 +1,3 @@
 from .client import *
 from .objects import *
+from .store import *
@@ -1,20 +1,35 @@
 import json
 import logging
+import threading
 from concurrent.futures import ThreadPoolExecutor, as_completed
 from math import ceil
 from urllib.parse import urlencode
 
 import requests
-from mbox.cache import Cache
+from requests.adapters import HTTPAdapter
+from tenacity import (
+    before_sleep_log,
+    retry,
+    retry_if_exception,
+    stop_after_attempt,
+    wait_random,
+)
 from tqdm import tqdm
 
+from ..cache import HTTPCache
+from ..controller import CONGESTION_STATUSES, is_congestion
+
 ATLAS_API_URL = "https://atlas.ripe.net/api/v2"
 
+log = logging.getLogger(__name__)
+
 
 class BaseAtlasClient:
     """
     `requests` wrapper for the Atlas API.
-    Handles caching, and concurrent requests for paginated results.
+    Handles caching, connection pooling, and concurrent requests for paginated results.
+    Requests are retried on throttling (429), server errors (5xx) and timeouts, and
+    can be paced by an (optional) :any:`AIMDController`.
     """
 
     def __init__(
@@ -24,60 +39,131 @@ class BaseAtlasClient:
         progress=True,
         threads=4,
         timeout=15,
+        controller=None,
     ):
         self.base_url = base_url
         self.page_size = page_size
         self.progress = progress
         self.threads = threads
         self.timeout = timeout
+        self.controller = controller
         self.logger = logging.getLogger(__name__)
-        self.cache = Cache("fetchmesh")
+        self.cache = HTTPCache()
+        self._init_session()
+
+    def _init_session(self):
+        # A `Session` is not guaranteed to be thread-safe, so we keep one session
+        # per thread, but they all share the same adapter, and hence the same
+        # connection pool (urllib3 pools are thread-safe).
+        self._adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.threads)
+        self._local = threading.local()
+
+    def __getstate__(self):
+        # Sessions and thread-locals cannot be pickled, we recreate them in
+        # the target process (e.g. when the client is sent to a worker process).
+        state = self.__dict__.copy()
+        del state["_adapter"]
+        del state["_local"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._init_session()
+
+    @property
+    def session(self) -> requests.Session:
+        """Session of the calling thread."""
+        session = getattr(self._local, "session", None)
+        if session is None:
+            session = requests.Session()
+            session.mount("http://", self._adapter)
+            session.mount("https://", self._adapter)
+            self._local.session = session
+        return session
 
     def encode_url(self, url, params):
         return f"{url}?{urlencode(params)}"
 
-    def get(self, endpoint, params, **kwargs):
+    def request(self, url, **kwargs):
+        """
+        GET `url` with the session of the calling thread.
+        Raise an `HTTPError` if the API is throttling us, or is overloaded.
+        """
+        r = self.session.get(url, timeout=self.timeout, **kwargs)
+        if r.status_code in CONGESTION_STATUSES:
+            r.raise_for_status()
+        return r
+
+    @retry(
+        reraise=True,
+        before_sleep=before_sleep_log(log, logging.WARN),
+        retry=retry_if_exception(is_congestion),
+        stop=stop_after_attempt(5),
+        wait=wait_random(min=1, max=2),
+    )
+    def get(self, endpoint, params, cache=True, **kwargs):
         url = f"{self.base_url}/{self.encode_url(endpoint, params)}"
-        f = lambda: requests.get(url, timeout=self.timeout, **kwargs)
+        f = lambda headers: self.request(url, headers=headers, **kwargs)
+        if self.controller is not None:
+            f = lambda headers: self.request_controlled(url, headers=headers, **kwargs)
+        if not cache:
+            return f({})
         return self.cache.get(url, f)
 
-    def get_one(self, endpoint, params={}):
+    def request_controlled(self, url, **kwargs):
+        with self.controller.slot():
+            return self.request(url, **kwargs)
+
+    def get_one(self, endpoint, params={}, cache=True):
         params = {**params, "page_size": self.page_size}
-        obj = self.get(endpoint, params).json()
+        obj = self.get(endpoint, params, cache).json()
         return obj["results"], obj["count"]
 
-    def get_all(self, endpoint, params={}):
-        results, total = self.get_one(endpoint, params)
-
-        if len(results) < total:
+    def iter_pages(self, endpoint, params={}, cache=True):
+        """
+        Yield the pages of results as they are received.
+        The first page is always yielded first, the next pages are yielded
+        in completion order, while the remaining ones are still being fetched.
+        """
+        results, total = self.get_one(endpoint, params, cache)
+        seen = {x["id"] for x in results}
+        count = len(results)
+        yield results
+
+        if 0 < len(results) < total:
             pages = ceil(total / len(results))
             queue = [(endpoint, {**params, "page": i}) for i in range(2, pages + 1)]
             workers = min(self.threads, len(queue))
 
             with ThreadPoolExecutor(workers) as executor:
-                fn = lambda x: self.get_one(*x)
+                fn = lambda x: self.get_one(*x, cache)
                 futures = as_completed(executor.submit(fn, x) for x in queue)
                 if self.progress:
                     futures = tqdm(futures, desc=endpoint, total=len(queue))
                 for future in futures:
                     res, _ = future.result()
-                    results.extend(res)
+                    seen.update(x["id"] for x in res)
+                    count += len(res)
+                    yield res
 
-        distinct = {x["id"] for x in results}
-        if len(distinct) != len(results):
+        if len(seen) != count:
             self.logger.warning(
-                "Unexpected number of results: %s vs %s", len(distinct), len(results)
+                "Unexpected number of results: %s vs %s", len(seen), count
             )
 
+    def get_all(self, endpoint, params={}, cache=True):
+        results = []
+        for page in self.iter_pages(endpoint, params, cache):
+            results.extend(page)
         return results
 
 
 class AtlasClient(BaseAtlasClient):
-    def fetch_anchors(self):
-        return self.get_all("anchors")
+    def fetch_anchors(self, cache=True):
+        return self.get_all("anchors", cache=cache)
 
-    def fetch_measurements(self, params):
-        return self.get_all("measurements", params)
+    def fetch_measurements(self, params, cache=True):
+        return self.get_all("measurements", params, cache)
 
     # This endpoint is currently broken, it returns random
     # results. Email sent to Atlas support on 2020/02/17.
@@ -87,31 +173,50 @@ class AtlasClient(BaseAtlasClient):
 
     # Alternative way to get the same results
     # as the /anchor-measurements endpoint.
-    def fetch_anchoring_measurements(self):
-        anchors = self.fetch_anchors()
-        measurements = self.fetch_measurements(
-            {"description__startswith": "Anchoring Mesh Measurement:"}
-        )
+    def fetch_anchoring_measurements(self, store=None):
+        """
+        If `store` (a :any:`MeasurementStore`) is specified, the measurements
+        are synced incrementally in the store, instead of being downloaded
+        entirely, and the anchors are not taken from the cache.
+        """
+        return list(self.iter_anchoring_measurements(store))
+
+    def iter_anchoring_measurements(self, store=None):
+        """
+        Same as :any:`fetch_anchoring_measurements`, but yield the results
+        as the pages of measurements are received.
+        """
+        params = {"description__startswith": "Anchoring Mesh Measurement:"}
+        if store is not None:
+            anchors = self.fetch_anchors(cache=False)
+            report = store.sync(self, params)
+            self.logger.info("Measurements store: %s", report)
+            pages = [store.values()]
+        else:
+            anchors = self.fetch_anchors()
+            pages = self.iter_pages("measurements", params)
 
         targets = {x["fqdn"]: x for x in anchors}
-        results = []
         missing = set()
 
-        for x in measurements:
-            if not x["target"] in targets:
-                missing.add(x["target"])
-                continue
-            target = targets[x["target"]]
-            results.append({"measurement": x, "target": target})
+        for page in pages:
+            for x in page:
+                if not x["target"] in targets:
+                    missing.add(x["target"])
+                    continue
+                target = targets[x["target"]]
+                yield {"measurement": x, "target": target}
 
         if len(missing) > 0:
             self.logger.warning("%s targets not found: %s", len(missing), missing)
 
-        return results
-
     def fetch_results_stream(self, path):
+        """
+        Stream the results at `path`.
+        Raise an `HTTPError` on throttling or server errors, so that the caller can retry.
+        """
         url = self.base_url + path
-        r = requests.get(url, stream=True, timeout=self.timeout)
+        r = self.request(url, stream=True)
         if r.status_code != 200:
             self.logger.warning("%s status for GET %s", r.status_code, url)
             return []
@@ -0,0 +1,148 @@
+import json
+import logging
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Union
+
+from appdirs import user_data_dir
+
+from .objects import MeasurementStatus
+
+DEFAULT_STORE_FILE = Path(user_data_dir("fetchmesh")) / "measurements.json"
+
+# Measurements in these states may still change without their stop time changing,
+# so we ask for them explicitly by ID on each sync.
+PENDING_STATUSES = {
+    MeasurementStatus.Specified.value,
+    MeasurementStatus.Scheduled.value,
+}
+
+
+@dataclass
+class SyncReport:
+    """Summary of the changes applied to a :any:`MeasurementStore` by a sync."""
+
+    added: List[int] = field(default_factory=list)
+    """IDs of the measurements that were not in the store."""
+
+    updated: List[int] = field(default_factory=list)
+    """IDs of the measurements whose metadata has changed."""
+
+    unchanged: int = 0
+    """Number of measurements returned by the API that did not change."""
+
+    full: bool = False
+    """Whether the store was empty and all the measurements were downloaded."""
+
+    def __str__(self):
+        return "{} added, {} updated, {} unchanged{}".format(
+            len(self.added),
+            len(self.updated),
+            self.unchanged,
+            " (full sync)" if self.full else "",
+        )
+
+
+class MeasurementStore:
+    """
+    Local copy of the Atlas measurements metadata, keyed by measurement ID,
+    and kept up-to-date incrementally.
+
+    On the first sync all the measurements matching `params` are downloaded.
+    On the next syncs, only the measurements that may have changed are requested:
+
+    - measurements created since the last sync (``id__gt``),
+    - measurements stopped since the last sync (``stop_time__gte``),
+    - measurements that were not yet started (``id__in``).
+
+    .. code-block:: python
+
+        from fetchmesh.atlas import AtlasClient, MeasurementStore
+
+        store = MeasurementStore()
+        params = {"description__startswith": "Anchoring Mesh Measurement:"}
+        report = store.sync(AtlasClient(), params)
+        print(report)
+        # 12 added, 3 updated, 54 unchanged
+    """
+
+    def __init__(self, file: Union[Path, str] = DEFAULT_STORE_FILE):
+        self.file = Path(file)
+        self.logger = logging.getLogger(__name__)
+        self.last_sync: Optional[int] = None
+        self.measurements: Dict[int, dict] = {}
+        if self.file.exists():
+            self.load()
+
+    def __len__(self):
+        return len(self.measurements)
+
+    def __contains__(self, msm_id):
+        return msm_id in self.measurements
+
+    def __getitem__(self, msm_id):
+        return self.measurements[msm_id]
+
+    def values(self) -> List[dict]:
+        return list(self.measurements.values())
+
+    def load(self):
+        with self.file.open() as f:
+            obj = json.load(f)
+        self.last_sync = obj["last_sync"]
+        self.measurements = {int(k): v for k, v in obj["measurements"].items()}
+
+    def save(self):
+        self.file.parent.mkdir(exist_ok=True, parents=True)
+        tmp = self.file.with_suffix(self.file.suffix + ".tmp")
+        with tmp.open("w") as f:
+            obj = {"last_sync": self.last_sync, "measurements": self.measurements}
+            json.dump(obj, f)
+        tmp.replace(self.file)
+
+    def upsert(self, measurements: Iterable[dict], report: SyncReport):
+        for x in measurements:
+            prev = self.measurements.get(x["id"])
+            if prev is None:
+                report.added.append(x["id"])
+            elif prev != x:
+                report.updated.append(x["id"])
+            else:
+                report.unchanged += 1
+                continue
+            self.measurements[x["id"]] = x
+
+    def sync(self, client, params: dict, chunk_size: int = 500) -> SyncReport:
+        """
+        Fetch the measurements matching `params` that changed since the last sync,
+        and update the store. `client` is an :any:`AtlasClient`.
+        """
+        report = SyncReport()
+        # We take the time *before* the requests, so that measurements
+        # stopped while we are syncing are picked up by the next sync.
+        now = int(time.time())
+
+        if self.last_sync is None or not self.measurements:
+            report.full = True
+            self.upsert(client.fetch_measurements(params, cache=False), report)
+        else:
+            queries = [
+                {**params, "id__gt": max(self.measurements)},
+                {**params, "stop_time__gte": self.last_sync},
+            ]
+            pending = sorted(
+                k
+                for k, v in self.measurements.items()
+                if v["status"]["id"] in PENDING_STATUSES
+            )
+            for i in range(0, len(pending), chunk_size):
+                ids = ",".join(str(x) for x in pending[i : i + chunk_size])
+                queries.append({**params, "id__in": ids})
+            for query in queries:
+                self.upsert(client.fetch_measurements(query, cache=False), report)
+
+        self.last_sync = now
+        self.save()
+        self.logger.info("Synced %s: %s", self.file, report)
+        return report
@@ -1,3 +1,6 @@
 from .asnames import *
 from .asndb import *
 from .collectors import *
+from .download import *
+from .snapshots import *
+from .table import *
@@ -2,10 +2,11 @@ from dataclasses import dataclass
 from pathlib import Path
 from typing import Mapping
 
-from mbox.cache import Cache
 from mbox.requests import FTPAdapter
 from requests import Session
 
+from ..cache import HTTPCache
+
 DEFAULT_NAMES_URL = "ftp://ftp.ripe.net/ripe/asnames/asn.txt"
 
 
@@ -31,13 +32,12 @@ class ASNames:
         session = Session()
         session.mount("ftp://", FTPAdapter())
 
-        def fn():
-            res = session.get(url, timeout=15)
-            res.encoding = "ISO8859-1"
+        def fn(headers):
+            res = session.get(url, headers=headers, timeout=15)
             res.raise_for_status()
-            return res.text
+            return res
 
-        cache = Cache("fetchmesh")
-        content = cache.get(url, fn)
+        res = HTTPCache().get(url, fn)
+        res.encoding = "ISO8859-1"
 
-        return cls.from_str(content)
+        return cls.from_str(res.text)
@@ -2,12 +2,18 @@
 # - https://github.com/hadiasghari/pyasn
 # - https://github.com/maxmouchet/goasn
 # Handles multiple origin ASes (from goasn)
+import time
 from io import TextIOWrapper
+from pathlib import Path
+from typing import Optional, Union
 
 from mbox.magic import CompressionFormat, detect_compression
 from radix import Radix
 from zstandard import ZstdDecompressor
 
+from .mrt import rib_origins
+from .table import PrefixTable
+
 
 class ASNDB:
     def __init__(self, data):
@@ -23,6 +29,42 @@ class ASNDB:
             rnode.data["origins"] = origins
         return rtree
 
+    def prefix_table(self) -> PrefixTable:
+        """
+        Return a compiled longest-prefix-match table, mapping addresses to origin ASes.
+        Much faster to build and to query than :meth:`radix_tree`.
+        """
+        return PrefixTable.from_prefixes(self._data)
+
+    def compile(self, file: Union[Path, str]) -> Path:
+        """Compile the database into a memory-mappable :any:`PrefixTable` stored in `file`."""
+        file = Path(file)
+        self.prefix_table().save(file)
+        return file
+
+    def to_file(self, file: Union[Path, str], source: str = ""):
+        """Write the database in the pyasn format."""
+        v6 = sum(1 for prefix, _ in self._data if ":" in prefix)
+        with open(file, "w") as f:
+            f.write("; IP-ASN32-DAT file\n")
+            f.write(f"; Original source:\t{source}\n")
+            f.write(f"; Converted on:\t{time.asctime()}\n")
+            f.write(f"; Prefixes-v4:\t{len(self._data) - v6}\n")
+            f.write(f"; Prefixes-v6:\t{v6}\n")
+            f.write(";\n")
+            for prefix, origins in self._data:
+                f.write("{}\t{}\n".format(prefix, ",".join(str(x) for x in origins)))
+
+    @classmethod
+    def from_rib(
+        cls, file: Union[Path, str], processes: Optional[int] = None
+    ) -> "ASNDB":
+        """
+        Build the database from an MRT ``TABLE_DUMP_V2`` file (e.g. a RIS bview
+        or a RouteViews RIB), without external tools. See :any:`rib_origins`.
+        """
+        return cls(rib_origins(file, processes))
+
     @classmethod
     def from_file(cls, file):
         data = []
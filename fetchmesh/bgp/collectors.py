@@ -3,10 +3,9 @@ from abc import ABC, abstractmethod
 from dataclasses import dataclass
 from datetime import datetime
 from pathlib import Path
-from shutil import copyfileobj
 from typing import Optional, Union
 
-import requests
+from .download import RIBDownloader
 
 
 class Collector(ABC):
@@ -52,12 +51,11 @@ class Collector(ABC):
         Download the Routing Information Base (RIB) at time `t` in `directory`.
         """
         file = Path(directory) / (name or self.table_name(t))
-        # TODO: Show progress
-        if not file.exists():
-            r = requests.get(self.table_url(t), stream=True, timeout=15)
-            r.raise_for_status()
-            with file.open("wb") as f:
-                copyfileobj(r.raw, f)
+        # The file is downloaded to a `.part` file, which is renamed only when complete,
+        # so that an interrupted download is resumed instead of being treated as complete.
+        report = RIBDownloader(threads=1).download([(self.table_url(t), file)])
+        if report.failed:
+            raise IOError(f"Failed to download {self.table_url(t)}")
         return file
 
     @classmethod
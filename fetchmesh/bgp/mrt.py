@@ -0,0 +1,204 @@
+"""
+Streaming parser for MRT ``TABLE_DUMP_V2`` files (RFC 6396), as produced by RIS and RouteViews.
+
+Only the information needed to build IP-to-ASN tables is extracted:
+the prefixes, and the origin ASes of their paths.
+The decompression and the framing of the records are done in the main process,
+and the records are parsed by chunks in worker processes.
+"""
+
+import bz2
+import gzip
+import os
+import struct
+from collections import Counter, defaultdict
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from pathlib import Path
+from socket import AF_INET, AF_INET6, inet_ntop
+from typing import BinaryIO, Dict, Iterator, List, Optional, Tuple, Union
+
+from zstandard import ZstdDecompressor
+
+TABLE_DUMP_V2 = 13
+
+# TABLE_DUMP_V2 subtypes: (address family, ADD-PATH)
+RIB_SUBTYPES = {
+    2: (AF_INET, False),  # RIB_IPV4_UNICAST
+    4: (AF_INET6, False),  # RIB_IPV6_UNICAST
+    8: (AF_INET, True),  # RIB_IPV4_UNICAST_ADDPATH (RFC 8050)
+    10: (AF_INET6, True),  # RIB_IPV6_UNICAST_ADDPATH (RFC 8050)
+}
+
+AS_PATH = 2
+AS_SET = 1
+AS_SEQUENCE = 2
+
+MRTHeader = struct.Struct(">IHHI")
+"""MRT common header: timestamp, type, subtype, length."""
+
+Prefix = Tuple[int, bytes, int]
+"""Address family, network address (packed), and length of a prefix."""
+
+Record = Tuple[int, bytes]
+"""Subtype and body of a RIB record."""
+
+
+def open_mrt(file: Union[Path, str]) -> BinaryIO:
+    """Open a (compressed) MRT file for streaming reads, based on its extension."""
+    file = Path(file)
+    if file.suffix == ".gz":
+        return gzip.open(file, "rb")  # type: ignore
+    if file.suffix == ".bz2":
+        return bz2.open(file, "rb")  # type: ignore
+    if file.suffix == ".zst":
+        f = file.open("rb")
+        return ZstdDecompressor().stream_reader(f, closefd=True)  # type: ignore
+    return file.open("rb")
+
+
+def read_records(f: BinaryIO) -> Iterator[Tuple[int, int, int, bytes]]:
+    """Yield the (timestamp, type, subtype, body) of each MRT record."""
+    while True:
+        header = f.read(MRTHeader.size)
+        if len(header) < MRTHeader.size:
+            return
+        timestamp, type_, subtype, length = MRTHeader.unpack(header)
+        body = f.read(length)
+        if len(body) < length:
+            # Truncated file
+            return
+        yield timestamp, type_, subtype, body
+
+
+def parse_origins(attributes: memoryview) -> List[int]:
+    """
+    Return the origin AS(es) of the ``AS_PATH`` attribute.
+    In TABLE_DUMP_V2 the ASes are always encoded on 4 bytes.
+    If the path ends with an ``AS_SET``, all the ASes of the set are origins.
+    """
+    offset = 0
+    while offset < len(attributes):
+        flags, type_ = attributes[offset], attributes[offset + 1]
+        if flags & 0x10:  # Extended length
+            (length,) = struct.unpack_from(">H", attributes, offset + 2)
+            offset += 4
+        else:
+            length = attributes[offset + 2]
+            offset += 3
+        if type_ == AS_PATH:
+            origins: List[int] = []
+            end = offset + length
+            while offset < end:
+                segment_type, count = attributes[offset], attributes[offset + 1]
+                asns = struct.unpack_from(f">{count}I", attributes, offset + 2)
+                offset += 2 + 4 * count
+                if segment_type == AS_SEQUENCE and asns:
+                    origins = [asns[-1]]
+                elif segment_type == AS_SET:
+                    origins = list(asns)
+            return origins
+        offset += length
+    return []
+
+
+def parse_rib(subtype: int, body: bytes) -> Tuple[Prefix, Counter]:
+    """Return the prefix of a RIB record, and the number of paths for each origin AS."""
+    af, addpath = RIB_SUBTYPES[subtype]
+    view = memoryview(body)
+    length = view[4]
+    size = (length + 7) // 8
+    width = 4 if af == AF_INET else 16
+    network = bytes(view[5 : 5 + size]).ljust(width, b"\0")
+    offset = 5 + size
+    (count,) = struct.unpack_from(">H", view, offset)
+    offset += 2
+    origins: Counter = Counter()
+    for _ in range(count):
+        # Peer index (2), originated time (4), path identifier (4, ADD-PATH only)
+        offset += 10 if addpath else 6
+        (attributes_length,) = struct.unpack_from(">H", view, offset)
+        offset += 2
+        attributes = view[offset : offset + attributes_length]
+        origins.update(parse_origins(attributes))
+        offset += attributes_length
+    return (af, network, length), origins
+
+
+def parse_chunk(records: List[Record]) -> Dict[Prefix, Counter]:
+    """Parse a chunk of RIB records (in a worker process)."""
+    result: Dict[Prefix, Counter] = defaultdict(Counter)
+    for subtype, body in records:
+        try:
+            prefix, origins = parse_rib(subtype, body)
+        except (IndexError, struct.error):
+            # Malformed record
+            continue
+        result[prefix].update(origins)
+    return result
+
+
+def format_prefix(prefix: Prefix) -> str:
+    af, network, length = prefix
+    return "{}/{}".format(inet_ntop(af, network), length)
+
+
+def rib_origins(
+    file: Union[Path, str],
+    processes: Optional[int] = None,
+    chunk_size: int = 4096,
+) -> List[Tuple[str, List[int]]]:
+    """
+    Extract the origin ASes of each prefix of a TABLE_DUMP_V2 file.
+    For multi-origin prefixes, the origins are sorted by decreasing number of paths.
+    The records are parsed by chunks of `chunk_size` in `processes` worker processes.
+    At most two chunks per worker are in-flight, so that the memory usage is bounded
+    by the number of prefixes, and not by the size of the file.
+
+    .. code-block:: python
+
+        from fetchmesh.bgp.mrt import rib_origins
+        rib_origins("bview.20190417.0800.gz")
+        # [('1.0.0.0/24', [13335]), ...]
+    """
+    origins: Dict[Prefix, Counter] = defaultdict(Counter)
+
+    def merge(future):
+        for prefix, counts in future.result().items():
+            origins[prefix].update(counts)
+
+    processes = processes or os.cpu_count() or 1
+    max_inflight = 2 * processes
+
+    with open_mrt(file) as f, ProcessPoolExecutor(processes) as executor:
+        inflight = set()
+        chunk: List[Record] = []
+        for _, type_, subtype, body in read_records(f):
+            if type_ != TABLE_DUMP_V2 or subtype not in RIB_SUBTYPES:
+                continue
+            chunk.append((subtype, body))
+            if len(chunk) < chunk_size:
+                continue
+            if len(inflight) >= max_inflight:
+                done, inflight = wait(inflight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    merge(future)
+            inflight.add(executor.submit(parse_chunk, chunk))
+            chunk = []
+        if chunk:
+            inflight.add(executor.submit(parse_chunk, chunk))
+        for future in inflight:
+            merge(future)
+
+    return [
+        (format_prefix(prefix), [asn for asn, _ in counts.most_common()])
+        for prefix, counts in sorted(origins.items())
+        if counts
+    ]
+
+
+def rib_timestamp(file: Union[Path, str]) -> Optional[int]:
+    """Return the timestamp of the first record of an MRT file (the dump time)."""
+    with open_mrt(file) as f:
+        for timestamp, _, _, _ in read_records(f):
+            return timestamp
+    return None
@@ -0,0 +1,92 @@
+import logging
+from bisect import bisect_left
+from collections import OrderedDict
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Union
+
+from .asndb import ASNDB
+from .table import PrefixTable
+
+
+class ASNSnapshots:
+    """
+    A collection of IP-to-ASN snapshots (e.g. one per hour or per day), stored in a directory.
+
+    The snapshots are identified by their :any:`IPASNMeta` filenames.
+    Compiled tables (``.tbl``, see :any:`PrefixTable`) are memory-mapped,
+    and are preferred over IPASN files, which are compiled in memory on load.
+    Snapshots are loaded on first use, and at most `max_loaded` snapshots are kept in memory
+    (the least recently used ones are released first).
+
+    .. code-block:: python
+
+        from fetchmesh.bgp import ASNSnapshots
+
+        snapshots = ASNSnapshots("ipasn/", max_loaded=4)
+        table = snapshots.nearest(datetime(2020, 1, 1, 8, 10, tzinfo=UTC))
+        table.lookup_first(["1.1.1.1"])
+    """
+
+    def __init__(self, directory: Union[Path, str], max_loaded: int = 4):
+        # `fetchmesh.meta` depends on this package.
+        from ..meta import IPASNMeta
+
+        self.directory = Path(directory)
+        self.max_loaded = max_loaded
+        self.logger = logging.getLogger(__name__)
+        self.loaded: Dict[Path, PrefixTable] = OrderedDict()
+
+        files: Dict[datetime, Path] = {}
+        for file in sorted(self.directory.iterdir()):
+            try:
+                meta = IPASNMeta.from_filename(file.name)
+            except Exception:
+                continue
+            # Compiled tables take precedence over text files.
+            if meta.datetime not in files or file.suffix == ".tbl":
+                files[meta.datetime] = file
+
+        self.datetimes: List[datetime] = sorted(files)
+        self.files: List[Path] = [files[x] for x in self.datetimes]
+
+    def __len__(self):
+        return len(self.files)
+
+    def __getstate__(self):
+        # The tables are reloaded on demand in the other processes.
+        state = self.__dict__.copy()
+        state["loaded"] = OrderedDict()
+        return state
+
+    def index(self, t: datetime) -> int:
+        """Index of the snapshot nearest to `t`."""
+        if not self.datetimes:
+            raise LookupError(f"No IPASN snapshots in {self.directory}")
+        i = bisect_left(self.datetimes, t)
+        if i == 0:
+            return 0
+        if i == len(self.datetimes):
+            return i - 1
+        before, after = self.datetimes[i - 1], self.datetimes[i]
+        return i - 1 if t - before <= after - t else i
+
+    def load(self, index: int) -> PrefixTable:
+        """Return the snapshot at `index`, loading it if needed."""
+        file = self.files[index]
+        if file in self.loaded:
+            self.loaded.move_to_end(file)  # type: ignore
+            return self.loaded[file]
+        self.logger.debug("Loading %s", file)
+        if file.suffix == ".tbl":
+            table = PrefixTable.load(file)
+        else:
+            table = ASNDB.from_file(file).prefix_table()
+        self.loaded[file] = table
+        while len(self.loaded) > self.max_loaded:
+            self.loaded.popitem(last=False)  # type: ignore
+        return table
+
+    def nearest(self, t: datetime) -> PrefixTable:
+        """Return the snapshot nearest to `t`."""
+        return self.load(self.index(t))
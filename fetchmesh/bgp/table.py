@@ -0,0 +1,341 @@
+"""
+Compiled, memory-mappable, longest-prefix-match tables.
+
+Prefixes are flattened at compile time into sorted, disjoint, address intervals,
+each pointing to a list of integers (e.g. the origin ASes of the prefix) in a shared pool.
+A lookup is a binary search in the intervals, vectorized with NumPy for arrays of addresses.
+The tables are stored in a single file that is memory-mapped on load: loading is near-instant,
+and the pages are shared between the processes through the page cache.
+"""
+
+import mmap
+import struct
+from ipaddress import ip_network
+from pathlib import Path
+from socket import AF_INET6, inet_aton, inet_pton
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+MAGIC = b"FMPFXTB1"
+
+Header = struct.Struct("<8s5Q")
+"""
+File header: magic, number of IPv4 intervals, number of IPv6 intervals,
+number of values, size of the values pool, and maximum number of IPv6 intervals
+sharing the same upper 64 bits (used to bound the IPv6 search).
+"""
+
+MASK64 = (1 << 64) - 1
+
+Interval = Tuple[int, int, int]
+
+
+def flatten(prefixes: Iterable[Tuple[int, int, int]]) -> List[Interval]:
+    """
+    Flatten nested prefixes (`start`, `end`, `value`) into disjoint intervals,
+    such that each address maps to the value of its longest matching prefix.
+    """
+    intervals: List[Interval] = []
+    stack: List[Tuple[int, int]] = []
+    cursor = 0
+
+    def emit(start, end, value):
+        # Merge with the previous interval when possible.
+        if intervals and intervals[-1][1] + 1 == start and intervals[-1][2] == value:
+            intervals[-1] = (intervals[-1][0], end, value)
+        else:
+            intervals.append((start, end, value))
+
+    def unwind(until):
+        # Close the enclosing prefixes that end before `until`.
+        nonlocal cursor
+        while stack and stack[-1][0] < until:
+            end, value = stack.pop()
+            if cursor <= end:
+                emit(cursor, end, value)
+                cursor = end + 1
+
+    # Enclosing (shorter) prefixes first.
+    for start, end, value in sorted(prefixes, key=lambda x: (x[0], -x[1])):
+        unwind(start)
+        if stack and cursor < start:
+            emit(cursor, start - 1, stack[-1][1])
+        cursor = start
+        stack.append((end, value))
+
+    unwind(1 << 128)
+    return intervals
+
+
+def parse_addresses(addresses: Sequence[Optional[str]]):
+    """
+    Convert addresses to integers.
+    Return the IPv4 mask, the IPv4 addresses, the IPv6 mask, and the upper and lower
+    64 bits of the IPv6 addresses. Invalid addresses (or `None`) are in neither masks.
+    """
+    n = len(addresses)
+    buf4 = bytearray(4 * n)
+    buf6 = bytearray(16 * n)
+    is4 = np.zeros(n, dtype=bool)
+    is6 = np.zeros(n, dtype=bool)
+    for i, addr in enumerate(addresses):
+        if not addr:
+            continue
+        try:
+            if ":" in addr:
+                buf6[16 * i : 16 * (i + 1)] = inet_pton(AF_INET6, addr)
+                is6[i] = True
+            else:
+                buf4[4 * i : 4 * (i + 1)] = inet_aton(addr)
+                is4[i] = True
+        except (OSError, ValueError):
+            continue
+    a4 = np.frombuffer(bytes(buf4), dtype=">u4").astype(np.uint32)
+    a6 = np.frombuffer(bytes(buf6), dtype=">u8").astype(np.uint64).reshape(n, 2)
+    return is4, a4, is6, a6[:, 0], a6[:, 1]
+
+
+class PrefixTable:
+    """
+    Longest-prefix-match table mapping IP prefixes to lists of integers.
+
+    .. code-block:: python
+
+        from fetchmesh.bgp import PrefixTable
+
+        table = PrefixTable.from_prefixes([("1.0.0.0/8", [1]), ("1.1.0.0/16", [2, 3])])
+        table.search("1.1.1.1")
+        # [2, 3]
+        table.lookup_first(["1.1.1.1", "1.2.3.4", "8.8.8.8"])
+        # array([2, 1, 0], dtype=uint32)
+
+        table.save("table.bin")
+        table = PrefixTable.load("table.bin")  # memory-mapped
+    """
+
+    def __init__(
+        self,
+        starts4: np.ndarray,
+        ends4: np.ndarray,
+        values4: np.ndarray,
+        starts6: np.ndarray,
+        ends6: np.ndarray,
+        values6: np.ndarray,
+        offsets: np.ndarray,
+        pool: np.ndarray,
+        max_block6: int,
+        buffer: Optional[mmap.mmap] = None,
+        file: Optional[Path] = None,
+    ):
+        self.starts4 = starts4
+        self.ends4 = ends4
+        self.values4 = values4
+        # IPv6 addresses are stored as two columns (upper and lower 64 bits).
+        self.starts6 = starts6
+        self.ends6 = ends6
+        self.values6 = values6
+        self.offsets = offsets
+        self.pool = pool
+        self.max_block6 = max_block6
+        # Keep a reference to the memory-map, if any.
+        self.buffer = buffer
+        self.file = file
+
+    def __len__(self):
+        return len(self.starts4) + len(self.starts6)
+
+    def __getstate__(self):
+        # Memory-mapped tables are sent to other processes by path.
+        if self.file is not None:
+            return {"file": self.file}
+        return self.__dict__
+
+    def __setstate__(self, state):
+        if set(state) == {"file"}:
+            state = PrefixTable.load(state["file"]).__dict__
+        self.__dict__.update(state)
+
+    @classmethod
+    def from_prefixes(
+        cls, prefixes: Iterable[Tuple[str, Sequence[int]]]
+    ) -> "PrefixTable":
+        """Compile a table from (prefix, values) tuples. The last duplicate prefix wins."""
+        pool_index: Dict[Tuple[int, ...], int] = {}
+        by_prefix4: Dict[Tuple[int, int], int] = {}
+        by_prefix6: Dict[Tuple[int, int], int] = {}
+
+        for prefix, values in prefixes:
+            net = ip_network(prefix, strict=False)
+            key = tuple(values)
+            if key not in pool_index:
+                pool_index[key] = len(pool_index)
+            start = int(net.network_address)
+            end = int(net.broadcast_address)
+            if net.version == 4:
+                by_prefix4[(start, end)] = pool_index[key]
+            else:
+                by_prefix6[(start, end)] = pool_index[key]
+
+        iv4 = flatten((s, e, v) for (s, e), v in by_prefix4.items())
+        iv6 = flatten((s, e, v) for (s, e), v in by_prefix6.items())
+
+        sizes = [len(x) for x in pool_index]
+        offsets = np.zeros(len(sizes) + 1, dtype=np.uint64)
+        np.cumsum(sizes, out=offsets[1:])
+        pool = np.fromiter(
+            (v for values in pool_index for v in values),
+            dtype=np.uint32,
+            count=int(offsets[-1]),
+        )
+
+        starts6 = np.array([(s >> 64, s & MASK64) for s, _, _ in iv6], dtype=np.uint64)
+        ends6 = np.array([(e >> 64, e & MASK64) for _, e, _ in iv6], dtype=np.uint64)
+        max_block6 = 0
+        if iv6:
+            _, counts = np.unique(starts6[:, 0], return_counts=True)
+            max_block6 = int(counts.max())
+
+        return cls(
+            np.array([s for s, _, _ in iv4], dtype=np.uint32),
+            np.array([e for _, e, _ in iv4], dtype=np.uint32),
+            np.array([v for _, _, v in iv4], dtype=np.uint32),
+            starts6.reshape(-1, 2),
+            ends6.reshape(-1, 2),
+            np.array([v for _, _, v in iv6], dtype=np.uint32),
+            offsets,
+            pool,
+            max_block6,
+        )
+
+    def arrays(self):
+        return [
+            self.starts4,
+            self.ends4,
+            self.values4,
+            self.starts6,
+            self.ends6,
+            self.values6,
+            self.offsets,
+            self.pool,
+        ]
+
+    def save(self, file: Union[Path, str]):
+        """Write the table to `file`, atomically."""
+        file = Path(file)
+        tmp = file.with_suffix(file.suffix + ".tmp")
+        header = Header.pack(
+            MAGIC,
+            len(self.starts4),
+            len(self.starts6),
+            len(self.offsets) - 1,
+            len(self.pool),
+            self.max_block6,
+        )
+        with tmp.open("wb") as f:
+            f.write(header)
+            for array in self.arrays():
+                # Align the arrays on 8 bytes for the memory-mapped views.
+                f.write(b"\0" * (-f.tell() % 8))
+                f.write(
+                    np.ascontiguousarray(
+                        array, dtype=array.dtype.newbyteorder("<")
+                    ).tobytes()
+                )
+        tmp.replace(file)
+
+    @classmethod
+    def load(cls, file: Union[Path, str]) -> "PrefixTable":
+        """Memory-map the table stored in `file`."""
+        with open(file, "rb") as f:
+            buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, n4, n6, nvalues, npool, max_block6 = Header.unpack_from(buffer)
+        if magic != MAGIC:
+            raise ValueError(f"{file} is not a prefix table")
+
+        offset = Header.size
+        arrays = []
+        for dtype, count, width in [
+            ("<u4", n4, 1),
+            ("<u4", n4, 1),
+            ("<u4", n4, 1),
+            ("<u8", n6, 2),
+            ("<u8", n6, 2),
+            ("<u4", n6, 1),
+            ("<u8", nvalues + 1, 1),
+            ("<u4", npool, 1),
+        ]:
+            offset += -offset % 8
+            array = np.frombuffer(
+                buffer, dtype=dtype, count=count * width, offset=offset
+            )
+            if width > 1:
+                array = array.reshape(count, width)
+            arrays.append(array)
+            offset += array.nbytes
+
+        return cls(*arrays, max_block6=max_block6, buffer=buffer, file=Path(file))
+
+    def values(self, index: int) -> List[int]:
+        """Values at `index` in the pool."""
+        start, stop = self.offsets[index], self.offsets[index + 1]
+        return self.pool[start:stop].tolist()
+
+    def lookup(self, addresses: Sequence[Optional[str]]) -> np.ndarray:
+        """
+        Return the index of the values of the longest matching prefix for each address,
+        or -1 if there is no matching prefix (or if the address is invalid).
+        """
+        is4, a4, is6, hi6, lo6 = parse_addresses(addresses)
+        result = np.full(len(addresses), -1, dtype=np.int64)
+        if len(self.starts4) and is4.any():
+            result[is4] = self._lookup4(a4[is4])
+        if len(self.starts6) and is6.any():
+            result[is6] = self._lookup6(hi6[is6], lo6[is6])
+        return result
+
+    def _lookup4(self, a: np.ndarray) -> np.ndarray:
+        i = np.searchsorted(self.starts4, a, side="right") - 1
+        j = np.maximum(i, 0)
+        found = (i >= 0) & (a <= self.ends4[j])
+        return np.where(found, self.values4[j], -1)
+
+    def _lookup6(self, hi: np.ndarray, lo: np.ndarray) -> np.ndarray:
+        shi, slo = self.starts6[:, 0], self.starts6[:, 1]
+        # Last interval whose upper 64 bits are <= the address ones...
+        left = np.searchsorted(shi, hi, side="left")
+        i = np.searchsorted(shi, hi, side="right") - 1
+        # ...then step back within the intervals sharing the same upper 64 bits,
+        # until the lower 64 bits of the start are also <= the address ones.
+        for _ in range(self.max_block6):
+            back = (i >= left) & (slo[np.maximum(i, 0)] > lo)
+            if not back.any():
+                break
+            i = np.where(back, i - 1, i)
+        j = np.maximum(i, 0)
+        ehi, elo = self.ends6[j, 0], self.ends6[j, 1]
+        found = (i >= 0) & ((hi < ehi) | ((hi == ehi) & (lo <= elo)))
+        return np.where(found, self.values6[j], -1)
+
+    def lookup_first(self, addresses: Sequence[Optional[str]]) -> np.ndarray:
+        """
+        Return the first value of the longest matching prefix for each address, or 0.
+        For ASN tables, this is the (first) origin AS.
+        """
+        index = self.lookup(addresses)
+        found = index >= 0
+        first = np.zeros(len(index), dtype=np.uint32)
+        starts = self.offsets[index[found]]
+        stops = self.offsets[index[found] + 1]
+        nonempty = starts < stops
+        values = np.zeros(len(starts), dtype=np.uint32)
+        values[nonempty] = self.pool[starts[nonempty]]
+        first[found] = values
+        return first
+
+    def search(self, address: Optional[str]) -> Optional[List[int]]:
+        """Return the values of the longest matching prefix for `address`, or None."""
+        index = self.lookup([address])[0]
+        if index < 0:
+            return None
+        return self.values(index)
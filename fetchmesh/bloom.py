@@ -0,0 +1,82 @@
+"""
+Bounded-memory set membership, used to deduplicate large streams of records.
+"""
+
+import math
+from hashlib import blake2b
+from typing import Iterable, Union
+
+Key = Union[bytes, str]
+
+
+class BloomFilter:
+    """
+    Bloom filter sized for `capacity` items with a false positive rate of `error_rate`.
+    The memory usage is fixed (``-capacity * ln(error_rate) / ln(2)^2`` bits),
+    regardless of the number of items added.
+    A false positive means that a new item is considered as already seen (and dropped),
+    there are no false negatives.
+
+    .. code-block:: python
+
+        from fetchmesh.bloom import BloomFilter
+
+        bf = BloomFilter(capacity=10_000_000, error_rate=1e-6)
+        bf.add("192.0.2.1 192.0.2.2")
+        # True
+        bf.add("192.0.2.1 192.0.2.2")
+        # False
+        "192.0.2.1 192.0.2.2" in bf
+        # True
+    """
+
+    def __init__(self, capacity: int = 10_000_000, error_rate: float = 1e-6):
+        if capacity <= 0:
+            raise ValueError("capacity must be positive")
+        if not 0 < error_rate < 1:
+            raise ValueError("error_rate must be in ]0, 1[")
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.size = math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2)
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def __len__(self):
+        """Number of (distinct) items added."""
+        return self.count
+
+    @property
+    def nbytes(self) -> int:
+        """Size of the bit array, in bytes."""
+        return len(self.bits)
+
+    def positions(self, key: Key):
+        if isinstance(key, str):
+            key = key.encode("utf-8")
+        digest = blake2b(key, digest_size=16).digest()
+        # Double hashing (Kirsch and Mitzenmacher):
+        # the k positions are derived from two 64-bit hashes.
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return [(h1 + i * h2) % self.size for i in range(self.hashes)]
+
+    def __contains__(self, key: Key) -> bool:
+        bits = self.bits
+        return all(bits[p >> 3] & (1 << (p & 7)) for p in self.positions(key))
+
+    def add(self, key: Key) -> bool:
+        """Add `key` to the filter, and return true if it was not already present."""
+        bits = self.bits
+        new = False
+        for p in self.positions(key):
+            mask = 1 << (p & 7)
+            if not bits[p >> 3] & mask:
+                bits[p >> 3] |= mask
+                new = True
+        self.count += new
+        return new
+
+    def update(self, keys: Iterable[Key]):
+        for key in keys:
+            self.add(key)
@@ -0,0 +1,316 @@
+"""
+HTTP responses cache for the Atlas, PeeringDB and AS names APIs.
+
+Responses are kept for a duration depending on the endpoint, and are then revalidated
+with the ``ETag`` and ``Last-Modified`` headers when the server provides them.
+Bodies are compressed with zstandard, and the least recently used responses are
+evicted when the cache grows above a given size.
+"""
+
+import json
+import logging
+import re
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from hashlib import sha256
+from pathlib import Path
+from typing import Callable, Dict, Optional, Sequence, Tuple, Union
+
+from appdirs import user_cache_dir
+from requests import Response
+from requests.structures import CaseInsensitiveDict
+from zstandard import ZstdCompressor, ZstdDecompressor
+
+log = logging.getLogger(__name__)
+
+DEFAULT_CACHE_DIR = Path(user_cache_dir("fetchmesh")) / "http"
+
+DEFAULT_TTLS: Sequence[Tuple[str, float]] = (
+    (r"/anchors", 24 * 3600),
+    (r"/measurements", 3600),
+    (r"peeringdb\.com", 24 * 3600),
+    (r"asn\.txt$", 7 * 24 * 3600),
+)
+"""Time-to-live (in seconds) of the responses, by URL pattern. The first matching pattern is used."""
+
+# Headers kept with the cached bodies.
+KEPT_HEADERS = ("Content-Type", "ETag", "Last-Modified")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    key TEXT PRIMARY KEY,
+    url TEXT NOT NULL,
+    status INTEGER NOT NULL,
+    headers TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    stored REAL NOT NULL,
+    accessed REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS entries_accessed ON entries (accessed);
+CREATE TABLE IF NOT EXISTS stats (
+    name TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+"""
+
+
+@dataclass
+class CacheStats:
+    """Cache statistics (since the creation of the cache directory)."""
+
+    hits: int = 0
+    """Responses served from the cache."""
+
+    misses: int = 0
+    """Responses not found in the cache, or expired and modified."""
+
+    revalidations: int = 0
+    """Expired responses revalidated by the server (``304 Not Modified``)."""
+
+    evictions: int = 0
+    """Responses evicted to keep the cache below its maximum size."""
+
+    entries: int = 0
+    """Number of responses in the cache."""
+
+    size: int = 0
+    """Size of the (compressed) responses in the cache, in bytes."""
+
+    @property
+    def hit_ratio(self) -> float:
+        total = self.hits + self.misses + self.revalidations
+        return (self.hits + self.revalidations) / total if total else 0.0
+
+    def __str__(self):
+        fmt = (
+            "{} entries ({:.1f} MB), {} hits, {} revalidations, {} misses, {} evictions"
+        )
+        return fmt.format(
+            self.entries,
+            self.size / 10**6,
+            self.hits,
+            self.revalidations,
+            self.misses,
+            self.evictions,
+        )
+
+
+class HTTPCache:
+    """
+    Size-bounded, TTL-aware, cache of HTTP responses.
+
+    .. code-block:: python
+
+        from fetchmesh.cache import HTTPCache
+
+        cache = HTTPCache()
+        r = cache.get(url, lambda headers: session.get(url, headers=headers))
+        print(cache.stats())
+        # 12 entries (2.3 MB), 40 hits, 2 revalidations, 12 misses, 0 evictions
+    """
+
+    def __init__(
+        self,
+        directory: Union[Path, str] = DEFAULT_CACHE_DIR,
+        max_size: int = 2 * 10**9,
+        ttls: Sequence[Tuple[str, float]] = DEFAULT_TTLS,
+        default_ttl: float = 3600,
+        level: int = 3,
+    ):
+        self.directory = Path(directory)
+        self.max_size = max_size
+        self.ttls = [(re.compile(pattern), ttl) for pattern, ttl in ttls]
+        self.default_ttl = default_ttl
+        self.level = level
+        self._init_connection()
+
+    def _init_connection(self):
+        # The connection is opened on first use, and shared by all the threads.
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state["_conn"]
+        del state["_lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._init_connection()
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self.directory.mkdir(exist_ok=True, parents=True)
+            conn = sqlite3.connect(
+                self.directory / "index.sqlite",
+                timeout=60,
+                isolation_level=None,
+                check_same_thread=False,
+            )
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(SCHEMA)
+            self._conn = conn
+        return self._conn
+
+    def ttl(self, url: str) -> float:
+        for pattern, ttl in self.ttls:
+            if pattern.search(url):
+                return ttl
+        return self.default_ttl
+
+    def body_file(self, key: str) -> Path:
+        return self.directory / f"{key}.zst"
+
+    def get(self, url: str, fetch: Callable[[Dict[str, str]], Response]) -> Response:
+        """
+        Return the response for `url`, from the cache if it is still fresh.
+        Otherwise, call `fetch` with the conditional request headers
+        (``If-None-Match``, ``If-Modified-Since``) to use, and cache the response.
+        Only ``200 OK`` responses are cached.
+        """
+        key = sha256(url.encode("utf-8")).hexdigest()
+        now = time.time()
+
+        with self._lock:
+            row = self.conn.execute(
+                "SELECT status, headers, stored FROM entries WHERE key = ?", (key,)
+            ).fetchone()
+
+        cached = None
+        if row:
+            cached = self.load(key, url, row[0], json.loads(row[1]))
+
+        if cached is not None and now - row[2] < self.ttl(url):
+            self.touch(key, now)
+            self.count("hits")
+            return cached
+
+        headers = {}
+        if cached is not None:
+            if "ETag" in cached.headers:
+                headers["If-None-Match"] = cached.headers["ETag"]
+            if "Last-Modified" in cached.headers:
+                headers["If-Modified-Since"] = cached.headers["Last-Modified"]
+
+        res = fetch(headers)
+
+        if cached is not None and res.status_code == 304:
+            self.touch(key, now, stored=now)
+            self.count("revalidations")
+            return cached
+
+        self.count("misses")
+        if res.status_code == 200:
+            self.store(key, url, res, now)
+        return res
+
+    def load(self, key, url, status, headers) -> Optional[Response]:
+        try:
+            data = self.body_file(key).read_bytes()
+        except FileNotFoundError:
+            with self._lock:
+                self.conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+            return None
+        res = Response()
+        res.status_code = status
+        res.url = url
+        res.headers = CaseInsensitiveDict(headers)
+        # pylint: disable=protected-access
+        res._content = ZstdDecompressor().decompress(data)
+        return res
+
+    def store(self, key, url, res, now):
+        data = ZstdCompressor(level=self.level).compress(res.content)
+        headers = {k: res.headers[k] for k in KEPT_HEADERS if k in res.headers}
+        # Write then rename, so that concurrent readers never see a partial body.
+        file = self.body_file(key)
+        tmp = file.with_suffix(f".{threading.get_ident()}.tmp")
+        tmp.write_bytes(data)
+        tmp.replace(file)
+        with self._lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (key, url, res.status_code, json.dumps(headers), len(data), now, now),
+            )
+        self.evict()
+
+    def touch(self, key, now, stored=None):
+        with self._lock:
+            if stored is None:
+                self.conn.execute(
+                    "UPDATE entries SET accessed = ? WHERE key = ?", (now, key)
+                )
+            else:
+                self.conn.execute(
+                    "UPDATE entries SET accessed = ?, stored = ? WHERE key = ?",
+                    (now, stored, key),
+                )
+
+    def count(self, name: str, n: int = 1):
+        with self._lock:
+            self.conn.execute(
+                "INSERT INTO stats VALUES (?, ?) ON CONFLICT(name) DO UPDATE SET value = value + ?",
+                (name, n, n),
+            )
+
+    def evict(self):
+        """Remove the least recently used responses until the cache fits in `max_size`."""
+        with self._lock:
+            (size,) = self.conn.execute(
+                "SELECT COALESCE(SUM(size), 0) FROM entries"
+            ).fetchone()
+            if size <= self.max_size:
+                return
+            rows = self.conn.execute(
+                "SELECT key, size FROM entries ORDER BY accessed"
+            ).fetchall()
+            evicted = []
+            for key, entry_size in rows:
+                if size <= self.max_size:
+                    break
+                evicted.append(key)
+                size -= entry_size
+            self.conn.executemany(
+                "DELETE FROM entries WHERE key = ?", [(key,) for key in evicted]
+            )
+        for key in evicted:
+            self.body_file(key).unlink(missing_ok=True)
+        self.count("evictions", len(evicted))
+        log.debug("Evicted %s responses from %s", len(evicted), self.directory)
+
+    def clear(self, expired_only: bool = False):
+        """Remove all the responses (or only the expired ones) from the cache."""
+        now = time.time()
+        with self._lock:
+            rows = self.conn.execute("SELECT key, url, stored FROM entries").fetchall()
+        keys = [
+            key
+            for key, url, stored in rows
+            if not expired_only or now - stored >= self.ttl(url)
+        ]
+        with self._lock:
+            self.conn.executemany(
+                "DELETE FROM entries WHERE key = ?", [(key,) for key in keys]
+            )
+        for key in keys:
+            self.body_file(key).unlink(missing_ok=True)
+        return len(keys)
+
+    def stats(self) -> CacheStats:
+        with self._lock:
+            counters = dict(self.conn.execute("SELECT name, value FROM stats"))
+            entries, size = self.conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries"
+            ).fetchone()
+        return CacheStats(
+            hits=counters.get("hits", 0),
+            misses=counters.get("misses", 0),
+            revalidations=counters.get("revalidations", 0),
+            evictions=counters.get("evictions", 0),
+            entries=entries,
+            size=size,
+        )
@@ -2,9 +2,19 @@ import logging
 
 import click
 
+from .cache import cache
+from .compact import compact
+from .compile import compile_
 from .csv import csv
+from .dedupe import dedupe
 from .describe import describe
 from .fetch import fetch
+from .graph import graph
+from .kapar import kapar
+from .peeringdb import peeringdb
+from .rib2asn import rib2asn
+from .ribs import ribs
+from .transcode import transcode
 from .unpack import unpack
 from .upgrade import upgrade
 
@@ -35,8 +45,18 @@ def main(debug):
         )
 
 
+main.add_command(cache)
+main.add_command(compact)
+main.add_command(compile_)
 main.add_command(csv)
+main.add_command(dedupe)
 main.add_command(describe)
 main.add_command(fetch)
+main.add_command(graph)
+main.add_command(kapar)
+main.add_command(peeringdb)
+main.add_command(rib2asn)
+main.add_command(ribs)
+main.add_command(transcode)
 main.add_command(unpack)
 main.add_command(upgrade)
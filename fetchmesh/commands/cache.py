@@ -0,0 +1,44 @@
+import click
+
+from ..cache import HTTPCache
+from .common import print_kv
+
+
+@click.group()
+def cache():
+    """
+    Manage the HTTP responses cache.
+    """
+
+
+@cache.command()
+def info():
+    """
+    Print the cache location and statistics.
+    """
+    c = HTTPCache()
+    stats = c.stats()
+    print_kv("Directory", c.directory)
+    print_kv("Entries", stats.entries)
+    print_kv("Size", f"{stats.size / 10**6:.1f} MB")
+    print_kv("Hits", stats.hits)
+    print_kv("Revalidations", stats.revalidations)
+    print_kv("Misses", stats.misses)
+    print_kv("Evictions", stats.evictions)
+    print_kv("Hit ratio", f"{stats.hit_ratio:.2%}")
+
+
+@cache.command()
+@click.option(
+    "--expired",
+    default=False,
+    show_default=True,
+    is_flag=True,
+    help="Remove only the expired responses",
+)
+def clear(expired):
+    """
+    Remove the responses from the cache.
+    """
+    n = HTTPCache().clear(expired_only=expired)
+    print_kv("Removed", n)
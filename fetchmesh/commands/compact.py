@@ -0,0 +1,94 @@
+from collections import defaultdict
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+import click
+from mbox.click import PathParam
+from tqdm import tqdm
+
+from ..compact import compact as compact_files
+from ..compact import split_file
+from ..io import AtlasRecordsWriter
+from ..meta import AtlasResultsMeta
+from .common import print_kv
+
+
+@click.command()
+@click.option(
+    "--dir",
+    "directory",
+    type=PathParam(),
+    help="Output directory [default: SRC]",
+)
+@click.option(
+    "--window",
+    metavar="HOURS",
+    type=click.IntRange(min=1),
+    help="Re-chunk the files by windows of X hours (aligned on the epoch) [default: a single window]",
+)
+@click.option(
+    "--level",
+    type=click.IntRange(min=1, max=22),
+    help="Re-compress the records at this level (instead of concatenating the files)",
+)
+@click.option(
+    "--delete",
+    default=False,
+    show_default=True,
+    is_flag=True,
+    help="Delete the merged files",
+)
+@click.argument("src", required=True, type=PathParam())
+def compact(src, directory, window, level, delete):
+    """
+    Merge the results files of each measurement, and re-chunk them by time windows.
+
+    \b
+    The files of a measurement (e.g. fetched with `--split`) are merged into a single file
+    covering their time windows, or into one file per `--window`, by concatenating the
+    compressed records and their logs. The files spanning several windows are split
+    at the window boundaries, which requires to decompress their records.
+    The records are also decompressed if `--level` is specified, or if compressed
+    and uncompressed files of a measurement are merged.
+    """
+    directory = directory or src
+    directory.mkdir(exist_ok=True, parents=True)
+
+    with TemporaryDirectory(dir=directory, prefix=".compact_") as tmpdir:
+        groups = defaultdict(list)
+        originals = []
+        for file in src.glob("*.ndjson*"):
+            try:
+                meta = AtlasResultsMeta.from_filename(file.name)
+            except ValueError:
+                continue
+            originals.append(file)
+            key = (meta.type, meta.af, meta.msm_id)
+            if not window:
+                groups[key].append(file)
+                continue
+            for part in split_file(file, window * 3600, Path(tmpdir)):
+                start = AtlasResultsMeta.from_filename(part.name).start_timestamp
+                groups[key + (start // (window * 3600),)].append(part)
+
+        outputs = set()
+        for files in tqdm(groups.values()):
+            if len(files) == 1 and files[0].parent == directory and not level:
+                outputs.add(files[0])
+                continue
+            outputs.add(compact_files(files, directory, level))
+
+    deleted = 0
+    if delete:
+        output_logs = {AtlasRecordsWriter(x).log_file for x in outputs}
+        for file in originals:
+            if file in outputs:
+                continue
+            file.unlink()
+            log_file = AtlasRecordsWriter(file).log_file
+            if log_file.exists() and log_file not in output_logs:
+                log_file.unlink()
+            deleted += 1
+
+    print_kv("Outputs", len(outputs))
+    print_kv("Deleted", deleted)
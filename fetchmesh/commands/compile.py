@@ -0,0 +1,46 @@
+from pathlib import Path
+
+import click
+
+from ..bgp import ASNDB
+from ..meta import IPASNMeta
+from .common import print_kv
+
+
+@click.command(name="compile")
+@click.argument(
+    "files", nargs=-1, type=click.Path(dir_okay=False, exists=True, resolve_path=True)
+)
+@click.option(
+    "--dir",
+    "directory",
+    default=".",
+    show_default=True,
+    type=click.Path(file_okay=False, writable=True, resolve_path=True),
+    help="Output directory",
+)
+@click.option(
+    "--force",
+    default=False,
+    show_default=True,
+    is_flag=True,
+    help="Overwrite existing tables",
+)
+def compile_(files, directory, force):
+    """
+    Compile IPASN files into memory-mappable prefix tables.
+
+    \b
+    The tables are named after the IPASN files (e.g. ipasn_rrc00.ripe.net_202001010000.tbl),
+    and can be loaded with `fetchmesh.bgp.PrefixTable.load`.
+    """
+    directory = Path(directory)
+    directory.mkdir(exist_ok=True, parents=True)
+    for file in files:
+        meta = IPASNMeta.from_filename(file)
+        output = directory / meta.table_filename
+        if output.exists() and not force:
+            print_kv("Skipped", output)
+            continue
+        ASNDB.from_file(file).compile(output)
+        print_kv("Compiled", output)
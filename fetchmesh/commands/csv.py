@@ -1,20 +1,27 @@
 import datetime as dt
+import heapq
 import itertools
+from contextlib import ExitStack
+from csv import reader as CSVReader
 from csv import writer as CSVWriter
+from dataclasses import dataclass
+from math import isnan
 from pathlib import Path
-from tempfile import TemporaryDirectory
+from typing import List
 
 import click
 from mbox.click import PathParam
-from mbox.itertools import groupby_stream
-from pandas import DataFrame, Timedelta, concat
+from pandas import DataFrame, Timedelta
 from tqdm import tqdm
 
-from ..io import AtlasRecordsReader, AtlasRecordsWriter
-from ..transformers import TracerouteFlatIPTransformer
+from ..io import AtlasRecordsReader
+from ..partition import HashPartitioner, partition_groups
+from ..transformers import TracerouteEnrichTransformer, TracerouteFlatIPTransformer
 from .common import print_kv
 
-# TODO: Implement parallel processing
+PING_KEY = ("msm_id", "prb_id", "from", "dst_addr")
+
+RESAMPLE_STEP = 240
 
 
 @click.group()
@@ -24,13 +31,57 @@ def csv():
     """
 
 
+def resample(records: List[dict]) -> DataFrame:
+    """Resample the ping results of a pair."""
+    df = DataFrame.from_records(records, columns=["timestamp", "min"])
+    df = df.astype({"timestamp": "datetime64[s]"}).set_index("timestamp")
+    # Replace _missing_ values
+    df.loc[df["min"] <= 0.0, "min"] = None
+    # Resample
+    return df.resample(Timedelta(RESAMPLE_STEP, unit="seconds")).min()
+
+
+@dataclass(frozen=True)
+class ResampleWorker:
+    dir: Path
+    mode: str
+    grid: List[int]
+    """Timestamps of the columns, in merge mode."""
+
+    def do(self, file: Path) -> Path:
+        """
+        Resample the pairs of a partition. In split mode, write one CSV file per pair,
+        in merge mode, write one row per pair (sorted by pair) to a CSV file next to the partition.
+        """
+        output = file.with_name(file.name + ".csv")
+        with output.open("w") as f:
+            writer = CSVWriter(f)
+            for pair, records in sorted(partition_groups(file, PING_KEY)):
+                frame = resample(records)
+                if self.mode == "split":
+                    frame.reset_index(inplace=True)
+                    frame.timestamp = frame.timestamp.apply(
+                        lambda x: int(x.timestamp())
+                    )
+                    frame.to_csv(self.dir / "{}_{}.csv".format(*pair), index=False)
+                else:
+                    frame.index = [int(x.timestamp()) for x in frame.index]
+                    values = frame["min"].reindex(self.grid)
+                    writer.writerow([*pair, *("" if isnan(x) else x for x in values)])
+        return output
+
+
+def pair_key(row: List[str]) -> tuple:
+    return int(row[0]), int(row[1]), row[2], row[3]
+
+
 @csv.command()
 @click.option(
     "--dir",
     default=".",
     show_default=True,
     type=PathParam(),
-    help="Output directory.",
+    help="Output directory (of the pairs files, or of the merged file).",
 )
 @click.option(
     "--mode",
@@ -39,8 +90,24 @@ def csv():
     type=click.Choice(["split", "merge"], case_sensitive=False),
     help="In split mode one file is created per pair, in merge mode a single file is created.",
 )
+@click.option(
+    "--jobs",
+    default=1,
+    show_default=True,
+    metavar="N",
+    type=click.IntRange(min=1),
+    help="Number of parallel jobs to run",
+)
+@click.option(
+    "--memory",
+    default=256,
+    show_default=True,
+    metavar="MB",
+    type=click.IntRange(min=1),
+    help="Memory used to buffer the records before writing them to disk",
+)
 @click.argument("files", required=True, nargs=-1, type=PathParam())
-def ping(files, dir, mode):
+def ping(files, dir, mode, jobs, memory):
     """
     Convert ping results from ND-JSON to CSV.
 
@@ -51,74 +118,53 @@ def ping(files, dir, mode):
     \b
     Split Mode (`N` files, `T` rows, `2` columns): ``timestamp, rtt``
     Merge Mode (`N` rows, `T+2` columns): ``msm_id, prb_id, from_ip, to_ip, rtt_t1, rtt_t2, rtt_t3, ...``
+
+    In merge mode, the file is written to the output directory (``merge_<timestamp>.csv``).
     """
     print_kv("Output directory", dir)
     print_kv("Mode", mode)
 
     # 1. We start by splitting the results by pairs.
-    # We do this on disk to save memory, and to sort
-    # the data in a single pass.
-    key = lambda x: (x["msm_id"], x["prb_id"], x["from"], x["dst_addr"])
-    tmp = TemporaryDirectory()
-    tmpfiles = {}
-
-    # TODO: Proper filename (ping_v4_..._..._msm_id_prb_id.ndjson.zst)
-
-    for file in tqdm(files, desc="groupby"):
-        # This read stream -> group stream -> write pattern
-        # is useful for limiting the number of open file descriptors
-        # at any given time.
-        with AtlasRecordsReader(file) as r:
-            stream = groupby_stream(r, key, 10 ** 6)
-            for pair, records in stream:
-                name = "{}_{}.ndjson.zst".format(*pair)
-                file = Path(tmp.name).joinpath(name)
-                tmpfiles[pair] = file
-                with AtlasRecordsWriter(file, append=True, compression=True) as w:
-                    w.writeall(records)
-
-    # 2. Build dataframes from splitted files.
-    # Since we keep only the data that we need,
-    # this should fit in memory (hopefully ...).
-    frames = {}
-
-    for pair, file in tqdm(tmpfiles.items(), desc="resample"):
-        with AtlasRecordsReader(file) as r:
-            df = DataFrame.from_records(r, columns=["timestamp", "min"])
-            df = df.astype({"timestamp": "datetime64[s]"}).set_index("timestamp")
-            # Replace _missing_ values
-            df.loc[df["min"] <= 0.0, "min"] = None
-            # Resample
-            df = df.resample(Timedelta(240, unit="seconds")).min()
-            frames[pair] = df
-
-    # 3. Write the results.
-    dir.mkdir(exist_ok=True, parents=True)
-
-    # 3a. In split mode, we just have to write these frames to CSVs.
-    if mode == "split":
-        for pair, frame in tqdm(frames.items(), desc="write"):
-            name = "{}_{}.csv".format(*pair)
-            file = dir.joinpath(name)
-            frame.reset_index(inplace=True)
-            frame.timestamp = frame.timestamp.apply(lambda x: int(x.timestamp()))
-            frame.to_csv(file, index=False)
-
-    # 3b. In merge mode, we concatenate these frames and write them to CSVs.
-    if mode == "merge":
-        # TODO: Cleanup this
-        # Index df
-        idf = DataFrame.from_records(
-            list(frames.keys()), columns=["msm_id", "prb_id", "from_ip", "to_ip"]
-        )
-        # Values df
-        vdf = concat([x.T for x in frames.values()])
-        vdf.reset_index(drop=True, inplace=True)
-        vdf.columns = [int(x.timestamp()) for x in vdf.columns]
-        # Concat and save
-        name = f"merge_{int(dt.datetime.now().timestamp())}.csv"
-        df = concat([idf, vdf], axis=1)
-        df.to_csv(name, index=False)
+    # We do this on disk to save memory: the records are partitioned
+    # by pair, and the partitions are then processed in parallel.
+    start, stop = float("inf"), 0
+    with HashPartitioner(PING_KEY, memory=memory * 2**20) as partitioner:
+        for file in tqdm(files, desc="partition"):
+            with AtlasRecordsReader(file) as r:
+                for x in r:
+                    # We skip `None` records, and the results of other types.
+                    if not x or x.get("type") != "ping":
+                        continue
+                    start = min(start, x["timestamp"])
+                    stop = max(stop, x["timestamp"])
+                    # We keep only the data that we need.
+                    partitioner.add({k: x[k] for k in (*PING_KEY, "timestamp", "min")})
+
+        # 2. Resample the pairs of each partition, and write the results.
+        # Since a partition contains only a fraction of the pairs,
+        # this should fit in memory.
+        dir.mkdir(exist_ok=True, parents=True)
+        grid = []
+        if mode == "merge" and stop:
+            step = RESAMPLE_STEP
+            grid = list(range(start // step * step, stop // step * step + 1, step))
+        worker = ResampleWorker(dir, mode, grid)
+        outputs = []
+        it = partitioner.map(worker.do, jobs)
+        for output in tqdm(it, total=len(partitioner.files()), desc="resample"):
+            outputs.append(output)
+
+        # 3. In merge mode, merge the (sorted) rows of the partitions.
+        if mode == "merge":
+            name = f"merge_{int(dt.datetime.now().timestamp())}.csv"
+            with ExitStack() as stack:
+                writer = CSVWriter(stack.enter_context(dir.joinpath(name).open("w")))
+                writer.writerow(["msm_id", "prb_id", "from_ip", "to_ip", *grid])
+                readers = [CSVReader(stack.enter_context(x.open())) for x in outputs]
+                writer.writerows(heapq.merge(*readers, key=pair_key))
+
+        for output in outputs:
+            output.unlink()
 
 
 @csv.command()
@@ -146,7 +192,9 @@ def traceroute(files, drop_private):
     # TODO: Proper context manager?
     output = open(f"traceroutes_{int(dt.datetime.now().timestamp())}.csv", "w")
     writer = CSVWriter(output)
-    reader = AtlasRecordsReader.all(files)
+    # Resolve the private addresses once per distinct address.
+    transformers = [TracerouteEnrichTransformer()] if drop_private else []
+    reader = AtlasRecordsReader.all(files, transformers=transformers)
 
     hops = [[f"hop{i}_{j}" for j in range(1, 4)] for i in range(1, 33)]
     writer.writerow(
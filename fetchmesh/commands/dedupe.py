@@ -0,0 +1,119 @@
+from collections import defaultdict
+from typing import Tuple
+
+import click
+from mbox.click import PathParam
+from mbox.magic import CompressionFormat, detect_compression
+from tqdm import tqdm
+
+from ..dedupe import RecordDeduplicator, find_candidates
+from ..io import AtlasRecordsReader, AtlasRecordsWriter
+from ..meta import AtlasResultsMeta
+from ..transcode import count_records
+from .common import print_kv
+
+
+def dedupe_file(file, deduplicator) -> Tuple[int, int]:
+    """
+    Rewrite `file` without the duplicate records.
+    Return the number of records dropped, and the number of invalid records: the files
+    with invalid records are kept as is, since the invalid records cannot be rewritten.
+    """
+    dropped = deduplicator.dropped
+    tmp = file.with_name(file.name + ".tmp")
+    writer = AtlasRecordsWriter(
+        tmp,
+        compression=detect_compression(file) == CompressionFormat.Zstandard,
+        log=AtlasRecordsWriter(file).log_file.exists(),
+    )
+    counter = [0, 0]
+    # The writer deletes the output file if the file cannot be read entirely.
+    with AtlasRecordsReader(file, deduplicator=deduplicator) as r, writer:
+        writer.writeall(count_records(r, counter))
+    dropped = deduplicator.dropped - dropped
+    if not tmp.exists():
+        # Keep the original file.
+        return 0, counter[1]
+    if dropped and not counter[1]:
+        tmp.replace(file)
+        if writer.log:
+            writer.log_file.replace(AtlasRecordsWriter(file).log_file)
+        return dropped, 0
+    # Nothing to do, or invalid records: keep the original file.
+    tmp.unlink()
+    if writer.log:
+        writer.log_file.unlink()
+    return 0, counter[1]
+
+
+@click.command()
+@click.option(
+    "--ordered",
+    default=False,
+    show_default=True,
+    is_flag=True,
+    help="The records of each pair are ordered by time (reads the files only once)",
+)
+@click.option(
+    "--capacity",
+    default=10_000_000,
+    show_default=True,
+    type=click.IntRange(min=1),
+    help="Expected number of records per measurement (sizes the Bloom filter of the first pass)",
+)
+@click.option(
+    "--error-rate",
+    default=1e-6,
+    show_default=True,
+    type=click.FloatRange(min=0, max=1, min_open=True, max_open=True),
+    help="Probability of checking again a record seen for the first time",
+)
+@click.argument("paths", required=True, nargs=-1, type=PathParam())
+def dedupe(paths, ordered, capacity, error_rate):
+    """
+    Remove the duplicate records from results files, in place.
+
+    \b
+    `PATHS` are results files, or directories containing `.ndjson` files.
+    Records are duplicates if they have the same measurement, probe and timestamp.
+    The files of a measurement are deduplicated together, in time order,
+    so that the records at the boundaries of consecutive windows are kept only once.
+    The files containing invalid records (that cannot be parsed) are not rewritten.
+    Unless --ordered is set, the files are read twice: the possible duplicates are found
+    with a Bloom filter, and the records are then deduplicated exactly against them.
+    """
+    files = []
+    for path in paths:
+        files.extend(sorted(path.glob("*.ndjson*")) if path.is_dir() else [path])
+
+    groups = defaultdict(list)
+    for file in files:
+        if file.name.endswith((".log", ".tmp")):
+            continue
+        try:
+            meta = AtlasResultsMeta.from_filename(file.name)
+            groups[meta.msm_id].append((meta.start_timestamp, file))
+        except ValueError:
+            groups[file].append((0, file))
+
+    dropped, rewritten, skipped = 0, 0, 0
+    for group in tqdm(groups.values()):
+        group = [file for _, file in sorted(group)]
+        if ordered:
+            deduplicator = RecordDeduplicator(ordered=True)
+        else:
+            records = AtlasRecordsReader.all(group)
+            candidates = find_candidates(records, capacity, error_rate)
+            deduplicator = RecordDeduplicator(candidates=candidates)
+        for file in group:
+            n, invalid = dedupe_file(file, deduplicator)
+            if invalid:
+                tqdm.write(f"Skipped: {file} ({invalid} invalid records)")
+                skipped += 1
+            dropped += n
+            rewritten += n > 0
+
+    print_kv("Files", len(files))
+    print_kv("Files rewritten", rewritten)
+    print_kv("Files skipped", skipped)
+    print_kv("Duplicates removed", dropped)
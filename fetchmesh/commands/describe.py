@@ -1,4 +1,5 @@
 # pylint: disable=E1101,E1133
+import datetime as dt
 from collections import defaultdict
 
 import click
@@ -8,9 +9,9 @@ from rich import box
 from rich.table import Table
 from rich.text import Text
 
-from ..atlas import MeasurementAF, MeasurementType
+from ..atlas import MeasurementAF, MeasurementStore, MeasurementType
 from ..filters import HalfPairFilter, MeasurementDateFilter, SelfPairFilter
-from ..mesh import AnchoringMesh
+from ..mesh import AnchoringMesh, AnchoringMeshIndex
 from .common import console, print_kv
 
 
@@ -23,6 +24,33 @@ def expected_pairs(n_anchors, no_self, half):
     return int(npairs)
 
 
+def describe_range(mesh, start, stop, step):
+    dates = []
+    while start <= stop:
+        dates.append(start)
+        start += step
+
+    table = Table(
+        title="Anchoring mesh evolution", box=box.MINIMAL_HEAVY_HEAD, show_lines=False
+    )
+    table.add_column("Date")
+    table.add_column("Anchors", justify="right")
+    table.add_column("Measurements", justify="right")
+    table.add_column("Pairs (all)", justify="right")
+    table.add_column("Pairs (noself,half)", justify="right")
+
+    for date, n_anchors, n_measurements in AnchoringMeshIndex(mesh).series(dates):
+        table.add_row(
+            date.isoformat(),
+            str(n_anchors),
+            str(n_measurements),
+            str(expected_pairs(n_anchors, False, False)),
+            str(expected_pairs(n_anchors, True, True)),
+        )
+
+    console.print(table)
+
+
 @click.command()
 @click.option(
     "--date",
@@ -31,12 +59,42 @@ def expected_pairs(n_anchors, no_self, half):
     type=ParsedDate(settings={"RETURN_AS_TIMEZONE_AWARE": True, "TIMEZONE": "UTC"}),
     help="Keep only the pairs for which measurements were running on `date`.",
 )
-def describe(date):
+@click.option(
+    "--until",
+    type=ParsedDate(settings={"RETURN_AS_TIMEZONE_AWARE": True, "TIMEZONE": "UTC"}),
+    help="Print the evolution of the mesh from `date` to `until`, instead of an overview.",
+)
+@click.option(
+    "--step",
+    default=24,
+    show_default=True,
+    metavar="HOURS",
+    type=click.IntRange(min=1),
+    help="Time between two dates of the evolution of the mesh.",
+)
+@click.option(
+    "--sync",
+    default=False,
+    show_default=True,
+    is_flag=True,
+    help="Sync the measurements metadata incrementally in a local store, instead of downloading it entirely",
+)
+def describe(date, until, step, sync):
     """
-    Overview of the anchoring mesh at a given date.
+    Overview of the anchoring mesh at a given date,
+    or evolution of the mesh between two dates (with `--until`).
     """
 
-    mesh = AnchoringMesh.from_api().filter(MeasurementDateFilter.running(date, date))
+    store = MeasurementStore() if sync else None
+    mesh = AnchoringMesh.from_api(store=store)
+
+    if until:
+        if date > until:
+            raise click.ClickException("date must be before until")
+        describe_range(mesh, date, until, dt.timedelta(hours=step))
+        return
+
+    mesh = mesh.filter(MeasurementDateFilter.running(date, date))
 
     # TODO: Number of distinct pairs counted, vs theoretical number
     # TODO: Table per country, per AS (tops), plot distribution ?
@@ -1,17 +1,22 @@
 import atexit
 import datetime as dt
 import signal
-from concurrent.futures import ProcessPoolExecutor, as_completed
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
 from pathlib import Path
+from tempfile import TemporaryDirectory
 from traceback import print_exc
+from typing import Callable, List, Optional, Tuple
 
 import click
 import psutil
 from mbox.click import EnumChoice, ParsedDate, PathParam
 from mbox.datetime import datetimetuplerange, totimestamp
+from pytz import UTC
 from tqdm import tqdm
 
-from ..atlas import MeasurementAF, MeasurementType
+from ..atlas import MeasurementAF, MeasurementStore, MeasurementType
+from ..controller import AIMDController
 from ..fetcher import FetchJob, SimpleFetcher
 from ..filters import (
     AnchorRegionFilter,
@@ -21,8 +26,11 @@ from ..filters import (
     PairSampler,
     SelfPairFilter,
 )
+from ..follow import Follower
 from ..mesh import AnchoringMesh, AnchoringMeshPairs
 from ..meta import AtlasResultsMeta
+from ..scheduler import ByteRates, FetchScheduler
+from ..store import ResultStore
 from .common import format_args, print_args, print_kv
 
 
@@ -48,6 +56,159 @@ def default_dir(
     return Path(f"{type_.value}_v{af.value}_{start_time}_{stop_time}")
 
 
+def run_jobs(
+    fetcher: SimpleFetcher,
+    scheduler: FetchScheduler,
+    workers: int,
+    commit: Optional[Callable[[FetchJob], None]] = None,
+):
+    """
+    Run the jobs, largest first, on a single pool of `workers` processes.
+    Jobs are submitted one at a time, as workers become idle, so that
+    the remaining long windows can be split between idle workers.
+    `commit` is called in the main process on each successful job.
+    Returns the number of failed jobs.
+    """
+    rates = scheduler.rates
+    failed = 0
+    progress = tqdm(total=len(scheduler))
+    with ProcessPoolExecutor(workers) as executor:
+        running = {}
+        while scheduler or running:
+            progress.total += scheduler.balance(workers - len(running))
+            while scheduler and len(running) < workers:
+                job = scheduler.pop()
+                running[executor.submit(fetcher.fetch, job)] = job
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                job = running.pop(future)
+                progress.update()
+                try:
+                    future.result()
+                except Exception:
+                    tqdm.write(f"Failed: {job.meta.filename}")
+                    print_exc()
+                    failed += 1
+                    continue
+                file = fetcher.directory / job.meta.filename
+                if file.exists():
+                    seconds = job.meta.stop_timestamp - job.meta.start_timestamp
+                    size = file.stat().st_size
+                    rates.update(job.meta.msm_id, size, len(job.probes), seconds)
+                if commit:
+                    commit(job)
+    progress.close()
+    rates.save()
+    if failed:
+        print_kv("Failed jobs", failed)
+    return failed
+
+
+def select_pairs(
+    args: dict,
+    start_date: dt.datetime,
+    stop_date: dt.datetime,
+    store: Optional[MeasurementStore],
+) -> Tuple[AnchoringMesh, AnchoringMeshPairs]:
+    mesh = AnchoringMesh.from_api(store=store)
+    print_kv("Anchors", len(mesh.anchors))
+
+    # We load pairs either:
+    # 1) Directly from a file
+    if args["load_pairs"]:
+        print_kv("Pairs File", args["load_pairs"])
+        pairs = AnchoringMeshPairs.from_json(args["load_pairs"])
+    # 2) From the anchoring mesh
+    else:
+        filters = [
+            MeasurementDateFilter.running(start_date, stop_date),
+            MeasurementTypeFilter(args["af"], args["type"]),
+        ]
+        if args["region"]:
+            filters.append(AnchorRegionFilter(args["region"]))
+        for f in filters:
+            mesh = mesh.filter(f)
+            print_kv(f"Anchors > {type(f).__name__}", len(mesh.anchors))
+        pairs = mesh.pairs
+
+    print_kv("Pairs", len(pairs))
+
+    filters = []
+    if args["half"]:
+        filters.append(HalfPairFilter())
+    if args["no_self"]:
+        filters.append(SelfPairFilter())
+    if args["only_self"]:
+        filters.append(SelfPairFilter(reverse=True))
+    if args["sample_pairs"]:
+        # This filter must be the last one
+        sample_pairs = args["sample_pairs"]
+        if sample_pairs > 1:
+            sample_pairs = int(sample_pairs)
+        filters.append(PairSampler(sample_pairs))
+
+    for f in filters:
+        pairs = pairs.filter(f)
+        print_kv(f"Pairs > {type(f).__name__}", len(pairs))
+
+    return mesh, pairs
+
+
+def follow(args: dict, outdir: Path, store: Optional[MeasurementStore]):
+    """
+    Poll the measurements every `interval` minutes, until interrupted.
+    The mesh is refreshed on each poll (incrementally if `store` is set),
+    to pick up the new anchors and the stopped measurements.
+    """
+    split = (args["split"] or 1) * 3600
+    follower = Follower(outdir, split=split, compression=args["compress"])
+    tmpdir = TemporaryDirectory()
+    controller = AIMDController(
+        Path(tmpdir.name) / "controller.json", max_limit=args["jobs"]
+    )
+    fetcher = SimpleFetcher(Path(tmpdir.name) / "staging", controller=controller)
+    atexit.register(cleanup)
+
+    since = args["start_date"]
+    try:
+        while True:
+            now = dt.datetime.now(UTC)
+            mesh, pairs = select_pairs(args, since, now, store)
+            # The measurements stopped before the previous poll are not polled anymore.
+            mesh = mesh.filter(MeasurementDateFilter.running(since, now))
+            jobs = []
+            for target, probes in pairs.by_target():
+                measurement = mesh.find_measurement(target, args["af"], args["type"])
+                if not measurement:
+                    continue
+                meta = AtlasResultsMeta.from_measurement(
+                    measurement,
+                    start_date=args["start_date"],
+                    stop_date=now,
+                    compressed=False,
+                )
+                job = follower.job(meta, probes, now)
+                if job:
+                    jobs.append(job)
+            done: List[FetchJob] = []
+            # The windows are not split, so that the state of a measurement
+            # is advanced only if its whole window has been fetched.
+            scheduler = FetchScheduler(jobs, ByteRates.load(), min_window=None)
+            run_jobs(fetcher, scheduler, args["jobs"], commit=done.append)
+            added = 0
+            for job in done:
+                file = fetcher.directory / job.meta.filename
+                added += follower.add_file(file, job.meta)
+            print_kv("Poll", f"{now.isoformat()}: {len(jobs)} jobs, {added} records")
+            since = now
+            time.sleep(args["interval"] * 60)
+    except KeyboardInterrupt:
+        print_kv("Poll", "stopped")
+    finally:
+        atexit.unregister(cleanup)
+        tmpdir.cleanup()
+
+
 @click.command()
 @click.option(
     "--af",
@@ -120,7 +281,7 @@ def default_dir(
     show_default=True,
     metavar="N",
     type=click.IntRange(min=1),
-    help="Number of parallel jobs to run",
+    help="Maximum number of parallel jobs to run (the number of concurrent downloads adapts to the API load)",
 )
 @click.option(
     "--dir",
@@ -153,6 +314,39 @@ def default_dir(
     type=PathParam(),
     help="Load pairs from file (filters will still be applied!)",
 )
+@click.option(
+    "--sync",
+    default=False,
+    show_default=True,
+    is_flag=True,
+    help="Sync the measurements metadata incrementally in a local store, instead of downloading it entirely",
+)
+@click.option(
+    "--store",
+    type=PathParam(),
+    help="Serve the results from a local store of aligned chunks shared between runs, and fetch only the missing chunks",
+)
+@click.option(
+    "--store-chunk",
+    metavar="HOURS",
+    type=click.IntRange(min=1),
+    help="Duration of the chunks of a new store (default: 24)",
+)
+@click.option(
+    "--follow",
+    default=False,
+    show_default=True,
+    is_flag=True,
+    help="Poll the measurements continuously, and append the new results to rolling files of `--split` hours (default: 1), use with `--sync` to refresh the mesh incrementally",
+)
+@click.option(
+    "--interval",
+    default=5,
+    show_default=True,
+    metavar="MINUTES",
+    type=click.IntRange(min=1),
+    help="Polling interval in follow mode",
+)
 def fetch(**args):
     """
     Fetch measurement results from the anchoring mesh.
@@ -165,49 +359,23 @@ def fetch(**args):
         raise click.ClickException("start_date must be before stop_date")
 
     defdir = default_dir(args["af"], args["type"], start_date, stop_date)
+    if args["follow"]:
+        # The state of the follow mode is kept in the output directory.
+        defdir = Path(f"{args['type'].value}_v{args['af'].value}_follow")
     outdir = args["dir"] or defdir
     print_kv("Path", outdir.absolute())
 
-    mesh = AnchoringMesh.from_api()
-    print_kv("Anchors", len(mesh.anchors))
-
-    # We load pairs either:
-    # 1) Directly from a file
-    if args["load_pairs"]:
-        print_kv("Pairs File", args["load_pairs"])
-        pairs = AnchoringMeshPairs.from_json(args["load_pairs"])
-    # 2) From the anchoring mesh
-    else:
-        filters = [
-            MeasurementDateFilter.running(start_date, stop_date),
-            MeasurementTypeFilter(args["af"], args["type"]),
-        ]
-        if args["region"]:
-            filters.append(AnchorRegionFilter(args["region"]))
-        for f in filters:
-            mesh = mesh.filter(f)
-            print_kv(f"Anchors > {type(f).__name__}", len(mesh.anchors))
-        pairs = mesh.pairs
-
-    print_kv("Pairs", len(pairs))
-
-    filters = []
-    if args["half"]:
-        filters.append(HalfPairFilter())
-    if args["no_self"]:
-        filters.append(SelfPairFilter())
-    if args["only_self"]:
-        filters.append(SelfPairFilter(reverse=True))
-    if args["sample_pairs"]:
-        # This filter must be the last one
-        sample_pairs = args["sample_pairs"]
-        if sample_pairs > 1:
-            sample_pairs = int(sample_pairs)
-        filters.append(PairSampler(sample_pairs))
+    store = MeasurementStore() if args["sync"] else None
+    if args["follow"]:
+        if args["sample_pairs"] != 1:
+            raise click.ClickException(
+                "--sample-pairs would sample different pairs on each poll, "
+                "use --save-pairs once and --load-pairs with --follow"
+            )
+        follow(args, outdir, store)
+        return
 
-    for f in filters:
-        pairs = pairs.filter(f)
-        print_kv(f"Pairs > {type(f).__name__}", len(pairs))
+    mesh, pairs = select_pairs(args, start_date, stop_date, store)
 
     if args["save_pairs"]:
         pairs_file = outdir.with_suffix(".pairs")
@@ -215,7 +383,7 @@ def fetch(**args):
         print_kv(f"Pairs File", pairs_file)
         pairs.to_json(pairs_file)
         print_kv(f"Meta File", meta_file)
-        args_blacklist = {"dry_run", "sample_pairs", "save_pairs"}
+        args_blacklist = {"dry_run", "sample_pairs", "save_pairs", "sync"}
         args_fetch = {k: v for k, v in args.items() if k not in args_blacklist}
         args_fetch["load_pairs"] = pairs_file
         meta_str = f"# Run this file with `bash {meta_file}`."
@@ -242,20 +410,47 @@ def fetch(**args):
             )
             jobs.append(FetchJob(meta, probes))
 
+    # With a store, we fetch the missing chunks, and the jobs are served from the store.
+    results_store = None
+    if args["store"]:
+        chunk = args["store_chunk"] and args["store_chunk"] * 3600
+        try:
+            results_store = ResultStore(args["store"], chunk)
+        except ValueError as e:
+            raise click.ClickException(str(e))
+        views, jobs, chunks = jobs, [], set()
+        for view in views:
+            for job in results_store.missing(view.meta, view.probes):
+                # The windows of the views may share chunks.
+                if job.meta not in chunks:
+                    chunks.add(job.meta)
+                    jobs.append(job)
+        print_kv("Store", results_store.root.absolute())
+        print_kv("Chunks to fetch", len(jobs))
+
     # Stop here if we perform a dry run
     if args["dry_run"]:
         return
 
-    fetcher = SimpleFetcher(outdir)
+    # The controller state is shared by the worker processes through this directory.
+    tmpdir = TemporaryDirectory()
+    controller = AIMDController(
+        Path(tmpdir.name) / "controller.json", max_limit=args["jobs"]
+    )
     atexit.register(cleanup)
 
-    with ProcessPoolExecutor(args["jobs"]) as executor:
-        futures = [executor.submit(fetcher.fetch, job) for job in jobs]
-        futures = tqdm(as_completed(futures), total=len(jobs))
-        for future in futures:
-            try:
-                future.result()
-            except Exception:
-                print_exc()
+    if results_store:
+        # The chunks are not split, so that they are committed at once.
+        fetcher = results_store.fetcher(controller)
+        window = dt.timedelta(seconds=results_store.chunk)  # type: ignore
+        scheduler = FetchScheduler(jobs, ByteRates.load(), min_window=window)
+        run_jobs(fetcher, scheduler, args["jobs"], commit=results_store.commit)
+        for view in tqdm(views):
+            results_store.materialize(view.meta, view.probes, outdir)
+    else:
+        fetcher = SimpleFetcher(outdir, controller=controller)
+        scheduler = FetchScheduler(jobs, ByteRates.load(), directory=outdir)
+        run_jobs(fetcher, scheduler, args["jobs"])
 
     atexit.unregister(cleanup)
+    tmpdir.cleanup()
@@ -0,0 +1,109 @@
+from pathlib import Path
+
+import click
+from mbox.click import PathParam
+from tqdm import tqdm
+
+from ..bgp import ASNDB, PrefixTable
+from ..graph import Graph, GraphBuilder
+from ..io import AtlasRecordsReader
+from ..transformers import TracerouteEnrichTransformer
+from .common import print_kv
+
+
+def source_key(file: Path) -> str:
+    """Identify a file by its name, size and modification time."""
+    stat = file.stat()
+    return f"{file.name} {stat.st_size} {stat.st_mtime_ns}"
+
+
+def source_name(key: str) -> str:
+    """Name of the file identified by `key` (see :any:`source_key`)."""
+    return key.rsplit(" ", 2)[0]
+
+
+@click.command()
+@click.option(
+    "--level",
+    default="ip",
+    show_default=True,
+    type=click.Choice(["ip", "asn"]),
+    help="Graph nodes: interfaces addresses or origin ASes",
+)
+@click.option(
+    "--asn",
+    "asn_file",
+    type=click.Path(dir_okay=False, exists=True),
+    help="IP-to-ASN table for the AS-level graph (compiled `.tbl`, or IPASN file)",
+)
+@click.option(
+    "--keep-private",
+    default=False,
+    show_default=True,
+    is_flag=True,
+    help="Keep private IP addresses (v4 and v6)",
+)
+@click.option(
+    "--output",
+    default="graph.npz",
+    show_default=True,
+    type=PathParam(),
+    help="Output file, updated in place if it exists",
+)
+@click.argument("files", required=True, nargs=-1, type=PathParam())
+def graph(files, level, asn_file, keep_private, output):
+    """
+    Build an IP or AS-level graph from traceroute results.
+
+    \b
+    If the output file exists, the graph is updated with the files that it does not
+    already contain (based on their name, size and modification time), without re-reading
+    the other files. The files modified since they were added are rejected: their records
+    cannot be removed from the graph, so it must be rebuilt.
+    """
+    transformers = []
+    if level == "asn":
+        if not asn_file:
+            raise click.BadParameter("required for --level asn", param_hint="--asn")
+        if asn_file.endswith(".tbl"):
+            table = PrefixTable.load(asn_file)
+        else:
+            table = ASNDB.from_file(asn_file).prefix_table()
+        transformers.append(TracerouteEnrichTransformer(asn=table))
+
+    if output.exists():
+        g = Graph.load(output)
+        if g.level != level:
+            raise click.BadParameter(
+                f"{output} is a {g.level}-level graph", param_hint="--level"
+            )
+        builder = g.builder(drop_private=not keep_private)
+    else:
+        builder = GraphBuilder(level=level, drop_private=not keep_private)
+
+    # The records of a source cannot be removed from the graph,
+    # so the sources modified since they were added are rejected.
+    added_keys = {source_name(x): x for x in builder.sources}
+    for file in files:
+        key = added_keys.get(file.name)
+        if key and key != source_key(file):
+            raise click.UsageError(
+                f"{file} has changed since it was added to {output}, rebuild the graph"
+            )
+
+    added, skipped = 0, 0
+    for file in tqdm(files):
+        source = source_key(file)
+        if source in builder.sources:
+            skipped += 1
+            continue
+        with AtlasRecordsReader(file, transformers=transformers) as r:
+            builder.add_source(source, r)
+        added += 1
+
+    g = builder.freeze()
+    g.save(output)
+    print_kv("Files added", added)
+    print_kv("Files skipped", skipped)
+    print_kv("Nodes", len(g))
+    print_kv("Edges", g.n_edges)
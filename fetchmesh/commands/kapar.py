@@ -0,0 +1,112 @@
+from dataclasses import dataclass
+from hashlib import blake2b
+from multiprocessing import Pool
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from typing import Tuple
+
+import click
+from mbox.click import PathParam
+from tqdm import tqdm
+
+from ..alias import KaparFormatter
+from ..bloom import BloomFilter
+from ..io import AtlasRecordsReader
+from .common import print_kv
+
+
+@dataclass(frozen=True)
+class KaparWorker:
+    directory: Path
+    drop_private: bool
+
+    def do(self, item: Tuple[int, Path]) -> Path:
+        """
+        Format the traceroutes of a file, and write the (path digest, trace) of each of them
+        to a temporary file, one per line, with the newlines of the trace replaced by tabs.
+        """
+        i, file = item
+        output = self.directory / f"{i}.txt"
+        formatter = KaparFormatter(drop_private=self.drop_private)
+        with AtlasRecordsReader(file) as r, output.open("w") as f:
+            for record in r:
+                if not record or record.get("type") != "traceroute":
+                    continue
+                path, trace = formatter.format_path(record)
+                digest = blake2b(path.encode("utf-8"), digest_size=16).digest()
+                f.write(digest.hex())
+                f.write("\t")
+                f.write(trace.replace("\n", "\t"))
+                f.write("\n")
+        return output
+
+
+@click.command()
+@click.option(
+    "--output",
+    default="paths.txt",
+    show_default=True,
+    type=PathParam(),
+    help="Output file",
+)
+@click.option(
+    "--jobs",
+    default=1,
+    show_default=True,
+    metavar="N",
+    type=click.IntRange(min=1),
+    help="Number of parallel jobs to run",
+)
+@click.option(
+    "--capacity",
+    default=10_000_000,
+    show_default=True,
+    type=click.IntRange(min=1),
+    help="Expected number of unique paths (sizes the Bloom filter)",
+)
+@click.option(
+    "--error-rate",
+    default=1e-6,
+    show_default=True,
+    type=click.FloatRange(min=0, max=1, min_open=True, max_open=True),
+    help="Probability of dropping a new path as already seen",
+)
+@click.option(
+    "--keep-private",
+    default=False,
+    show_default=True,
+    is_flag=True,
+    help="Keep private IP addresses (v4 and v6)",
+)
+@click.argument("files", required=True, nargs=-1, type=PathParam())
+def kapar(files, output, jobs, capacity, error_rate, keep_private):
+    """
+    Convert traceroute results to the kapar input format.
+
+    \b
+    The files are read in parallel, through temporary files, and the traces are written
+    to the output file as they come.
+    Only the first trace of each IP path is kept: the paths already seen are tracked
+    with a Bloom filter, whose size depends only on --capacity and --error-rate.
+    """
+    seen = BloomFilter(capacity, error_rate)
+    print_kv("Bloom filter", f"{seen.nbytes / 2**20:.1f} MiB")
+
+    written, total = 0, 0
+    with TemporaryDirectory() as tmpdir, Pool(jobs) as p, output.open("w") as f:
+        worker = KaparWorker(Path(tmpdir), drop_private=not keep_private)
+        # `imap` preserves the order of the files, so that the output is deterministic.
+        it = p.imap(worker.do, enumerate(files), chunksize=1)
+        for traces in tqdm(it, total=len(files)):
+            with traces.open() as g:
+                for line in g:
+                    digest, trace = line.rstrip("\n").split("\t", 1)
+                    total += 1
+                    if seen.add(bytes.fromhex(digest)):
+                        f.write(trace.replace("\t", "\n"))
+                        f.write("\n")
+                        written += 1
+            traces.unlink()
+
+    print_kv("Unique paths", written)
+    print_kv("Duplicate paths", total - written)
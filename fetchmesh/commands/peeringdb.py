@@ -0,0 +1,37 @@
+import click
+
+from ..peeringdb import PeeringDBStore
+from .common import print_kv
+
+
+@click.group()
+def peeringdb():
+    """
+    Manage the local PeeringDB store.
+    """
+
+
+@peeringdb.command()
+def sync():
+    """
+    Sync the local PeeringDB store incrementally.
+    """
+    store = PeeringDBStore()
+    report = store.sync()
+    print_kv("Directory", store.directory)
+    print_kv("Sync", report)
+    if report.version:
+        print_kv("Version", report.version.isoformat())
+
+
+@peeringdb.command()
+def info():
+    """
+    Print the local PeeringDB store location and versions.
+    """
+    store = PeeringDBStore()
+    print_kv("Directory", store.directory)
+    for table, objects in store.tables.items():
+        print_kv(table, len(objects))
+    for version in store.versions():
+        print_kv("Version", version.isoformat())
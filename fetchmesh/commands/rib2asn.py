@@ -0,0 +1,74 @@
+import datetime as dt
+from pathlib import Path
+
+import click
+from pytz import UTC
+
+from ..bgp import ASNDB, Collector
+from ..bgp.mrt import rib_timestamp
+from ..meta import IPASNMeta, RIBMeta
+from .common import print_kv
+
+
+@click.command()
+@click.argument(
+    "files",
+    required=True,
+    nargs=-1,
+    type=click.Path(dir_okay=False, exists=True, resolve_path=True),
+)
+@click.option(
+    "--collector",
+    metavar="FQDN",
+    help="Collector of the RIBs, if not present in the file names (e.g. rrc00.ripe.net)",
+)
+@click.option(
+    "--dir",
+    "directory",
+    default=".",
+    show_default=True,
+    type=click.Path(file_okay=False, writable=True, resolve_path=True),
+    help="Output directory",
+)
+@click.option(
+    "--processes",
+    type=int,
+    help="Number of parsing processes [default: number of CPUs]",
+)
+def rib2asn(files, collector, directory, processes):
+    """
+    Convert MRT RIBs to IPASN files.
+
+    \b
+    The RIBs can be named as RIBMeta (rib_rrc00.ripe.net_201904170800.gz), in which case
+    the collector and the time are taken from the file name. Otherwise the collector must be
+    specified with --collector, and the time is taken from the MRT records.
+    Prefixes with multiple origins are supported, and the origins are sorted by decreasing
+    number of paths.
+    """
+    directory = Path(directory)
+    directory.mkdir(exist_ok=True, parents=True)
+
+    for file in files:
+        try:
+            rib = RIBMeta.from_filename(Path(file).name)
+            meta = IPASNMeta(rib.collector, rib.datetime)
+        except Exception:
+            if not collector:
+                raise click.BadParameter(
+                    f"cannot infer the collector of {file}", param_hint="--collector"
+                )
+            timestamp = rib_timestamp(file)
+            if timestamp is None:
+                print_kv("Skipped (empty)", file)
+                continue
+            c = Collector.from_fqdn(collector)
+            if c is None:
+                raise click.BadParameter(
+                    f"unknown collector {collector}", param_hint="--collector"
+                )
+            meta = IPASNMeta(c, dt.datetime.fromtimestamp(timestamp, UTC))
+        output = directory / meta.filename
+        db = ASNDB.from_rib(file, processes)
+        db.to_file(output, source=Path(file).name)
+        print_kv("Converted", f"{file} → {output}")
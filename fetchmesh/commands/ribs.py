@@ -0,0 +1,99 @@
+import datetime as dt
+from pathlib import Path
+
+import click
+from mbox.click import ParsedDate
+
+from ..bgp import Collector, RIBDownloader
+from ..meta import RIBMeta
+from .common import print_kv
+
+
+def rib_timestamps(start_date, stop_date, interval):
+    """Timestamps aligned on multiples of `interval` (since midnight), between the two dates."""
+    midnight = start_date.replace(hour=0, minute=0, second=0, microsecond=0)
+    steps = -((midnight - start_date) // interval)
+    t = midnight + steps * interval
+    while t <= stop_date:
+        yield t
+        t += interval
+
+
+@click.command()
+@click.option(
+    "--collector",
+    "collectors",
+    required=True,
+    multiple=True,
+    metavar="FQDN",
+    help="Collector (e.g. rrc00.ripe.net or route-views2.routeviews.org), can be repeated",
+)
+@click.option(
+    "--start-date",
+    default="yesterday",
+    show_default=True,
+    type=ParsedDate(settings={"RETURN_AS_TIMEZONE_AWARE": True, "TIMEZONE": "UTC"}),
+    help="RIBs start date (UTC)",
+)
+@click.option(
+    "--stop-date",
+    default="now",
+    show_default=True,
+    type=ParsedDate(settings={"RETURN_AS_TIMEZONE_AWARE": True, "TIMEZONE": "UTC"}),
+    help="RIBs stop date (UTC)",
+)
+@click.option(
+    "--interval",
+    default=8,
+    show_default=True,
+    metavar="HOURS",
+    type=click.IntRange(min=1),
+    help="Interval between two RIBs (RIS dumps every 8 hours, RouteViews every 2 hours)",
+)
+@click.option(
+    "--dir",
+    "directory",
+    default=".",
+    show_default=True,
+    type=click.Path(file_okay=False, writable=True, resolve_path=True),
+    help="Output directory",
+)
+@click.option(
+    "--threads",
+    default=8,
+    show_default=True,
+    type=click.IntRange(min=1),
+    help="Number of concurrent transfers",
+)
+@click.option(
+    "--segments",
+    default=4,
+    show_default=True,
+    type=click.IntRange(min=1),
+    help="Maximum number of parallel segments per (large) file",
+)
+def ribs(collectors, start_date, stop_date, interval, directory, threads, segments):
+    """
+    Download BGP RIBs from RIS and RouteViews collectors.
+
+    \b
+    The files are named as RIBMeta (e.g. rib_rrc00.ripe.net_202001010000.gz),
+    and can be converted to IPASN files with `fetchmesh rib2asn`.
+    Interrupted downloads are resumed on the next run.
+    """
+    tasks = []
+    for fqdn in collectors:
+        collector = Collector.from_fqdn(fqdn)
+        if collector is None:
+            raise click.BadParameter(
+                f"unknown collector {fqdn}", param_hint="--collector"
+            )
+        for t in rib_timestamps(start_date, stop_date, dt.timedelta(hours=interval)):
+            meta = RIBMeta(collector, t)
+            tasks.append((collector.table_url(t), Path(directory) / meta.filename))
+
+    downloader = RIBDownloader(threads=threads, segments=segments, progress=True)
+    report = downloader.download(tasks)
+    print_kv("Download", report)
+    for file in report.failed:
+        print_kv("Failed", file)
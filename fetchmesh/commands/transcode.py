@@ -0,0 +1,88 @@
+import time
+from functools import partial
+from multiprocessing import Pool
+
+import click
+from mbox.click import PathParam
+from tqdm import tqdm
+
+from ..transcode import TranscodeResult
+from ..transcode import transcode as transcode_file
+from ..transcode import transcoded_name
+from .common import print_kv
+
+
+@click.command()
+@click.option(
+    "--jobs",
+    default=1,
+    show_default=True,
+    metavar="N",
+    type=click.IntRange(min=1),
+    help="Number of parallel jobs to run",
+)
+@click.option(
+    "--level",
+    default=3,
+    show_default=True,
+    type=click.IntRange(min=1, max=22),
+    help="Zstandard compression level",
+)
+@click.option(
+    "--force",
+    default=False,
+    show_default=True,
+    is_flag=True,
+    help="Re-compress the files already compressed and indexed",
+)
+@click.argument("paths", required=True, nargs=-1, type=PathParam())
+def transcode(paths, jobs, level, force):
+    """
+    Convert results files to the compressed and indexed format.
+
+    \b
+    `PATHS` are results files, or directories containing `.ndjson` files.
+    Uncompressed files, and compressed files without a `.log`, are re-written with one
+    zstandard frame per record, and a `.log`. The original files are replaced only if the
+    new files contain the same number of records.
+    """
+    files = []
+    for path in paths:
+        if path.is_dir():
+            files.extend(sorted(path.glob("*.ndjson")))
+            files.extend(sorted(path.glob("*.ndjson.zst")))
+        else:
+            files.append(path)
+
+    start = time.monotonic()
+    results = []
+    # If both `x.ndjson` and `x.ndjson.zst` are specified, the first one would overwrite
+    # the second one, so we leave it to the user.
+    inputs = set(files)
+    conflicts = [
+        x for x in files if x != transcoded_name(x) and transcoded_name(x) in inputs
+    ]
+    for file in conflicts:
+        error = f"{transcoded_name(file).name} exists"
+        tqdm.write(f"Skipped: {file} ({error})")
+        results.append(TranscodeResult(file, None, "skipped", error=error))
+    files = [x for x in files if x not in conflicts]
+
+    fn = partial(transcode_file, level=level, force=force)
+    with Pool(jobs) as p:
+        for result in tqdm(p.imap_unordered(fn, files), total=len(files)):
+            if result.status == "failed":
+                tqdm.write(f"Failed: {result.src} ({result.error})")
+            results.append(result)
+    seconds = time.monotonic() - start
+
+    transcoded = [x for x in results if x.status == "transcoded"]
+    src_bytes = sum(x.src_bytes for x in transcoded)
+    dst_bytes = sum(x.dst_bytes for x in transcoded)
+    for status in ("transcoded", "skipped", "failed"):
+        print_kv(status.capitalize(), sum(x.status == status for x in results))
+    print_kv("Records", sum(x.records for x in transcoded))
+    print_kv("Size", f"{src_bytes / 1e6:.1f} MB -> {dst_bytes / 1e6:.1f} MB")
+    if src_bytes:
+        print_kv("Ratio", f"{dst_bytes / src_bytes:.1%}")
+    print_kv("Throughput", f"{src_bytes / 1e6 / max(seconds, 1e-9):.1f} MB/s")
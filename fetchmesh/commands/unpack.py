@@ -2,16 +2,22 @@ from collections import defaultdict
 from dataclasses import dataclass
 from multiprocessing import Pool
 from pathlib import Path
-from typing import List
+from typing import List, Optional
 
 import click
 from mbox.click import EnumChoice, ParsedDate, PathParam
-from mbox.itertools import groupby_stream
 from tqdm import tqdm
 
 from ..atlas import MeasurementAF, MeasurementType
-from ..io import AtlasRecordsReader, AtlasRecordsWriter
+from ..io import (
+    AtlasPairsWriter,
+    AtlasRecordsReader,
+    AtlasRecordsWriter,
+    AtlasRecordsWriterPool,
+    TraceroutePathsWriter,
+)
 from ..meta import AtlasResultsMeta
+from ..partition import HashPartitioner
 from .common import print_args, print_kv
 
 
@@ -20,42 +26,82 @@ class UnpackWorker:
     src: Path
     dst: Path
     mode: str
+    format: str = "ndjson"
+    max_open: Optional[int] = None
+    memory: int = 256 * 2**20
+    layout: str = "pairs"
 
     def do(self, metas: List[AtlasResultsMeta]):
-        key = lambda x: (x["msm_id"], x["prb_id"])
-
         # Find the timestamp of the first result, and of the last result.
         metas = sorted(metas, key=lambda x: x.start_date)
         start = metas[0].start_timestamp
         stop = metas[-1].stop_timestamp
-
-        # Keep track of already seen pairs, and of pairs to skip.
-        seen, skip = set(), set()
-
-        for meta in metas:
-            file = self.src.joinpath(meta.filename)
-            with AtlasRecordsReader(file) as r:
-                # We skip `None` records.
-                r = filter(lambda x: x, r)
-                for pair, records in groupby_stream(r, key, 10 ** 6):
+        # The files of a measurement share the same type and address family.
+        meta = metas[0]
+
+        if self.layout == "measurement":
+            output = self.dst / self.measurement_name(meta, start, stop)
+            # Skip mode: skip this measurement.
+            index = AtlasPairsWriter(output).index_file
+            if self.mode == "skip" and output.exists() and index.exists():
+                return
+
+        # (1) Partition the records by pair, on disk, so that each partition
+        # contains all the records of its pairs, whatever the order of the input.
+        partitioner = HashPartitioner(("msm_id", "prb_id"), memory=self.memory)
+
+        with partitioner:
+            for meta_ in metas:
+                file = self.src.joinpath(meta_.filename)
+                with AtlasRecordsReader(file) as r:
+                    # We skip `None` records.
+                    partitioner.addall(filter(lambda x: x, r))
+
+            # (2a) Write the records of all the pairs in a single file
+            if self.layout == "measurement":
+                with AtlasPairsWriter(output) as w:
+                    for (_, prb_id), records in partitioner.groups():
+                        w.write_pair(prb_id, records)
+                return
+
+            # (2b) Write the records of each pair
+            pool = AtlasRecordsWriterPool(self.writer(meta), max_open=self.max_open)
+            with pool:
+                for pair, records in partitioner.groups():
                     file = self.dst / self.output_name(meta, start, stop, *pair)
-                    if pair not in seen:
-                        # Overwrite mode: delete prior file.
-                        if self.mode == "overwrite" and file.exists():
-                            file.unlink()
-                        # Skip mode: skip this pair.
-                        if self.mode == "skip" and file.exists():
-                            skip.add(pair)
-                        seen.add(pair)
-                    if pair in skip:
+                    # Overwrite mode: delete prior file.
+                    if self.mode == "overwrite" and file.exists():
+                        file.unlink()
+                        if self.paths(meta):
+                            TraceroutePathsWriter(file).paths_file.unlink()
+                    # Skip mode: skip this pair.
+                    if self.mode == "skip" and file.exists():
                         continue
-                    with AtlasRecordsWriter(file, compression=False, append=True) as w:
-                        w.writeall(records)
+                    pool.writeall(file, records)
+
+    def paths(self, meta):
+        return self.format == "paths" and meta.type == MeasurementType.Traceroute
+
+    def writer(self, meta):
+        if self.paths(meta):
+            return TraceroutePathsWriter
+        return AtlasRecordsWriter
 
     @staticmethod
-    def output_name(meta, start, stop, msm_id, prb_id):
-        return "{}_v{}_{}_{}_{}_{}.ndjson".format(
-            meta.type.value, meta.af.value, start, stop, msm_id, prb_id
+    def measurement_name(meta, start, stop):
+        return "{}_v{}_{}_{}_{}.ndjson.zst".format(
+            meta.type.value, meta.af.value, start, stop, meta.msm_id
+        )
+
+    def output_name(self, meta, start, stop, msm_id, prb_id):
+        return "{}_v{}_{}_{}_{}_{}.{}".format(
+            meta.type.value,
+            meta.af.value,
+            start,
+            stop,
+            msm_id,
+            prb_id,
+            "tpd" if self.paths(meta) else "ndjson",
         )
 
 
@@ -94,6 +140,34 @@ class UnpackWorker:
     show_default=True,
     type=click.Choice(["append", "overwrite", "skip"]),
 )
+@click.option(
+    "--format",
+    default="ndjson",
+    show_default=True,
+    type=click.Choice(["ndjson", "paths"]),
+    help="Output format for traceroutes (`paths`: dictionary of distinct paths, see `TraceroutePathsWriter`)",
+)
+@click.option(
+    "--layout",
+    default="pairs",
+    show_default=True,
+    type=click.Choice(["pairs", "measurement"]),
+    help="One file per pair, or one compressed file per measurement, sorted by probe, with an index",
+)
+@click.option(
+    "--max-open",
+    metavar="N",
+    type=click.IntRange(min=1),
+    help="Maximum number of output files open at once, per job [default: from the file descriptors limit]",
+)
+@click.option(
+    "--memory",
+    default=256,
+    show_default=True,
+    metavar="MB",
+    type=click.IntRange(min=1),
+    help="Memory used to buffer the records before writing them to disk, per job",
+)
 @click.argument("src", required=True, type=PathParam())
 @click.argument("dst", required=False, type=PathParam())
 def unpack(**args):
@@ -104,9 +178,23 @@ def unpack(**args):
     `SRC` is a directory containing `.ndjson` files, and `DST` is an output directory.
     By default, `DST` is set to `SRC_pairs`.
 
+    \b
+    With `--layout measurement`, a single file is written per measurement, with the
+    records sorted by probe and timestamp, and an index of the records of each probe
+    (see `AtlasPairsReader`).
+
     """
     print_args(args, unpack)
 
+    if args["layout"] == "measurement" and args["mode"] == "append":
+        raise click.BadParameter(
+            "not supported with --layout measurement", param_hint="--mode"
+        )
+    if args["layout"] == "measurement" and args["format"] != "ndjson":
+        raise click.BadParameter(
+            "not supported with --layout measurement", param_hint="--format"
+        )
+
     if not args["dst"]:
         args["dst"] = args["src"].with_name(args["src"].name + "_pairs")
 
@@ -134,8 +222,22 @@ def unpack(**args):
     print_kv("Measurements", len(index))
 
     # (2) Unpack
-    worker = UnpackWorker(args["src"], args["dst"], args["mode"])
+    worker = UnpackWorker(
+        args["src"],
+        args["dst"],
+        args["mode"],
+        args["format"],
+        args["max_open"],
+        args["memory"] * 2**20,
+        args["layout"],
+    )
+    # Largest measurements first, to avoid ending the run with a single busy worker.
+    def size(metas):
+        return sum(args["src"].joinpath(m.filename).stat().st_size for m in metas)
+
+    groups = sorted(index.values(), key=size, reverse=True)
     # NOTE: Parallel processing is safe here since we process metadata sequentially
     # for a given measurement ID, and file names contains msm_id and prb_id.
     with Pool(args["jobs"]) as p:
-        list(tqdm(p.imap(worker.do, index.values()), total=len(index)))
+        it = p.imap_unordered(worker.do, groups, chunksize=1)
+        list(tqdm(it, total=len(groups)))
@@ -0,0 +1,180 @@
+"""
+Merging of results files of the same measurement, without decompressing the records.
+
+The compressed results files are sequences of independent zstandard frames (one per record),
+and the uncompressed files are sequences of lines, so that files can be merged by
+concatenating their bytes, and their ``.log`` sidecars (see :any:`LogEntry`).
+The records are decompressed only when changing the compression level,
+when merging compressed and uncompressed files, or when re-chunking files
+that span several windows (see :any:`split_file`).
+"""
+
+import datetime as dt
+import os
+from contextlib import ExitStack
+from dataclasses import replace
+from pathlib import Path
+from typing import BinaryIO, Dict, List, Optional, Union
+
+from pytz import UTC
+
+from .io import AtlasRecordsReader, AtlasRecordsWriter
+from .meta import AtlasResultsMeta
+
+
+def copy_range(src: BinaryIO, dst: BinaryIO, size: int) -> int:
+    """
+    Copy `size` bytes from the current position of `src` to the current position of `dst`.
+    ``os.copy_file_range`` is used when available, so that the data does not go through
+    user space (or is not copied at all, on filesystems supporting reflinks).
+    The files must be unbuffered (``buffering=0``).
+    """
+    remaining = size
+    if hasattr(os, "copy_file_range"):
+        try:
+            while remaining > 0:
+                n = os.copy_file_range(src.fileno(), dst.fileno(), remaining)
+                if n == 0:
+                    break
+                remaining -= n
+        except OSError:
+            # Not supported by the filesystem (e.g. across devices), the file
+            # positions have been updated by the kernel, so we can continue below.
+            pass
+    while remaining > 0:
+        data = src.read(min(remaining, 2**20))
+        if not data:
+            break
+        dst.write(data)
+        remaining -= len(data)
+    return size - remaining
+
+
+def concat_files(files: List[Path], output: Path):
+    with output.open("wb", buffering=0) as dst:
+        for file in files:
+            with file.open("rb", buffering=0) as src:
+                copy_range(src, dst, os.fstat(src.fileno()).st_size)
+
+
+def split_file(file: Path, window: int, directory: Path) -> List[Path]:
+    """
+    Split the records of `file` by windows of `window` seconds (aligned on the epoch),
+    into files written in `directory`, and return them in time order.
+    A file whose time window is within a single window (bounds included) is returned as-is,
+    without being read. Otherwise, the records are decompressed to read their timestamp.
+    """
+    meta = AtlasResultsMeta.from_filename(file.name)
+    first = meta.start_timestamp // window
+    if meta.stop_timestamp <= (first + 1) * window:
+        return [file]
+
+    def part(k: int) -> AtlasRecordsWriter:
+        start = max(meta.start_timestamp, k * window)
+        stop = min(meta.stop_timestamp, (k + 1) * window - 1)
+        if start > stop:
+            # Record outside of the window of the file.
+            start, stop = k * window, (k + 1) * window - 1
+        part = replace(
+            meta,
+            start_date=dt.datetime.fromtimestamp(start, UTC),
+            stop_date=dt.datetime.fromtimestamp(stop, UTC),
+        )
+        writer = AtlasRecordsWriter(
+            directory / part.filename, compression=meta.compressed, log=True
+        )
+        return stack.enter_context(writer)
+
+    writers: Dict[int, AtlasRecordsWriter] = {}
+    complete = False
+    with ExitStack() as stack:
+        # The reader does not reraise the exceptions, so we check that it read the whole file.
+        with AtlasRecordsReader(file) as r:
+            for record in r:
+                # We skip `None` records.
+                if not record:
+                    continue
+                k = record["timestamp"] // window
+                if k not in writers:
+                    writers[k] = part(k)
+                writers[k].write(record)
+            complete = True
+
+    if not complete:
+        for writer in writers.values():
+            writer.file.unlink()
+            writer.log_file.unlink()
+        raise ValueError(f"{file} cannot be read")
+    return [writers[k].file for k in sorted(writers)]
+
+
+def compact(
+    files: List[Union[Path, str]],
+    directory: Optional[Path] = None,
+    level: Optional[int] = None,
+) -> Path:
+    """
+    Merge the results files of a measurement into a single file covering their time windows.
+    The output is written in `directory` (by default, the directory of the first file).
+    If `level` is specified, the records are re-compressed at this level (and a log is written),
+    otherwise the files are concatenated as-is.
+    Returns the path of the output file.
+
+    .. code-block:: python
+
+        from fetchmesh.compact import compact
+
+        compact([
+            "ping_v4_1590969600_1590973200_1001.ndjson.zst",
+            "ping_v4_1590973200_1590976800_1001.ndjson.zst",
+        ])
+        # PosixPath('ping_v4_1590969600_1590976800_1001.ndjson.zst')
+    """
+    files = [Path(x) for x in files]
+    metas = sorted(
+        ((AtlasResultsMeta.from_filename(x.name), x) for x in files),
+        key=lambda x: x[0].start_date,
+    )
+    if len({(m.af, m.type, m.msm_id) for m, _ in metas}) > 1:
+        raise ValueError("the files must belong to the same measurement")
+
+    files = [x for _, x in metas]
+    first = metas[0][0]
+    # Files are concatenated only if they are all compressed, or all uncompressed.
+    recompress = level is not None or len({m.compressed for m, _ in metas}) > 1
+    compressed = recompress or first.compressed
+    meta = replace(
+        first,
+        start_date=min(m.start_date for m, _ in metas),
+        stop_date=max(m.stop_date for m, _ in metas),
+        compressed=compressed,
+    )
+
+    directory = Path(directory or files[0].parent)
+    directory.mkdir(exist_ok=True, parents=True)
+    output = directory / meta.filename
+    # Write to a temporary file, since the output may be one of the inputs.
+    tmp = output.with_name(output.name + ".tmp")
+    tmp_log = AtlasRecordsWriter(tmp).log_file
+    log_files = [AtlasRecordsWriter(x).log_file for x in files]
+
+    if recompress:
+        with AtlasRecordsWriter(
+            tmp, compression=True, compression_level=level or 3, log=True
+        ) as w:
+            # We skip `None` records.
+            w.writeall(x for x in AtlasRecordsReader.all(files) if x)
+    else:
+        concat_files(files, tmp)
+        # The log can be merged only if all the files have one.
+        if all(x.exists() for x in log_files):
+            concat_files(log_files, tmp_log)
+
+    tmp.replace(output)
+    output_log = AtlasRecordsWriter(output).log_file
+    if tmp_log.exists():
+        tmp_log.replace(output_log)
+    elif output_log.exists():
+        # Stale log of a previous output (or of an input with the same name).
+        output_log.unlink()
+    return output
@@ -0,0 +1,253 @@
+"""
+Adaptive concurrency control for the Atlas API.
+
+The controller state is kept in a small JSON file, protected by an advisory lock,
+so that it can be shared by all the worker processes of a fetch.
+"""
+
+import json
+import logging
+import os
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from email.utils import parsedate_to_datetime
+from pathlib import Path
+from typing import Optional
+
+from requests.exceptions import ConnectionError, HTTPError, Timeout
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover
+    # Non-POSIX platforms: the state file is not locked,
+    # which is fine as long as a single process uses it.
+    fcntl = None  # type: ignore
+
+log = logging.getLogger(__name__)
+
+CONGESTION_STATUSES = {429, 500, 502, 503, 504}
+
+
+def is_congestion(exception: BaseException) -> bool:
+    """Whether `exception` indicates that the API is overloaded or throttling us."""
+    if isinstance(exception, (ConnectionError, Timeout)):
+        return True
+    if isinstance(exception, HTTPError) and exception.response is not None:
+        return exception.response.status_code in CONGESTION_STATUSES
+    return False
+
+
+def retry_after(exception: BaseException) -> Optional[float]:
+    """Parse the ``Retry-After`` header (in seconds or as an HTTP date), if any."""
+    response = getattr(exception, "response", None)
+    if response is None:
+        return None
+    value = response.headers.get("Retry-After")
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        return max(parsedate_to_datetime(value).timestamp() - time.time(), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+
+class Slot:
+    """A concurrency slot acquired from an :any:`AIMDController`."""
+
+    def __init__(self):
+        self.start = time.monotonic()
+        self.latency: Optional[float] = None
+
+    def responded(self):
+        """
+        Record the latency at this point (e.g. when the response headers are received),
+        instead of when the slot is released.
+        """
+        if self.latency is None:
+            self.latency = time.monotonic() - self.start
+
+
+@dataclass(frozen=True)
+class AIMDController:
+    """
+    Additive-increase/multiplicative-decrease (AIMD) concurrency controller.
+
+    The number of concurrent requests allowed (the *limit*) is increased by one for each success
+    until the first congestion event (*slow start*), and then by one for each *limit* successes.
+    It is multiplied by `decrease` on throttling (429), server errors (5xx) and timeouts.
+    The ``Retry-After`` header is honored: no new slot is granted before the specified delay.
+
+    The controller does not hold any state in memory, so it can be sent to worker processes,
+    and all the workers using the same `file` share the same limit.
+
+    .. code-block:: python
+
+        from fetchmesh.controller import AIMDController
+
+        controller = AIMDController("/tmp/fetchmesh.ctl", max_limit=8)
+        with controller.slot() as slot:
+            r = session.get(url)
+            slot.responded()
+            r.raise_for_status()
+    """
+
+    file: Path
+    """Shared state file."""
+
+    min_limit: int = 1
+    """Minimum number of concurrent requests."""
+
+    max_limit: int = 16
+    """Maximum number of concurrent requests."""
+
+    initial_limit: int = 1
+    """Number of concurrent requests allowed at the beginning."""
+
+    decrease: float = 0.5
+    """Factor applied to the limit on congestion."""
+
+    latency_target: float = 15.0
+    """The limit is not increased if the (smoothed) latency is above this value (in seconds)."""
+
+    backoff: float = 5.0
+    """Pause (in seconds) after a throttling response without a ``Retry-After`` header."""
+
+    cooldown: float = 1.0
+    """Minimum time (in seconds) between two decreases, since concurrent requests tend to fail together."""
+
+    poll_interval: float = 0.1
+    """Interval (in seconds) between two attempts to acquire a slot."""
+
+    def __post_init__(self):
+        object.__setattr__(self, "file", Path(self.file))
+
+    @contextmanager
+    def _state(self):
+        fd = os.open(self.file, os.O_RDWR | os.O_CREAT, 0o644)
+        with os.fdopen(fd, "r+") as f:
+            if fcntl:
+                fcntl.flock(f, fcntl.LOCK_EX)
+            content = f.read()
+            state = json.loads(content) if content else self.initial_state()
+            yield state
+            f.seek(0)
+            f.truncate()
+            json.dump(state, f)
+            f.flush()
+
+    def initial_state(self) -> dict:
+        return {
+            "limit": float(self.initial_limit),
+            "ssthresh": float(self.max_limit),
+            "inflight": {},
+            "until": 0.0,
+            "decreased": 0.0,
+            "latency": None,
+        }
+
+    def state(self) -> dict:
+        """Return a copy of the current state."""
+        with self._state() as state:
+            return dict(state)
+
+    def try_acquire(self) -> bool:
+        pid = str(os.getpid())
+        now = time.time()
+        with self._state() as state:
+            inflight = state["inflight"]
+            # Forget the slots held by processes that died without releasing them.
+            for other in list(inflight):
+                if other != pid and not pid_exists(int(other)):
+                    del inflight[other]
+            if now < state["until"]:
+                return False
+            if sum(inflight.values()) >= int(state["limit"]):
+                return False
+            inflight[pid] = inflight.get(pid, 0) + 1
+            return True
+
+    def acquire(self):
+        """Block until a slot is available."""
+        while not self.try_acquire():
+            time.sleep(self.poll_interval)
+
+    def release(
+        self,
+        latency: Optional[float] = None,
+        congestion: bool = False,
+        pause: Optional[float] = None,
+    ):
+        """
+        Release a slot and update the limit.
+        `latency` is ``None`` if the request failed for a reason unrelated to congestion.
+        """
+        pid = str(os.getpid())
+        now = time.time()
+        with self._state() as state:
+            inflight = state["inflight"]
+            inflight[pid] = inflight.get(pid, 1) - 1
+            if inflight[pid] <= 0:
+                del inflight[pid]
+
+            if pause is not None:
+                state["until"] = max(state["until"], now + pause)
+
+            if congestion:
+                if now - state["decreased"] >= self.cooldown:
+                    limit = max(self.min_limit, state["limit"] * self.decrease)
+                    state["ssthresh"] = max(float(self.min_limit), limit)
+                    state["limit"] = limit
+                    state["decreased"] = now
+                    log.info("Congestion, limit decreased to %.2f", limit)
+            elif latency is not None:
+                if state["latency"] is None:
+                    state["latency"] = latency
+                else:
+                    state["latency"] = 0.8 * state["latency"] + 0.2 * latency
+                if state["latency"] <= self.latency_target:
+                    limit = state["limit"]
+                    if limit < state["ssthresh"]:
+                        limit += 1
+                    else:
+                        limit += 1 / limit
+                    state["limit"] = min(float(self.max_limit), limit)
+
+    @contextmanager
+    def slot(self):
+        """
+        Acquire a slot for the duration of the block.
+        Exceptions raised in the block are used to detect congestion, and are re-raised.
+        """
+        self.acquire()
+        slot = Slot()
+        try:
+            yield slot
+        except BaseException as e:
+            if is_congestion(e):
+                pause = retry_after(e)
+                if pause is None and isinstance(e, HTTPError):
+                    pause = self.backoff
+                self.release(congestion=True, pause=pause)
+            else:
+                self.release()
+            raise
+        slot.responded()
+        self.release(latency=slot.latency)
+
+
+def pid_exists(pid: int) -> bool:
+    # `os.kill` terminates the process on Windows.
+    if os.name != "posix":
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
@@ -0,0 +1,104 @@
+"""
+Streaming removal of the duplicate records of overlapping fetch windows.
+"""
+
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, Iterator, Optional, Set, Tuple
+
+from .bloom import BloomFilter
+
+
+def record_key(record: dict) -> str:
+    return f"{record['msm_id']} {record['prb_id']} {record['timestamp']}"
+
+
+def find_candidates(
+    records: Iterable[dict], capacity: int = 10_000_000, error_rate: float = 1e-6
+) -> Set[str]:
+    """
+    Keys of the records that may be duplicates, according to a :any:`BloomFilter`.
+    This contains the keys of all the duplicates, and of about ``error_rate`` of the other records.
+    """
+    seen = BloomFilter(capacity, error_rate)
+    return {record_key(x) for x in records if x and not seen.add(record_key(x))}
+
+
+@dataclass
+class RecordDeduplicator:
+    """
+    Drop the duplicate records, identified by ``(msm_id, prb_id, timestamp)``.
+    Duplicates typically come from consecutive fetch windows, which share their boundaries.
+
+    If the records are ordered by time (for each pair), only the last timestamp of each pair
+    is kept in memory (and the records older than this timestamp are dropped).
+    Otherwise, the records seen are tracked with a :any:`BloomFilter`, of fixed size.
+    The Bloom filter may drop a few records seen for the first time: to deduplicate the records
+    exactly, find the possible duplicates first with :any:`find_candidates`, and pass them
+    as `candidates`.
+
+    Unlike the filters, a deduplicator is stateful: the same instance must be used
+    for all the records to deduplicate.
+
+    .. code-block:: python
+
+        from fetchmesh.dedupe import RecordDeduplicator
+        from fetchmesh.io import AtlasRecordsReader
+
+        dedupe = RecordDeduplicator()
+        for record in AtlasRecordsReader.all(files, deduplicator=dedupe):
+            print(record)
+        dedupe.dropped
+        # 42
+    """
+
+    ordered: bool = False
+    """Whether the records of each pair are ordered by time."""
+
+    capacity: int = 10_000_000
+    """Expected number of distinct records, when the records are not ordered."""
+
+    error_rate: float = 1e-6
+    """Probability of dropping a record seen for the first time, when the records are not ordered."""
+
+    candidates: Optional[Set[str]] = None
+    """
+    Keys of the possible duplicates (see :any:`find_candidates`). If specified, the records
+    are deduplicated exactly, and only the records of these keys are tracked.
+    """
+
+    dropped: int = field(default=0, init=False)
+    """Number of records dropped."""
+
+    last: Dict[Tuple[int, int], int] = field(default_factory=dict, init=False)
+    seen: Optional[BloomFilter] = field(default=None, init=False, repr=False)
+    seen_candidates: Set[str] = field(default_factory=set, init=False, repr=False)
+
+    def __post_init__(self):
+        if not self.ordered and self.candidates is None:
+            self.seen = BloomFilter(self.capacity, self.error_rate)
+
+    def keep(self, record: dict) -> bool:
+        # We keep `None` records, they are handled by the readers.
+        if not record:
+            return True
+        if self.candidates is not None:
+            key = record_key(record)
+            keep = key not in self.candidates or key not in self.seen_candidates
+            if key in self.candidates:
+                self.seen_candidates.add(key)
+        elif self.seen is not None:
+            keep = self.seen.add(record_key(record))
+        else:
+            pair = (record["msm_id"], record["prb_id"])
+            last = self.last.get(pair)
+            keep = last is None or record["timestamp"] > last
+            if keep:
+                self.last[pair] = record["timestamp"]
+        self.dropped += not keep
+        return keep
+
+    def dedupe(self, records: Iterable[dict]) -> Iterator[dict]:
+        return filter(self.keep, records)
+
+    def __call__(self, records: Iterable[dict]) -> Iterator[dict]:
+        return self.dedupe(records)
@@ -1,18 +1,18 @@
 import logging
 from dataclasses import dataclass, field
 from pathlib import Path
-from typing import List
+from typing import List, Optional
 
-from requests.exceptions import ReadTimeout
 from tenacity import (
     before_sleep_log,
     retry,
-    retry_if_exception_type,
+    retry_if_exception,
     stop_after_attempt,
     wait_random,
 )
 
 from .atlas import AtlasClient
+from .controller import AIMDController, is_congestion
 from .io import AtlasRecordsWriter
 from .meta import AtlasResultsMeta
 
@@ -36,7 +36,11 @@ class SimpleFetcher:
     client: AtlasClient = field(default_factory=AtlasClient)
     filters: List = field(default_factory=list)
     log: bool = False
-    # retry_on_timeout: bool = True
+    controller: Optional[AIMDController] = None
+    """
+    Controller shared by all the workers, to adapt the number of concurrent
+    downloads to the API load. If None, the downloads are not paced.
+    """
 
     def __post_init__(self):
         self.directory.mkdir(exist_ok=True, parents=True)
@@ -51,18 +55,36 @@ class SimpleFetcher:
 
     @retry(
         reraise=True,
-        before_sleep=before_sleep_log(log, logging.WARN),
-        retry=retry_if_exception_type(ReadTimeout),
-        stop=stop_after_attempt(3),
+        # NOTE: `log` is shadowed by the field of the same name in the class body.
+        before_sleep=before_sleep_log(logging.getLogger(__name__), logging.WARN),
+        retry=retry_if_exception(is_congestion),
+        stop=stop_after_attempt(5),
         # NOTE: We don't wait too long before retrying, since
-        # the read timeout is already of 15 seconds.
+        # the read timeout is already of 15 seconds, and
+        # the controller enforces the `Retry-After` delays.
         wait=wait_random(min=1, max=2),
     )
     def _fetch(self, job, file):
+        if self.controller is None:
+            self._download(job, file)
+        else:
+            with self.controller.slot() as slot:
+                self._download(job, file, slot)
+
+    def _download(self, job, file, slot=None):
         it = self.client.fetch_results_stream(job.meta.remote_path(job.probes))
-        # TODO: Is there a risk of duplicate entries if
-        # there is a timeout in the middle of a write?
+        if slot:
+            slot.responded()
+        # The writer deletes the file on errors, but does not reraise them,
+        # so we reraise them for the job to be retried, or reported as failed.
+        error = None
         with AtlasRecordsWriter(
             file, filters=self.filters, compression=job.meta.compressed, log=self.log
         ) as w:
-            w.writeall(it)
+            try:
+                w.writeall(it)
+            except Exception as e:
+                error = e
+                raise
+        if error:
+            raise error
@@ -1,12 +1,22 @@
+import re
 from dataclasses import dataclass
-from typing import Set
+from typing import Callable, Optional, Set
 
 from ..atlas import MeasurementType
 from .abstract import StreamFilter
 
 
 class RecordFilter(StreamFilter[dict]):
-    ...
+    prefilter: Optional[Callable[[bytes], bool]] = None
+    """
+    Optional cheap test on the raw record (the undecoded line of the results file),
+    evaluated by :any:`AtlasRecordsReader` before parsing the record.
+    A prefilter may keep records rejected by `keep`, but it must not reject records
+    kept by `keep`. Subclasses can define it as a method ``prefilter(line: bytes) -> bool``.
+    """
+
+
+PROBE_ID_PATTERN = re.compile(rb'"prb_id": ?(\d+)')
 
 
 @dataclass(frozen=True)
@@ -16,6 +26,13 @@ class ProbeIDRecordFilter(RecordFilter):
     def keep(self, data):
         return data["prb_id"] in self.probe_ids
 
+    def prefilter(self, line):
+        # The field may also appear in a nested object, so the line is rejected
+        # only if none of the matches is one of the probes. If the field is not found,
+        # the record is parsed and `keep` decides.
+        matches = [int(m.group(1)) for m in PROBE_ID_PATTERN.finditer(line)]
+        return not matches or any(x in self.probe_ids for x in matches)
+
 
 @dataclass(frozen=True)
 class SelfRecordFilter(RecordFilter):
@@ -32,3 +49,14 @@ class RecordTypeFilter(RecordFilter):
 
     def keep(self, measurement):
         return measurement["type"] == self.type.value
+
+
+@dataclass(frozen=True)
+class TimeRangeRecordFilter(RecordFilter):
+    """Keep the records with ``start <= timestamp <= stop`` (UNIX timestamps)."""
+
+    start: int
+    stop: int
+
+    def keep(self, data):
+        return self.start <= data["timestamp"] <= self.stop
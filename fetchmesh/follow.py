@@ -0,0 +1,191 @@
+"""
+Incremental ingestion of the results of the anchoring mesh, for near-real-time monitoring.
+
+A :any:`Follower` remembers the end of the previous poll, so that each poll asks only
+for the results after it (minus a short settle lag), and the timestamp of the last record
+of each pair, so that only the new records are appended to rolling files, partitioned
+by time (one compressed file, with its ``.log`` index, per measurement and per `split` seconds).
+The results of the probes reporting late are caught up by a longer poll every `max_lag` seconds.
+"""
+
+import datetime as dt
+import json
+from collections import defaultdict
+from dataclasses import dataclass, field, replace
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+from pytz import UTC
+
+from .fetcher import FetchJob
+from .io import AtlasRecordsReader, AtlasRecordsWriter
+from .meta import AtlasResultsMeta
+
+
+@dataclass
+class Follower:
+    """
+    Rolling results files, and state of the ingestion, in `directory`.
+
+    .. code-block:: python
+
+        from fetchmesh.fetcher import SimpleFetcher
+        from fetchmesh.follow import Follower
+
+        follower = Follower(Path("results/"))
+        fetcher = SimpleFetcher(Path("staging/"))
+        while True:
+            now = datetime.now(UTC)
+            for meta, probes in measurements:
+                job = follower.job(meta, probes, now)
+                fetcher.fetch(job)
+                follower.add_file(fetcher.directory / job.meta.filename, job.meta)
+            time.sleep(300)
+    """
+
+    directory: Path
+
+    split: int = 3600
+    """Duration of the rolling files, in seconds."""
+
+    compression: bool = True
+
+    settle_lag: int = 300
+    """Delay, in seconds, before the end of the previous poll, from which each poll starts."""
+
+    max_lag: int = 3600
+    """
+    Every `max_lag` seconds, a poll starts `max_lag` seconds before the end of the previous poll,
+    to catch up the results of the probes reporting late.
+    """
+
+    buffer: int = 100_000
+    """Maximum number of records kept in memory before they are written to the rolling files."""
+
+    last: Dict[int, Dict[int, int]] = field(default_factory=dict, init=False)
+    """Timestamp of the last record, by measurement and probe."""
+
+    polled: Dict[int, int] = field(default_factory=dict, init=False)
+    """End of the last poll, by measurement."""
+
+    caught_up: Dict[int, int] = field(default_factory=dict, init=False)
+    """End of the last poll covering at least `max_lag` seconds, by measurement."""
+
+    def __post_init__(self):
+        self.directory = Path(self.directory)
+        self.directory.mkdir(exist_ok=True, parents=True)
+        if self.state_file.exists():
+            state = json.loads(self.state_file.read_text())
+            self.last = {
+                int(msm_id): {int(prb_id): ts for prb_id, ts in last.items()}
+                for msm_id, last in state["last"].items()
+            }
+            self.polled = {int(k): v for k, v in state["polled"].items()}
+            self.caught_up = {int(k): v for k, v in state.get("caught_up", {}).items()}
+
+    @property
+    def state_file(self) -> Path:
+        return self.directory / "follow.json"
+
+    def save(self):
+        tmp = self.state_file.with_suffix(".json.tmp")
+        tmp.write_text(
+            json.dumps(
+                {"last": self.last, "polled": self.polled, "caught_up": self.caught_up}
+            )
+        )
+        tmp.replace(self.state_file)
+
+    def job(
+        self, meta: AtlasResultsMeta, probes: List[int], stop_date: dt.datetime
+    ) -> Optional[FetchJob]:
+        """
+        Job to fetch the results of `probes` after the end of the previous poll
+        (minus `settle_lag`, or `max_lag` for a catch-up poll), until `stop_date`.
+        The start date of `meta` is used for a measurement not polled yet.
+        Returns None if there is nothing to fetch.
+        """
+        if meta.msm_id in self.polled:
+            polled = self.polled[meta.msm_id]
+            caught_up = self.caught_up.get(meta.msm_id, polled)
+            if stop_date.timestamp() - caught_up >= self.max_lag:
+                start = polled + 1 - self.max_lag
+            else:
+                start = polled + 1 - self.settle_lag
+        else:
+            start = meta.start_timestamp
+        if start > stop_date.timestamp():
+            return None
+        meta = replace(
+            meta,
+            start_date=dt.datetime.fromtimestamp(start, UTC),
+            stop_date=stop_date,
+            compressed=False,
+        )
+        return FetchJob(meta, probes)
+
+    def rolling_meta(self, meta: AtlasResultsMeta, timestamp: int) -> AtlasResultsMeta:
+        start = timestamp // self.split * self.split
+        return replace(
+            meta,
+            start_date=dt.datetime.fromtimestamp(start, UTC),
+            stop_date=dt.datetime.fromtimestamp(start + self.split - 1, UTC),
+            compressed=self.compression,
+        )
+
+    def add(self, records: Iterable[dict], meta: AtlasResultsMeta) -> int:
+        """
+        Append the records of the measurement of `meta` that are more recent than
+        the last record of their probe, and return the number of records added.
+        `meta` is the metadata of the poll (see :any:`job`).
+        """
+        last = self.last.setdefault(meta.msm_id, {})
+        new_last = dict(last)
+        partitions: Dict[int, List[dict]] = defaultdict(list)
+        added, buffered = 0, 0
+        for record in records:
+            # We skip `None` records.
+            if not record:
+                continue
+            prb_id, timestamp = record["prb_id"], record["timestamp"]
+            # The records of a poll are not necessarily ordered, so we compare them
+            # to the last timestamp of the previous polls.
+            if timestamp <= last.get(prb_id, -1):
+                continue
+            new_last[prb_id] = max(new_last.get(prb_id, -1), timestamp)
+            partitions[timestamp // self.split].append(record)
+            added += 1
+            buffered += 1
+            if buffered >= self.buffer:
+                self.flush(partitions, meta)
+                buffered = 0
+        self.flush(partitions, meta)
+
+        self.last[meta.msm_id] = new_last
+        self.polled[meta.msm_id] = meta.stop_timestamp
+        if meta.stop_timestamp - meta.start_timestamp >= self.max_lag:
+            self.caught_up[meta.msm_id] = meta.stop_timestamp
+        self.save()
+        return added
+
+    def flush(self, partitions: Dict[int, List[dict]], meta: AtlasResultsMeta):
+        """Append the records of `partitions` to the rolling files, and clear it."""
+        for records in partitions.values():
+            file = (
+                self.directory
+                / self.rolling_meta(meta, records[0]["timestamp"]).filename
+            )
+            with AtlasRecordsWriter(
+                file, append=True, log=True, compression=self.compression
+            ) as w:
+                w.writeall(records)
+        partitions.clear()
+
+    def add_file(self, file: Path, meta: AtlasResultsMeta) -> int:
+        """Add the records of a file fetched for a :any:`job`, and delete it."""
+        if not file.exists():
+            return 0
+        with AtlasRecordsReader(file) as r:
+            n = self.add(r, meta)
+        file.unlink()
+        return n
@@ -0,0 +1,237 @@
+"""
+IP and AS-level topology graphs built from traceroute results.
+
+A :any:`GraphBuilder` accumulates the edges of a stream of records in a hash table,
+and is then frozen into a :any:`Graph`, a compact CSR (compressed sparse row) adjacency
+stored on disk as a ``.npz`` file. A saved graph can be turned back into a builder,
+so that new results update the graph without rebuilding it from scratch.
+
+.. code-block:: python
+
+    from fetchmesh.graph import Graph, GraphBuilder
+    from fetchmesh.io import AtlasRecordsReader
+
+    builder = GraphBuilder(level="ip")
+    builder.add_records(AtlasRecordsReader.all(files))
+    graph = builder.freeze()
+    graph.save("graph.npz")
+
+    # Later, with new results:
+    builder = Graph.load("graph.npz").builder()
+    builder.add_records(AtlasRecordsReader.all(new_files))
+    builder.freeze().save("graph.npz")
+"""
+
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, Hashable, Iterable, Iterator, List, Tuple, Union
+
+import numpy as np
+
+from .transformers import TracerouteFlatIPTransformer
+
+LEVELS = ("ip", "asn")
+
+Edge = Tuple[Hashable, Hashable, int, int, int]
+"""Source node, destination node, count, first seen and last seen timestamps."""
+
+
+@dataclass
+class GraphBuilder:
+    """
+    Incremental graph builder.
+
+    Nodes are the reply addresses (``level="ip"``), or their origin AS (``level="asn"``),
+    in which case the records must have been annotated beforehand, e.g. with
+    :any:`TracerouteEnrichTransformer`.
+    An edge links the nodes of two consecutive responding hops. Its count is the number of
+    records in which it appears, along with the timestamps of the first and of the last record.
+    """
+
+    level: str = "ip"
+    """Graph level: ``ip`` or ``asn``."""
+
+    drop_private: bool = True
+    """Ignore private addresses."""
+
+    nodes: List[Hashable] = field(default_factory=list)
+    ids: Dict[Hashable, int] = field(default_factory=dict)
+    edges: Dict[Tuple[int, int], List[int]] = field(default_factory=dict)
+    """(count, first seen, last seen), by (source ID, destination ID)."""
+
+    sources: List[str] = field(default_factory=list)
+    """Keys of the sources (e.g. files) added to the graph (see :any:`add_source`)."""
+
+    def __post_init__(self):
+        if self.level not in LEVELS:
+            raise ValueError(f"level must be one of {LEVELS}")
+        self.transformer = TracerouteFlatIPTransformer(
+            as_set=True,
+            drop_dup=True,
+            drop_late=True,
+            drop_private=self.drop_private,
+            extras_fields=("asn",) if self.level == "asn" else (),
+            insert_none=False,
+        )
+
+    def node_id(self, key: Hashable) -> int:
+        id_ = self.ids.get(key)
+        if id_ is None:
+            id_ = len(self.nodes)
+            self.ids[key] = id_
+            self.nodes.append(key)
+        return id_
+
+    def add_record(self, record: dict):
+        flat = self.transformer(record)
+        hops = flat["asn"] if self.level == "asn" else flat["hops"]
+        timestamp = record["timestamp"]
+        record_edges = set()
+        prev: List[int] = []
+        for hop in hops:
+            curr = [self.node_id(x) for x in hop if x is not None]
+            record_edges.update((u, v) for u in prev for v in curr if u != v)
+            prev = curr
+        for edge in record_edges:
+            stats = self.edges.get(edge)
+            if stats is None:
+                self.edges[edge] = [1, timestamp, timestamp]
+            else:
+                stats[0] += 1
+                stats[1] = min(stats[1], timestamp)
+                stats[2] = max(stats[2], timestamp)
+
+    def add_records(self, records: Iterable[dict]):
+        for record in records:
+            if record and record.get("type", "traceroute") == "traceroute":
+                self.add_record(record)
+
+    def add_source(self, name: str, records: Iterable[dict]) -> bool:
+        """
+        Add the records of a named source (e.g. a file), unless it has already been added.
+        Returns true if the records were added.
+        """
+        if name in self.sources:
+            return False
+        self.add_records(records)
+        self.sources.append(name)
+        return True
+
+    def freeze(self) -> "Graph":
+        """Build the CSR representation of the graph."""
+        n = len(self.nodes)
+        if self.edges:
+            keys = np.array(list(self.edges.keys()), dtype=np.int64)
+            stats = np.array(list(self.edges.values()), dtype=np.int64)
+        else:
+            keys = np.zeros((0, 2), dtype=np.int64)
+            stats = np.zeros((0, 3), dtype=np.int64)
+        order = np.lexsort((keys[:, 1], keys[:, 0]))
+        keys, stats = keys[order], stats[order]
+        indptr = np.zeros(n + 1, dtype=np.int64)
+        np.cumsum(np.bincount(keys[:, 0], minlength=n), out=indptr[1:])
+        if self.level == "asn":
+            nodes = np.array(self.nodes, dtype=np.int64)
+        else:
+            nodes = np.array(self.nodes, dtype=str)
+        return Graph(
+            level=self.level,
+            nodes=nodes,
+            indptr=indptr,
+            indices=keys[:, 1].astype(np.uint32),
+            counts=stats[:, 0].astype(np.uint32),
+            first_seen=stats[:, 1],
+            last_seen=stats[:, 2],
+            sources=list(self.sources),
+        )
+
+
+@dataclass
+class Graph:
+    """
+    Directed graph in CSR format: the successors of the node ``i`` are
+    ``indices[indptr[i]:indptr[i + 1]]``, and the edges attributes are stored
+    in the `counts`, `first_seen` and `last_seen` arrays, in the same order.
+    """
+
+    level: str
+    nodes: np.ndarray
+    """Node keys (addresses or AS numbers), by ID."""
+    indptr: np.ndarray
+    indices: np.ndarray
+    counts: np.ndarray
+    first_seen: np.ndarray
+    last_seen: np.ndarray
+    sources: List[str] = field(default_factory=list)
+
+    def __len__(self):
+        """Number of nodes."""
+        return len(self.nodes)
+
+    @property
+    def n_edges(self) -> int:
+        return len(self.indices)
+
+    def node_id(self, key: Hashable) -> int:
+        """ID of a node, raises a `KeyError` if the node is not in the graph."""
+        if not hasattr(self, "_ids"):
+            self._ids = {k: i for i, k in enumerate(self.nodes.tolist())}
+        return self._ids[key]
+
+    def out_degrees(self) -> np.ndarray:
+        return np.diff(self.indptr)
+
+    def successors(self, key: Hashable) -> List[Hashable]:
+        i = self.node_id(key)
+        return self.nodes[self.indices[self.indptr[i] : self.indptr[i + 1]]].tolist()
+
+    def edges(self) -> Iterator[Edge]:
+        nodes = self.nodes.tolist()
+        sources = np.repeat(np.arange(len(self.nodes)), self.out_degrees())
+        yield from zip(
+            (nodes[i] for i in sources.tolist()),
+            (nodes[j] for j in self.indices.tolist()),
+            self.counts.tolist(),
+            self.first_seen.tolist(),
+            self.last_seen.tolist(),
+        )
+
+    def builder(self, drop_private: bool = True) -> GraphBuilder:
+        """Return a builder initialized with this graph, to add new records."""
+        builder = GraphBuilder(level=self.level, drop_private=drop_private)
+        for key in self.nodes.tolist():
+            builder.node_id(key)
+        for u, v, count, first, last in self.edges():
+            builder.edges[builder.ids[u], builder.ids[v]] = [count, first, last]
+        builder.sources = list(self.sources)
+        return builder
+
+    def save(self, file: Union[Path, str]):
+        """Write the graph to `file` (``.npz``), atomically."""
+        file = Path(file)
+        tmp = file.with_suffix(file.suffix + ".tmp")
+        with tmp.open("wb") as f:
+            np.savez(
+                f,
+                level=np.array(self.level),
+                nodes=self.nodes,
+                indptr=self.indptr,
+                indices=self.indices,
+                counts=self.counts,
+                first_seen=self.first_seen,
+                last_seen=self.last_seen,
+                sources=np.array(self.sources, dtype=str),
+            )
+        tmp.replace(file)
+
+    @classmethod
+    def load(cls, file: Union[Path, str]) -> "Graph":
+        with np.load(file) as arrays:
+            arrays = dict(arrays)
+        return cls(
+            **{
+                **arrays,
+                "level": str(arrays["level"]),
+                "sources": arrays["sources"].tolist(),
+            }
+        )
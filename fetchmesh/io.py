@@ -1,15 +1,21 @@
 import json
+import math
 import struct
+from collections import OrderedDict
 from dataclasses import dataclass, field
-from io import TextIOWrapper
+from functools import lru_cache
+from io import BufferedReader, TextIOWrapper
+from itertools import islice
 from pathlib import Path
 from traceback import print_exception
-from typing import Iterable, List, Optional
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple, Type
 
+from cached_property import cached_property
 from mbox.magic import CompressionFormat, detect_compression
 from mbox.optional import tryfunc
 from zstandard import ZstdCompressionDict, ZstdCompressor, ZstdDecompressor
 
+from .dedupe import RecordDeduplicator
 from .filters import StreamFilter
 from .transformers import RecordTransformer
 
@@ -31,6 +37,58 @@ If the file is compressed, the size is the size of the zstandard frame.
 The fields are unsigned longs of 8 bytes each : `size_bytes`, `msm_id`, `prb_id`.
 """
 
+PathEntry = struct.Struct("<qIIIH")
+"""
+Binary structure of a record in a path-dictionary file (see :any:`TraceroutePathsWriter`):
+`timestamp`, `msm_id`, `prb_id`, `path_id`, `paris_id`.
+It is followed by the RTTs of the replies, as 4-bytes floats (NaN if absent).
+"""
+
+PairEntry = struct.Struct("<QQQQ")
+"""
+Binary structure of an entry of the index of a pairs file (see :any:`AtlasPairsWriter`):
+`prb_id`, `offset` and `size` of the zstandard frame, and number of records.
+"""
+
+PATH_FIELDS = ("from", "dup", "late", "x", "err")
+"""Replies fields stored in the path dictionary, the other fields (except `rtt`) are dropped."""
+
+
+@lru_cache(maxsize=None)
+def compression_dict() -> ZstdCompressionDict:
+    """The zstandard :any:`dictionary`, read once per process."""
+    return ZstdCompressionDict(dictionary.read_bytes())
+
+
+def max_open_files(fds_per_file: int = 1, reserved: int = 64) -> int:
+    """
+    Number of files that can be kept open at the same time, given the soft limit
+    on the number of file descriptors of the process (``RLIMIT_NOFILE``).
+    """
+    try:
+        import resource
+
+        limit = resource.getrlimit(resource.RLIMIT_NOFILE)[0]
+        if limit == resource.RLIM_INFINITY:
+            limit = 1 << 16
+    except ImportError:  # pragma: no cover
+        limit = 512
+    return max(1, (limit - reserved) // fds_per_file)
+
+
+def transform_batches(
+    stream: Iterable[dict], transformers: List[RecordTransformer], batch_size: int
+) -> Iterator[dict]:
+    """Apply `transformers` to `stream`, by batches of `batch_size` records."""
+    stream = iter(stream)
+    while True:
+        batch = list(islice(stream, batch_size))
+        if not batch:
+            break
+        for fn in transformers:
+            batch = fn.transform_batch(batch)
+        yield from batch
+
 
 @dataclass
 class AtlasRecordsWriter:
@@ -69,6 +127,9 @@ class AtlasRecordsWriter:
     We use a pre-built dictionary (see :any:`dictionary`) to reduce the size of the compressed records.
     """
 
+    compression_level: int = 3
+    """Zstandard compression level (1-22)."""
+
     compression_ctx: Optional[ZstdCompressor] = field(default=None, init=False)
 
     @property
@@ -91,8 +152,9 @@ class AtlasRecordsWriter:
 
         # (3) Setup the compression context
         if self.compression:
-            dict_data = ZstdCompressionDict(dictionary.read_bytes())
-            self.compression_ctx = ZstdCompressor(dict_data=dict_data)
+            self.compression_ctx = ZstdCompressor(
+                level=self.compression_level, dict_data=compression_dict()
+            )
 
         return self
 
@@ -149,6 +211,105 @@ class AtlasRecordsWriter:
             self.write(record)
 
 
+@dataclass
+class AtlasRecordsWriterPool:
+    """
+    Pool of writers (one per output file), for writing records interleaved between many files.
+
+    Up to `max_open` writers are kept open, and the least recently used writer is closed
+    when a new file must be opened. The files are always opened in append mode, so that a
+    file can be closed, and re-opened later. The records are buffered per file, and written
+    by batches of `buffer_size` records.
+
+    .. code-block:: python
+
+        from fetchmesh.io import AtlasRecordsWriterPool
+
+        with AtlasRecordsWriterPool(compression=True) as pool:
+            for record in records:
+                pool.write(f"{record['msm_id']}_{record['prb_id']}.ndjson", record)
+    """
+
+    writer: Type = AtlasRecordsWriter
+    """Writer class (:any:`AtlasRecordsWriter` or :any:`TraceroutePathsWriter`)."""
+
+    compression: bool = False
+    """See :any:`AtlasRecordsWriter.compression`."""
+
+    max_open: Optional[int] = None
+    """Maximum number of open writers. By default, this depends on the file descriptors limit."""
+
+    buffer_size: int = 1024
+    """Number of records buffered per file before writing them."""
+
+    max_buffered: int = 2**16
+    """Maximum number of records buffered in total, all the buffers are written above this number."""
+
+    def __post_init__(self):
+        if self.max_open is None:
+            # A writer may also keep a log (or paths) file open.
+            self.max_open = min(max_open_files(fds_per_file=2), 1024)
+        self.writers: Dict[Path, Any] = OrderedDict()
+        self.buffers: Dict[Path, List[dict]] = {}
+        self.buffered = 0
+        self.opened = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def open(self, file: Path):
+        writer = self.writers.get(file)
+        if writer is not None:
+            self.writers.move_to_end(file)
+            return writer
+        while len(self.writers) >= self.max_open:  # type: ignore
+            _, evicted = self.writers.popitem(last=False)
+            evicted.__exit__(None, None, None)
+        kwargs = {"compression": self.compression} if self.compression else {}
+        writer = self.writer(file, append=True, **kwargs)
+        writer.__enter__()
+        self.writers[file] = writer
+        self.opened += 1
+        return writer
+
+    def flush_file(self, file: Path):
+        records = self.buffers.pop(file, None)
+        if records:
+            self.open(file).writeall(records)
+            self.buffered -= len(records)
+
+    def flush(self):
+        """Write all the buffered records."""
+        for file in list(self.buffers):
+            self.flush_file(file)
+
+    def write(self, file, record: dict):
+        """Write a single record to `file`."""
+        self.writeall(file, [record])
+
+    def writeall(self, file, records: Iterable[dict]):
+        """Write all the records to `file`."""
+        file = Path(file)
+        buffer = self.buffers.setdefault(file, [])
+        n = len(buffer)
+        buffer.extend(records)
+        self.buffered += len(buffer) - n
+        if len(buffer) >= self.buffer_size:
+            self.flush_file(file)
+        if self.buffered >= self.max_buffered:
+            self.flush()
+
+    def close(self):
+        """Write all the buffered records and close all the writers."""
+        self.flush()
+        while self.writers:
+            _, writer = self.writers.popitem(last=False)
+            writer.__exit__(None, None, None)
+
+
 @dataclass
 class AtlasRecordsReader:
     """
@@ -184,6 +345,18 @@ class AtlasRecordsReader:
     transformers: List[RecordTransformer] = field(default_factory=list)
     """List of transformers to apply when reading the records."""
 
+    batch_size: int = 1024
+    """
+    Number of records passed at once to the transformers.
+    See :any:`RecordTransformer.transform_batch`.
+    """
+
+    deduplicator: Optional[RecordDeduplicator] = None
+    """
+    Drop the duplicate records, after the filters and before the transformers.
+    The same deduplicator can be shared between readers (e.g. with :any:`all`).
+    """
+
     def __post_init__(self):
         self.file = Path(self.file)
 
@@ -203,27 +376,44 @@ class AtlasRecordsReader:
 
         # (2) Setup the decompressor, if needed
         if codec == CompressionFormat.Zstandard:
-            dict_data = ZstdCompressionDict(dictionary.read_bytes())
-            ctx = ZstdDecompressor(dict_data=dict_data)
+            ctx = ZstdDecompressor(dict_data=compression_dict())
             self.fb = ctx.stream_reader(self.fb, read_across_frames=True)
 
-        # (3) Decode the file
-        self.fb = TextIOWrapper(self.fb, "utf-8")
+        # (3) Decode the file, or apply the prefilters on the raw lines
+        # (see `RecordFilter.prefilter`), and parse only the remaining lines.
+        prefilters = [
+            fn.prefilter for fn in self.filters if getattr(fn, "prefilter", None)
+        ]
+        if prefilters:
+            if codec == CompressionFormat.Zstandard:
+                self.fb = BufferedReader(self.fb)
+            lines = filter(lambda line: all(fn(line) for fn in prefilters), self.fb)
+        else:
+            self.fb = TextIOWrapper(self.fb, "utf-8")
+            lines = self.fb
 
         # (4) Deserialize the records
-        stream = map(json_tryloads, self.fb)
+        stream = map(json_tryloads, lines)
 
         # (5) Apply the filters
         stream = filter(
             lambda record: all(fn.keep(record) for fn in self.filters), stream
         )
 
-        # (6) Apply the transformers
-        for fn in self.transformers:
-            stream = map(fn, stream)
+        # (6) Drop the duplicates
+        if self.deduplicator:
+            stream = self.deduplicator.dedupe(stream)
+
+        # (7) Apply the transformers
+        if self.transformers:
+            stream = self.transform(stream)
 
         return stream
 
+    def transform(self, stream: Iterable[dict]) -> Iterator[dict]:
+        """Apply the transformers to `stream`, by batches of `batch_size` records."""
+        return transform_batches(stream, self.transformers, self.batch_size)
+
     def __exit__(self, exc_type, exc_value, traceback):
         self.fb.close()
         self.f.close()
@@ -245,3 +435,379 @@ class AtlasRecordsReader:
         """Read multiple files from a glob pattern."""
         files = Path(path).glob(pattern)
         return cls.all(files, **kwargs)
+
+
+@dataclass
+class AtlasPairsWriter:
+    """
+    Write the results of a measurement in a single compressed file, sorted by probe and time.
+
+    The records of a probe are compressed in a single zstandard frame, and the frames are
+    sorted by probe ID. The position of each frame is stored in `index_file`
+    (see :any:`PairEntry`), so that the records of a probe can be read with a single seek
+    (see :any:`AtlasPairsReader`). The file itself can also be read with :any:`AtlasRecordsReader`.
+
+    The frames are first written to a temporary file, in any order, and are copied in order
+    to the output file when the writer is closed, after the index.
+
+    .. code-block:: python
+
+        from fetchmesh.io import AtlasPairsWriter
+        with AtlasPairsWriter("traceroute_v4_1001.ndjson.zst") as w:
+            w.write_pair(6001, [{"msm_id": 1001, "prb_id": 6001, "...": "..."}])
+    """
+
+    file: Path
+    """Output file path."""
+
+    def __post_init__(self):
+        self.file = Path(self.file)
+
+    @property
+    def index_file(self) -> Path:
+        """Path to the index file."""
+        return self.file.with_suffix(self.file.suffix + ".idx")
+
+    @property
+    def tmp_file(self) -> Path:
+        return self.file.with_suffix(self.file.suffix + ".tmp")
+
+    def __enter__(self):
+        self.f = self.tmp_file.open("wb")
+        self.compression_ctx = ZstdCompressor(dict_data=compression_dict())
+        self.entries: List[Tuple[int, int, int, int]] = []
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.f.close()
+        if exc_type:
+            self.tmp_file.unlink()
+            print_exception(exc_type, exc_value, traceback)
+        else:
+            self.finalize()
+        # Do not reraise exceptions, excepted for KeyboardInterrupt.
+        return exc_type is not KeyboardInterrupt
+
+    def finalize(self):
+        # The output file is moved in place last, so that its index exists if it exists.
+        entries, offset = [], 0
+        sorted_file = self.file.with_suffix(self.file.suffix + ".sorted")
+        with self.tmp_file.open("rb") as src, sorted_file.open("wb") as dst:
+            for prb_id, src_offset, size, count in sorted(self.entries):
+                src.seek(src_offset)
+                dst.write(src.read(size))
+                entries.append(PairEntry.pack(prb_id, offset, size, count))
+                offset += size
+        self.index_file.write_bytes(b"".join(entries))
+        sorted_file.replace(self.file)
+        self.tmp_file.unlink()
+
+    def write_pair(self, prb_id: int, records: List[dict]):
+        """Write the records of a probe, sorted by timestamp."""
+        records = sorted(records, key=lambda x: x["timestamp"])
+        data = "".join(json_trydumps(record) + "\n" for record in records)
+        data = self.compression_ctx.compress(data.encode("utf-8"))
+        self.entries.append((prb_id, self.f.tell(), len(data), len(records)))
+        self.f.write(data)
+
+
+@dataclass
+class AtlasPairsReader:
+    """
+    Read the records of a probe from a file written by :any:`AtlasPairsWriter`.
+
+    .. code-block:: python
+
+        from fetchmesh.io import AtlasPairsReader
+        r = AtlasPairsReader("traceroute_v4_1001.ndjson.zst")
+        r.probes()
+        # [6001, 6002, ...]
+        r.read(6001)
+        # [{"msm_id": 1001, "prb_id": 6001, "...": "..."}, ...]
+    """
+
+    file: Path
+    """Input file path."""
+
+    def __post_init__(self):
+        self.file = Path(self.file)
+
+    @property
+    def index_file(self) -> Path:
+        """Path to the index file."""
+        return self.file.with_suffix(self.file.suffix + ".idx")
+
+    @cached_property
+    def index(self) -> Dict[int, Tuple[int, int, int]]:
+        """`offset`, `size` and number of records, by probe ID."""
+        data = self.index_file.read_bytes()
+        return {prb_id: rest for prb_id, *rest in PairEntry.iter_unpack(data)}
+
+    def probes(self) -> List[int]:
+        return list(self.index)
+
+    def read(self, prb_id: int) -> List[dict]:
+        """Read the records of a probe, raises a `KeyError` if the probe is absent."""
+        offset, size, _ = self.index[prb_id]
+        with self.file.open("rb") as f:
+            f.seek(offset)
+            data = f.read(size)
+        ctx = ZstdDecompressor(dict_data=compression_dict())
+        lines = ctx.decompress(data).decode("utf-8").splitlines()
+        return [json_tryloads(line) for line in lines]
+
+
+@dataclass
+class TraceroutePathsWriter:
+    """
+    Write traceroute results as a dictionary of distinct paths, and a stream of records
+    referencing these paths.
+
+    A path is the part of a record that rarely changes between two traceroutes:
+    the source and destination addresses, and the hops replies (without the RTTs).
+    Each distinct path is stored once, in `paths_file` (one JSON object per line,
+    the path ID is the line number).
+    The records are stored in `file`, as a zstandard stream of :any:`PathEntry`,
+    each followed by the RTTs of the replies of the path.
+
+    .. code-block:: python
+
+        from fetchmesh.io import TraceroutePathsWriter
+        with TraceroutePathsWriter("results.tpd") as w:
+            w.write({"msm_id": 1001, "prb_id": 1, "type": "traceroute", "...": "..."})
+    """
+
+    file: Path
+    """Output file path."""
+
+    filters: List[StreamFilter[dict]] = field(default_factory=list)
+    """List of filters to apply before writing the records."""
+
+    append: bool = False
+    """
+    Whether to create a new file, or to append the records to an existing file.
+    In append mode, the existing paths are re-used.
+    See :any:`AtlasRecordsWriter.append`.
+    """
+
+    paths: Dict[str, int] = field(default_factory=dict, init=False)
+
+    @property
+    def paths_file(self) -> Path:
+        """Path to the paths dictionary."""
+        return self.file.with_suffix(self.file.suffix + ".paths")
+
+    def __post_init__(self):
+        self.file = Path(self.file)
+
+    def __enter__(self):
+        mode = "ab" if self.append else "wb"
+        self.paths = {}
+        if self.append and self.paths_file.exists():
+            with self.paths_file.open("rb") as f:
+                for i, line in enumerate(f):
+                    self.paths[line.decode("utf-8").rstrip("\n")] = i
+        self.f = self.file.open(mode)
+        self.paths_f = self.paths_file.open(mode)
+        self.compression_ctx = ZstdCompressor().compressobj()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.f.write(self.compression_ctx.flush())
+        self.f.close()
+        self.paths_f.close()
+        if exc_type:
+            if not self.append:
+                self.file.unlink()
+                self.paths_file.unlink()
+            print_exception(exc_type, exc_value, traceback)
+        # Do not reraise exceptions, excepted for KeyboardInterrupt.
+        return exc_type is not KeyboardInterrupt
+
+    @staticmethod
+    def split(record: dict) -> Tuple[dict, List[float]]:
+        """Split a traceroute record into its path and the RTTs of its replies."""
+        hops, rtts = [], []
+        for hop in record.get("result", []):
+            hop = hop.copy()
+            replies = []
+            for reply in hop.get("result", []):
+                replies.append({k: v for k, v in reply.items() if k in PATH_FIELDS})
+                rtts.append(reply.get("rtt", math.nan))
+            if "result" in hop:
+                hop["result"] = replies
+            hops.append(hop)
+        path = {
+            "from": record.get("from"),
+            "src_addr": record.get("src_addr"),
+            "dst_addr": record.get("dst_addr"),
+            "result": hops,
+        }
+        return path, rtts
+
+    def write(self, record: dict):
+        """Write a single record."""
+
+        # (1) Filter the record
+        for filter_ in self.filters:
+            if not filter_.keep(record):
+                return
+
+        # (2) Find or add the path
+        path, rtts = self.split(record)
+        key = json.dumps(path, separators=(",", ":"))
+        path_id = self.paths.get(key)
+        if path_id is None:
+            path_id = len(self.paths)
+            self.paths[key] = path_id
+            self.paths_f.write((key + "\n").encode("utf-8"))
+
+        # (3) Write the record
+        data = PathEntry.pack(
+            record["timestamp"],
+            record["msm_id"],
+            record["prb_id"],
+            path_id,
+            record.get("paris_id", 0),
+        )
+        data += struct.pack(f"<{len(rtts)}f", *rtts)
+        self.f.write(self.compression_ctx.compress(data))
+
+    def writeall(self, records: Iterable[dict]):
+        """Write all the records."""
+
+        for record in records:
+            self.write(record)
+
+
+@dataclass
+class TraceroutePathsReader:
+    """
+    Read traceroute results written by :any:`TraceroutePathsWriter`.
+    The records are rebuilt from the paths dictionary, and can be passed to
+    :any:`TracerouteFlatIPTransformer`. The fields not stored in the dictionary
+    (e.g. `size`, `ttl`, `endtime`) are absent.
+
+    .. code-block:: python
+
+        from fetchmesh.io import TraceroutePathsReader
+
+        with TraceroutePathsReader("results.tpd") as r:
+            for record in r:
+                print(record)
+
+        # Path changes, without rebuilding the records.
+        reader = TraceroutePathsReader("results.tpd")
+        with reader:
+            path_ids = [entry[3] for entry, rtts in reader.entries()]
+    """
+
+    file: Path
+    """Input file path."""
+
+    filters: List[StreamFilter[dict]] = field(default_factory=list)
+    """List of filters to apply when reading the records."""
+
+    transformers: List[RecordTransformer] = field(default_factory=list)
+    """List of transformers to apply when reading the records."""
+
+    batch_size: int = 1024
+    """See :any:`AtlasRecordsReader.batch_size`."""
+
+    paths: List[dict] = field(default_factory=list, init=False)
+
+    @property
+    def paths_file(self) -> Path:
+        """Path to the paths dictionary."""
+        return self.file.with_suffix(self.file.suffix + ".paths")
+
+    def __post_init__(self):
+        self.file = Path(self.file)
+
+    def __enter__(self):
+        with self.paths_file.open("rb") as f:
+            self.paths = [json.loads(line) for line in f]
+        # Number of replies (and thus of RTTs) of each path.
+        self.sizes = [
+            sum(len(hop.get("result", [])) for hop in path["result"])
+            for path in self.paths
+        ]
+        self.f = self.file.open("rb")
+        self.fb = ZstdDecompressor().stream_reader(self.f, read_across_frames=True)
+
+        stream = map(self.record, self.entries())
+        stream = filter(
+            lambda record: all(fn.keep(record) for fn in self.filters), stream
+        )
+        if self.transformers:
+            stream = transform_batches(stream, self.transformers, self.batch_size)
+        return stream
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.fb.close()
+        self.f.close()
+        if exc_type:
+            print_exception(exc_type, exc_value, traceback)
+        # Do not reraise exceptions, excepted for KeyboardInterrupt.
+        return exc_type is not KeyboardInterrupt
+
+    def read(self, n: int) -> bytes:
+        data = self.fb.read(n)
+        while data and len(data) < n:
+            chunk = self.fb.read(n - len(data))
+            if not chunk:
+                break
+            data += chunk
+        return data
+
+    def entries(self) -> Iterator[Tuple[Tuple[int, int, int, int, int], List[float]]]:
+        """
+        Iterate over the raw records: a :any:`PathEntry` tuple
+        (`timestamp`, `msm_id`, `prb_id`, `path_id`, `paris_id`) and the RTTs.
+        """
+        while True:
+            data = self.read(PathEntry.size)
+            if not data:
+                break
+            entry = PathEntry.unpack(data)
+            n = self.sizes[entry[3]]
+            rtts = list(struct.unpack(f"<{n}f", self.read(4 * n)))
+            yield entry, rtts
+
+    def record(self, item) -> dict:
+        """Rebuild a record from an entry."""
+        (timestamp, msm_id, prb_id, path_id, paris_id), rtts = item
+        path = self.paths[path_id]
+        rtts_ = iter(rtts)
+        hops = []
+        for hop in path["result"]:
+            hop = hop.copy()
+            if "result" in hop:
+                replies = []
+                for reply in hop["result"]:
+                    reply = reply.copy()
+                    rtt = next(rtts_)
+                    if not math.isnan(rtt):
+                        reply["rtt"] = round(rtt, 3)
+                    replies.append(reply)
+                hop["result"] = replies
+            hops.append(hop)
+        return {
+            "type": "traceroute",
+            "timestamp": timestamp,
+            "msm_id": msm_id,
+            "prb_id": prb_id,
+            "paris_id": paris_id,
+            "from": path["from"],
+            "src_addr": path["src_addr"],
+            "dst_addr": path["dst_addr"],
+            "result": hops,
+        }
+
+    @classmethod
+    def all(cls, files, **kwargs):
+        """Read multiple files."""
+        for file in files:
+            with cls(Path(file), **kwargs) as rdr:
+                for record in rdr:
+                    yield record
@@ -1,7 +1,10 @@
 import json
 from collections import defaultdict
+from datetime import datetime
 from itertools import product
+from typing import Iterable, Iterator, Optional, Tuple
 
+import numpy as np
 from cached_property import cached_property
 
 from .atlas import AtlasAnchor, AtlasClient, AtlasMeasurement
@@ -159,11 +162,14 @@ class AnchoringMesh:
         return None
 
     @classmethod
-    def from_api(cls, client=AtlasClient()):
+    def from_api(cls, client=AtlasClient(), store=None):
         """
         Instantiate the AnchoringMesh from ``anchor-measurements/?include=target,measurement``.
+        If `store` is specified, the measurements are synced incrementally from the API
+        (see :any:`MeasurementStore`).
         """
-        records = client.fetch_anchoring_measurements()
+        # Objects are built while the next pages are being fetched.
+        records = client.iter_anchoring_measurements(store)
         data = []
         for x in records:
             anchor = AtlasAnchor.from_dict(x["target"])
@@ -186,3 +192,110 @@ class AnchoringMesh:
     def to_json(self, path):
         with open(path, "w") as f:
             json.dump(self._data, f, default=serialize)
+
+
+class AnchoringMeshIndex:
+    """
+    Interval index of the measurements of a mesh, over their validity period
+    (from ``start_date`` to ``stop_date``, without end if the measurement is not stopped),
+    to query the mesh at many dates without scanning all the measurements for each date.
+    The measurements without a start date are ignored, and a stop date before the
+    start date is considered equal to it.
+
+    .. code-block:: python
+
+        from datetime import datetime, timedelta
+        from pytz import UTC
+        from fetchmesh.mesh import AnchoringMesh, AnchoringMeshIndex
+
+        index = AnchoringMeshIndex(AnchoringMesh.from_api())
+
+        # Equivalent to `mesh.filter(MeasurementDateFilter.running(date, date))`
+        mesh = index.running(datetime(2019, 1, 1, tzinfo=UTC))
+
+        # Number of active anchors and running measurements, every day of 2019
+        dates = [datetime(2019, 1, 1, tzinfo=UTC) + timedelta(days=i) for i in range(365)]
+        for date, n_anchors, n_measurements in index.series(dates):
+            print(date, n_anchors, n_measurements)
+    """
+
+    def __init__(self, mesh: AnchoringMesh):
+        # pylint: disable=protected-access
+        # The API may return the same measurement several times.
+        self._data = list(dict.fromkeys(x for x in mesh._data if x[1].start_date))
+        self._starts = np.array(
+            [m.start_date.timestamp() for _, m in self._data], dtype=np.float64
+        )
+        self._stops = np.array(
+            [m.stop_date.timestamp() if m.stop_date else np.inf for _, m in self._data],
+            dtype=np.float64,
+        )
+        self._stops = np.maximum(self._starts, self._stops)
+        self._by_start = np.argsort(self._starts, kind="stable")
+        self._by_stop = np.argsort(self._stops, kind="stable")
+        self._sorted_starts = self._starts[self._by_start]
+        self._sorted_stops = self._stops[self._by_stop]
+
+    def __len__(self):
+        return len(self._data)
+
+    def _bounds(self, start_date: datetime, stop_date: Optional[datetime]):
+        a = start_date.timestamp()
+        b = (stop_date or start_date).timestamp()
+        # Measurements started before `b`, and measurements stopped before `a`.
+        started = int(np.searchsorted(self._sorted_starts, b, side="right"))
+        stopped = int(np.searchsorted(self._sorted_stops, a, side="left"))
+        return a, b, started, stopped
+
+    def count(self, start_date: datetime, stop_date: Optional[datetime] = None) -> int:
+        """
+        Number of measurements running during ``[start_date, stop_date]``
+        (at `start_date` if `stop_date` is not specified), in logarithmic time.
+        """
+        _, _, started, stopped = self._bounds(start_date, stop_date)
+        # A measurement stopped before `a` has also started before `b`.
+        return started - stopped
+
+    def running(
+        self, start_date: datetime, stop_date: Optional[datetime] = None
+    ) -> AnchoringMesh:
+        """
+        Mesh of the measurements running during ``[start_date, stop_date]``
+        (at `start_date` if `stop_date` is not specified).
+        Only the smaller of the candidate sets (the measurements started before `stop_date`,
+        or the measurements not stopped before `start_date`) is scanned.
+        """
+        a, b, started, stopped = self._bounds(start_date, stop_date)
+        if started <= len(self) - stopped:
+            ids = self._by_start[:started]
+            ids = ids[self._stops[ids] >= a]
+        else:
+            ids = self._by_stop[stopped:]
+            ids = ids[self._starts[ids] <= b]
+        return AnchoringMesh([self._data[i] for i in np.sort(ids)])
+
+    def series(self, dates: Iterable[datetime]) -> Iterator[Tuple[datetime, int, int]]:
+        """
+        Number of active anchors (with at least one running measurement), and number of
+        running measurements, at each date, in a single sweep over the sorted start and
+        stop dates. `dates` must be sorted.
+        """
+        anchors: dict = {}
+        anchor_ids = np.array(
+            [anchors.setdefault(x, len(anchors)) for x, _ in self._data], dtype=np.int64
+        )
+        running = np.zeros(len(anchors), dtype=np.int64)
+        n_anchors, i, j = 0, 0, 0
+        for date in dates:
+            t = date.timestamp()
+            while i < len(self) and self._sorted_starts[i] <= t:
+                anchor = anchor_ids[self._by_start[i]]
+                running[anchor] += 1
+                n_anchors += running[anchor] == 1
+                i += 1
+            while j < len(self) and self._sorted_stops[j] < t:
+                anchor = anchor_ids[self._by_stop[j]]
+                running[anchor] -= 1
+                n_anchors -= running[anchor] == 0
+                j += 1
+            yield date, int(n_anchors), i - j
@@ -124,6 +124,13 @@ class IPASNMeta:
             self.collector.fqdn, self.datetime.strftime("%Y%m%d%H%M")
         )
 
+    @property
+    def table_filename(self) -> str:
+        """Name of the compiled :any:`PrefixTable` file."""
+        return "ipasn_{}_{}.tbl".format(
+            self.collector.fqdn, self.datetime.strftime("%Y%m%d%H%M")
+        )
+
     @classmethod
     def from_filename(cls, name: str) -> "IPASNMeta":
         m = unwrap(cls.PATTERN.search(str(name)))
@@ -1,6 +1,9 @@
 from pathlib import Path
+from threading import Lock
 
 from mbox.requests import RequestsMock
+from requests import Response
+from requests.structures import CaseInsensitiveDict
 
 
 def requests_mock():
@@ -16,3 +19,42 @@ def requests_mock():
     mock.register(r".*archive.routeviews.org.*", root / "rib.20180131.0800.bz2")
     mock.register(r".*data.ris.ripe.net.*", root / "bview.20190417.0800.gz")
     return mock.request
+
+
+class ThrottlingMock:
+    """
+    Wrap a mocked ``Session.request`` (such as the one returned by :any:`requests_mock`)
+    and answer with `status` (and an optional ``Retry-After`` header) to the first
+    request, and then to one request out of `every`.
+
+    .. code-block:: python
+
+        mock = ThrottlingMock(requests_mock(), every=2, retry_after=1)
+        monkeypatch.setattr("requests.sessions.Session.request", mock.request)
+    """
+
+    def __init__(self, request, every=2, status=429, retry_after=None):
+        self.request_ = request
+        self.every = every
+        self.status = status
+        self.retry_after = retry_after
+        self.count = 0
+        self.throttled = 0
+        self.lock = Lock()
+
+    def request(self, method, url, *args, **kwargs):
+        with self.lock:
+            self.count += 1
+            throttle = (self.count - 1) % self.every == 0
+            if throttle:
+                self.throttled += 1
+        if not throttle:
+            return self.request_(method, url, *args, **kwargs)
+        r = Response()
+        r.status_code = self.status
+        r.url = url
+        r.headers = CaseInsensitiveDict()
+        if self.retry_after is not None:
+            r.headers["Retry-After"] = str(self.retry_after)
+        r._content = b""  # pylint: disable=protected-access
+        return r
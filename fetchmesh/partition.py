@@ -0,0 +1,210 @@
+"""
+Spill-to-disk grouping of records that do not fit in memory.
+
+The records are hashed by key into a fixed number of zstandard-compressed partition files,
+under a memory budget. A partition then contains every record of its keys, and can be
+grouped in memory (and processed in parallel with the other partitions).
+The partitions that would not fit in the memory budget once parsed (see :any:`partition_groups`)
+are partitioned again, with another hash.
+"""
+
+import json
+import zlib
+from collections import defaultdict
+from dataclasses import dataclass
+from multiprocessing import Pool
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple, TypeVar
+
+from zstandard import ZstdCompressor
+
+from .io import AtlasRecordsReader, compression_dict
+
+T = TypeVar("T")
+
+Key = Tuple
+"""Values of the key fields of a record."""
+
+PARSED_SIZE_RATIO = 8
+"""Approximate ratio of the memory used by the parsed records to their serialized size."""
+
+
+def record_key(record: dict, fields: Tuple[str, ...]) -> Key:
+    return tuple(record[field] for field in fields)
+
+
+def partition_groups(
+    file: Path, fields: Tuple[str, ...]
+) -> Iterator[Tuple[Key, List[dict]]]:
+    """
+    Group the records of a partition file by key.
+    The records of a group are in the order in which they were added to the partitioner.
+    """
+    groups: Dict[Key, List[dict]] = defaultdict(list)
+    with AtlasRecordsReader(file) as r:
+        for record in r:
+            groups[record_key(record, fields)].append(record)
+    yield from groups.items()
+
+
+@dataclass
+class HashPartitioner:
+    """
+    Partition records by the value of the `key` fields.
+
+    .. code-block:: python
+
+        from fetchmesh.io import AtlasRecordsReader
+        from fetchmesh.partition import HashPartitioner, partition_groups
+
+        with HashPartitioner(("msm_id", "prb_id"), memory=64 * 2**20) as p:
+            p.addall(AtlasRecordsReader.all(files))
+            for file in p.files():
+                for (msm_id, prb_id), records in partition_groups(file, p.key):
+                    print(msm_id, prb_id, len(records))
+    """
+
+    key: Tuple[str, ...]
+    """Name of the fields used to group the records."""
+
+    partitions: int = 64
+    """
+    Number of partitions. A partition contains about ``1 / partitions`` of the records.
+    The partitions too large to be grouped in `memory` are partitioned again (see :any:`files`).
+    """
+
+    memory: int = 64 * 2**20
+    """
+    Maximum size (in bytes) of the serialized records buffered before writing them to disk,
+    and of the parsed records of a partition (except for the partitions of a single key),
+    estimated with :any:`PARSED_SIZE_RATIO`.
+    """
+
+    directory: Optional[Path] = None
+    """Directory of the partition files. By default, a temporary directory is used."""
+
+    level: int = 0
+    """Number of times the records have been partitioned before (see :any:`partition`)."""
+
+    def __post_init__(self):
+        self.tmp = None
+        if self.directory is None:
+            self.tmp = TemporaryDirectory(prefix="fetchmesh_")
+            self.directory = Path(self.tmp.name)
+        self.directory = Path(self.directory)
+        self.directory.mkdir(exist_ok=True, parents=True)
+        self.buffers = [bytearray() for _ in range(self.partitions)]
+        self.buffered = 0
+        self.written = [False] * self.partitions
+        self.sizes = [0] * self.partitions
+        self.children: Dict[int, HashPartitioner] = {}
+        self.ctx = ZstdCompressor(dict_data=compression_dict())
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.cleanup()
+
+    def partition(self, key: Key) -> int:
+        # `hash()` is randomized for strings, so we use a stable hash.
+        # The partitions of each level are given by a different "digit" of the hash.
+        h = zlib.crc32(repr(key).encode("utf-8"))
+        return h // self.partitions**self.level % self.partitions
+
+    def file(self, partition: int) -> Path:
+        return self.directory / f"partition_{partition:04d}.ndjson.zst"  # type: ignore
+
+    def add(self, record: dict):
+        partition = self.partition(record_key(record, self.key))
+        if partition in self.children:
+            self.children[partition].add(record)
+            return
+        data = (json.dumps(record) + "\n").encode("utf-8")
+        buffer = self.buffers[partition]
+        buffer += data
+        self.buffered += len(data)
+        if self.buffered >= self.memory:
+            self.flush()
+
+    def addall(self, records: Iterable[dict]):
+        for record in records:
+            self.add(record)
+
+    def flush(self):
+        """Write the buffered records to the partition files, one zstandard frame per partition."""
+        for i, buffer in enumerate(self.buffers):
+            if buffer:
+                with self.file(i).open("ab") as f:
+                    f.write(self.ctx.compress(bytes(buffer)))
+                self.written[i] = True
+                self.sizes[i] += len(buffer)
+                buffer.clear()
+        self.buffered = 0
+
+    def files(self) -> List[Path]:
+        """
+        Flush the buffers and return the (non-empty) partition files.
+        The partitions whose parsed records would be larger than `memory` are replaced
+        by the files of their partitions.
+        """
+        self.flush()
+        for i, written in enumerate(self.written):
+            if written and self.sizes[i] * PARSED_SIZE_RATIO > self.memory:
+                self.repartition(i)
+        files = [self.file(i) for i, written in enumerate(self.written) if written]
+        for child in self.children.values():
+            files.extend(child.files())
+        return files
+
+    def repartition(self, partition: int):
+        """Partition again the records of `partition`, unless they all have the same key."""
+        child = HashPartitioner(
+            self.key,
+            self.partitions,
+            self.memory,
+            self.directory / f"partition_{partition:04d}",  # type: ignore
+            self.level + 1,
+        )
+        with AtlasRecordsReader(self.file(partition)) as r:
+            child.addall(r)
+        child.flush()
+        if sum(child.written) > 1:
+            self.file(partition).unlink()
+            self.written[partition] = False
+            self.children[partition] = child
+        else:
+            child.cleanup()
+            # Do not try again.
+            self.sizes[partition] = 0
+
+    def groups(self) -> Iterator[Tuple[Key, List[dict]]]:
+        """Iterate over all the groups, one partition at a time."""
+        for file in self.files():
+            yield from partition_groups(file, self.key)
+
+    def map(self, fn: Callable[[Path], T], jobs: int = 1) -> Iterator[T]:
+        """
+        Apply `fn` to each partition file, in `jobs` processes.
+        `fn` must be picklable, and will typically call :any:`partition_groups`.
+        """
+        files = self.files()
+        if jobs == 1:
+            yield from map(fn, files)
+            return
+        with Pool(jobs) as p:
+            yield from p.imap_unordered(fn, files)
+
+    def cleanup(self):
+        for i, written in enumerate(self.written):
+            if written:
+                self.file(i).unlink()
+        self.written = [False] * self.partitions
+        for child in self.children.values():
+            child.cleanup()
+        self.children = {}
+        if self.level:
+            self.directory.rmdir()  # type: ignore
+        if self.tmp:
+            self.tmp.cleanup()
@@ -1,3 +1,4 @@
 from .client import *
 from .db import *
 from .objects import *
+from .store import *
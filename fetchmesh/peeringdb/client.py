@@ -1,7 +1,8 @@
 import logging
 
 import requests
-from mbox.cache import Cache
+
+from ..cache import HTTPCache
 
 PEERINGDB_API_URL = "https://peeringdb.com/api"
 
@@ -11,20 +12,36 @@ class BasePeeringDBClient:
         self.base_url = base_url
         self.timeout = timeout
         self.logger = logging.getLogger(__name__)
-        self.cache = Cache("fetchmesh")
+        self.cache = HTTPCache()
 
-    def get(self, endpoint, **kwargs):
+    def get(self, endpoint, params=None, cache=True, **kwargs):
         url = f"{self.base_url}/{endpoint}"
-        f = lambda: requests.get(url, timeout=self.timeout, **kwargs)
+        f = lambda headers: requests.get(
+            url, params=params, headers=headers, timeout=self.timeout, **kwargs
+        )
+        if not cache or params:
+            res = f({})
+            res.raise_for_status()
+            return res.json()["data"]
         return self.cache.get(url, f).json()["data"]
 
 
 class PeeringDBClient(BasePeeringDBClient):
-    def fetch_ixs(self):
-        return self.get("ix.json")
-
-    def fetch_ixlans(self):
-        return self.get("ixlan.json")
-
-    def fetch_ixpfxs(self):
-        return self.get("ixpfx.json")
+    def fetch(self, table, since=None):
+        """
+        Fetch the objects of `table` (e.g. ``ix``).
+        If `since` (a UNIX timestamp) is specified, fetch only the objects
+        updated (or deleted) since this time, bypassing the cache.
+        """
+        if since is None:
+            return self.get(f"{table}.json")
+        return self.get(f"{table}.json", params={"since": int(since)})
+
+    def fetch_ixs(self, since=None):
+        return self.fetch("ix", since)
+
+    def fetch_ixlans(self, since=None):
+        return self.fetch("ixlan", since)
+
+    def fetch_ixpfxs(self, since=None):
+        return self.fetch("ixpfx", since)
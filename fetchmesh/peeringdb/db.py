@@ -1,9 +1,10 @@
 from dataclasses import dataclass
-from typing import List
+from typing import Dict, Iterable, List
 
 from mbox.itertools import groupby
 from radix import Radix
 
+from ..bgp import PrefixTable
 from .client import PeeringDBClient
 from .objects import IX, LAN, Prefix
 
@@ -48,12 +49,38 @@ class PeeringDB:
                 rnode.data["ix"] = obj.ix
         return rtree
 
+    def prefix_table(self) -> PrefixTable:
+        """
+        Return a compiled longest-prefix-match table, mapping addresses to IX IDs.
+        See :any:`PeeringDBStore` for tables persisted on disk.
+        """
+        return PrefixTable.from_prefixes(
+            (prefix.prefix, [obj.ix.id])
+            for obj in self.objects
+            for prefix in obj.prefixes
+        )
+
+    def ix_names(self) -> Dict[int, str]:
+        return {obj.ix.id: obj.ix.name for obj in self.objects}
+
     @classmethod
     def from_api(cls, client=PeeringDBClient()) -> "PeeringDB":
         """Load PeeringDB from the PeeringDB API."""
-        ixs = [IX.from_dict(x) for x in client.fetch_ixs()]
-        lans = [LAN.from_dict(x) for x in client.fetch_ixlans()]
-        pfxs = [Prefix.from_dict(x) for x in client.fetch_ixpfxs()]
+        return cls.from_dicts(
+            client.fetch_ixs(), client.fetch_ixlans(), client.fetch_ixpfxs()
+        )
+
+    @classmethod
+    def from_dicts(
+        cls,
+        ix_dicts: Iterable[dict],
+        ixlan_dicts: Iterable[dict],
+        ixpfx_dicts: Iterable[dict],
+    ) -> "PeeringDB":
+        """Load PeeringDB from the objects returned by the API."""
+        ixs = [IX.from_dict(x) for x in ix_dicts]
+        lans = [LAN.from_dict(x) for x in ixlan_dicts]
+        pfxs = [Prefix.from_dict(x) for x in ixpfx_dicts]
 
         pfxs_by_lan = groupby(pfxs, lambda x: x.ixlan_id)
         lans_by_ix = groupby(lans, lambda x: x.ix_id)
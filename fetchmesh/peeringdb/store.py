@@ -0,0 +1,200 @@
+import datetime as dt
+import json
+import logging
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple, Union
+
+from appdirs import user_data_dir
+from zstandard import ZstdCompressor, ZstdDecompressor
+
+from ..bgp import PrefixTable
+from .client import PeeringDBClient
+from .db import PeeringDB
+
+DEFAULT_STORE_DIR = Path(user_data_dir("fetchmesh")) / "peeringdb"
+
+TABLES = ("ix", "ixlan", "ixpfx")
+
+VERSION_FORMAT = "%Y%m%d%H%M%S"
+
+
+@dataclass
+class PeeringDBSyncReport:
+    """Summary of the changes applied to a :any:`PeeringDBStore` by a sync."""
+
+    added: Dict[str, int] = field(default_factory=dict)
+    """Number of objects added, by table."""
+
+    updated: Dict[str, int] = field(default_factory=dict)
+    """Number of objects updated, by table."""
+
+    deleted: Dict[str, int] = field(default_factory=dict)
+    """Number of objects deleted, by table."""
+
+    full: bool = False
+    """Whether the store was empty and all the objects were downloaded."""
+
+    version: Optional[dt.datetime] = None
+    """Version created by the sync, if anything changed."""
+
+    def __str__(self):
+        return "{} added, {} updated, {} deleted{}".format(
+            sum(self.added.values()),
+            sum(self.updated.values()),
+            sum(self.deleted.values()),
+            " (full sync)" if self.full else "",
+        )
+
+
+class PeeringDBStore:
+    """
+    Local copy of the PeeringDB ``ix``, ``ixlan`` and ``ixpfx`` tables,
+    kept up-to-date incrementally with the ``since`` parameter of the API.
+
+    Each sync that changes the tables creates a new dated version, made of the tables
+    (``peeringdb_{version}.json.zst``) and of the IX prefixes compiled into a
+    memory-mappable :any:`PrefixTable` (``ixpfx_{version}.tbl``) mapping addresses to IX IDs.
+    Loading a version does not require any network access, nor building a radix tree.
+
+    .. code-block:: python
+
+        from fetchmesh.peeringdb import PeeringDBStore
+
+        store = PeeringDBStore()
+        report = store.sync()
+        print(report)
+        # 2 added, 5 updated, 0 deleted
+
+        table, names = store.prefix_table()
+        ix_id = table.lookup_first(["80.81.192.1"])[0]
+        names[ix_id]
+        # 'DE-CIX Frankfurt'
+    """
+
+    def __init__(self, directory: Union[Path, str] = DEFAULT_STORE_DIR):
+        self.directory = Path(directory)
+        self.logger = logging.getLogger(__name__)
+        self.last_sync: Optional[int] = None
+        self.tables: Dict[str, Dict[int, dict]] = {table: {} for table in TABLES}
+        if self.state_file.exists():
+            self.load()
+
+    @property
+    def state_file(self) -> Path:
+        return self.directory / "state.json"
+
+    def tables_file(self, version: dt.datetime) -> Path:
+        return self.directory / f"peeringdb_{version.strftime(VERSION_FORMAT)}.json.zst"
+
+    def table_file(self, version: dt.datetime) -> Path:
+        return self.directory / f"ixpfx_{version.strftime(VERSION_FORMAT)}.tbl"
+
+    def versions(self) -> List[dt.datetime]:
+        """Available versions, oldest first."""
+        versions = []
+        for file in self.directory.glob("peeringdb_*.json.zst"):
+            version = file.name[len("peeringdb_") : -len(".json.zst")]
+            versions.append(
+                dt.datetime.strptime(version, VERSION_FORMAT).replace(
+                    tzinfo=dt.timezone.utc
+                )
+            )
+        return sorted(versions)
+
+    def version(self, at: Optional[dt.datetime] = None) -> dt.datetime:
+        """Latest version, or latest version before `at`."""
+        versions = [x for x in self.versions() if at is None or x <= at]
+        if not versions:
+            raise LookupError(f"No PeeringDB version in {self.directory}")
+        return versions[-1]
+
+    def load(self):
+        state = json.loads(self.state_file.read_text())
+        self.last_sync = state["last_sync"]
+        self.tables = self.read_tables(self.version())
+
+    def read_tables(self, version: dt.datetime) -> Dict[str, Dict[int, dict]]:
+        data = ZstdDecompressor().decompress(self.tables_file(version).read_bytes())
+        return {
+            table: {int(k): v for k, v in objects.items()}
+            for table, objects in json.loads(data).items()
+        }
+
+    def save(self, version: dt.datetime):
+        self.directory.mkdir(exist_ok=True, parents=True)
+        # Write the version before the state, so that the state never points to a missing version.
+        data = ZstdCompressor().compress(json.dumps(self.tables).encode("utf-8"))
+        tmp = self.directory / "tables.tmp"
+        tmp.write_bytes(data)
+        tmp.replace(self.tables_file(version))
+        self.peeringdb().prefix_table().save(self.table_file(version))
+        tmp = self.state_file.with_suffix(".tmp")
+        tmp.write_text(json.dumps({"last_sync": self.last_sync}))
+        tmp.replace(self.state_file)
+
+    def apply(self, table: str, objects: List[dict], report: PeeringDBSyncReport):
+        for key in ("added", "updated", "deleted"):
+            getattr(report, key).setdefault(table, 0)
+        for x in objects:
+            prev = self.tables[table].get(x["id"])
+            if x.get("status") == "deleted":
+                if prev is not None:
+                    del self.tables[table][x["id"]]
+                    report.deleted[table] += 1
+                continue
+            if prev is None:
+                report.added[table] += 1
+            elif prev != x:
+                report.updated[table] += 1
+            else:
+                continue
+            self.tables[table][x["id"]] = x
+
+    def sync(self, client=PeeringDBClient()) -> PeeringDBSyncReport:
+        """Fetch the objects changed since the last sync, and create a new version if needed."""
+        report = PeeringDBSyncReport()
+        # We take the time *before* the requests, so that objects
+        # updated while we are syncing are picked up by the next sync.
+        now = int(time.time())
+
+        since = self.last_sync
+        if since is None or not any(self.tables.values()):
+            report.full = True
+            since = None
+
+        for table in TABLES:
+            self.apply(table, client.fetch(table, since), report)
+
+        changed = report.full or any(
+            sum(getattr(report, key).values())
+            for key in ("added", "updated", "deleted")
+        )
+        self.last_sync = now
+        if changed:
+            report.version = dt.datetime.fromtimestamp(now, dt.timezone.utc)
+            self.save(report.version)
+        else:
+            # Only move the sync time forward.
+            self.state_file.write_text(json.dumps({"last_sync": self.last_sync}))
+
+        self.logger.info("Synced %s: %s", self.directory, report)
+        return report
+
+    def peeringdb(self, at: Optional[dt.datetime] = None) -> PeeringDB:
+        """Return the latest version (or the latest version before `at`) as a :any:`PeeringDB`."""
+        tables = self.tables if at is None else self.read_tables(self.version(at))
+        return PeeringDB.from_dicts(*(tables[table].values() for table in TABLES))
+
+    def prefix_table(
+        self, at: Optional[dt.datetime] = None
+    ) -> Tuple[PrefixTable, Dict[int, str]]:
+        """
+        Return the memory-mapped IX prefix table of the latest version (or of the latest
+        version before `at`), and the names of the IXs by ID.
+        """
+        version = self.version(at)
+        tables = self.tables if at is None else self.read_tables(version)
+        names = {k: v["name"] for k, v in tables["ix"].items()}
+        return PrefixTable.load(self.table_file(version)), names
@@ -0,0 +1,220 @@
+"""
+Cost-based scheduling of fetch jobs.
+
+Jobs sizes differ by orders of magnitude (number of probes, window length, measurement interval).
+To avoid a long tail of large jobs at the end of a run, we dispatch the largest jobs first,
+and we split the remaining long windows when workers would otherwise be idle.
+"""
+
+import datetime as dt
+import heapq
+import itertools
+import json
+from contextlib import suppress
+from dataclasses import replace
+from pathlib import Path
+from statistics import median
+from typing import Dict, Iterable, List, Optional, Set, Tuple, Union
+
+from appdirs import user_data_dir
+from pytz import UTC
+
+from .fetcher import FetchJob
+from .meta import AtlasResultsMeta
+
+DEFAULT_RATES_FILE = Path(user_data_dir("fetchmesh")) / "rates.json"
+
+DEFAULT_PROBES = 1000
+"""
+Number of probes assumed for the jobs without a probes list (all the probes),
+before the rate of such jobs is known.
+"""
+
+
+def fromtimestamp(timestamp: int) -> dt.datetime:
+    return dt.datetime.fromtimestamp(timestamp, UTC)
+
+
+class ByteRates:
+    """
+    Past byte rates of the measurements, in bytes per probe per second of results,
+    and in bytes per second of results for the jobs of all the probes (`totals`).
+    """
+
+    def __init__(
+        self,
+        rates: Optional[Dict[int, float]] = None,
+        file=None,
+        totals: Optional[Dict[int, float]] = None,
+    ):
+        self.rates = rates or {}
+        self.totals = totals or {}
+        self.file = file
+
+    def __getitem__(self, msm_id: int) -> float:
+        if msm_id in self.rates:
+            return self.rates[msm_id]
+        # For unknown measurements, we use the median rate
+        # of the known ones, or an arbitrary (but equal) rate.
+        if self.rates:
+            return median(self.rates.values())
+        return 1.0
+
+    def total(self, msm_id: int) -> float:
+        """Rate of the results of all the probes, in bytes per second."""
+        if msm_id in self.totals:
+            return self.totals[msm_id]
+        # The number of probes of the measurement is unknown.
+        return DEFAULT_PROBES * self[msm_id]
+
+    def update(self, msm_id: int, size: int, probes: int, seconds: float):
+        """
+        Record the size of the results of `probes` probes (0 for all the probes)
+        over `seconds` seconds.
+        """
+        if size <= 0 or probes < 0 or seconds <= 0:
+            return
+        if probes:
+            rates, rate = self.rates, size / (probes * seconds)
+        else:
+            rates, rate = self.totals, size / seconds
+        if msm_id in rates:
+            # Exponential smoothing, since rates vary with the number of active probes.
+            rate = 0.5 * rates[msm_id] + 0.5 * rate
+        rates[msm_id] = rate
+
+    @classmethod
+    def load(cls, file: Union[Path, str, None] = None) -> "ByteRates":
+        file = Path(file or DEFAULT_RATES_FILE)
+        data = {}
+        if file.exists():
+            data = json.loads(file.read_text())
+        rates = {int(k): v for k, v in data.get("rates", {}).items()}
+        totals = {int(k): v for k, v in data.get("totals", {}).items()}
+        return cls(rates, file, totals)
+
+    def save(self):
+        if self.file is None:
+            return
+        self.file.parent.mkdir(exist_ok=True, parents=True)
+        tmp = self.file.with_suffix(self.file.suffix + ".tmp")
+        tmp.write_text(json.dumps({"rates": self.rates, "totals": self.totals}))
+        tmp.replace(self.file)
+
+
+class FetchScheduler:
+    """
+    Priority queue of :any:`FetchJob`, largest (estimated) jobs first.
+
+    .. code-block:: python
+
+        scheduler = FetchScheduler(jobs, ByteRates.load())
+        while scheduler:
+            scheduler.balance(idle_workers)
+            job = scheduler.pop()
+    """
+
+    def __init__(
+        self,
+        jobs: Iterable[FetchJob],
+        rates: ByteRates,
+        min_window: Optional[dt.timedelta] = dt.timedelta(hours=1),
+        directory: Optional[Path] = None,
+    ):
+        """
+        Windows are split on boundaries aligned on `min_window`, so that a job is always
+        split the same way, and they are never split if `min_window` is None. If `directory` is specified, the jobs whose output already
+        exists are not split, and the jobs split by a previous run are split again
+        the same way, so that the outputs of their parts are reused.
+        """
+        self.rates = rates
+        self.min_window = min_window
+        self.counter = itertools.count()
+        self.queue: List[Tuple[float, int, FetchJob]] = []
+        self.outputs: Set[str] = set()
+        if directory and Path(directory).exists():
+            self.outputs = {x.name for x in Path(directory).iterdir()}
+        # Measurements with outputs, to avoid looking for the parts of the other jobs.
+        self.output_msm_ids = set()
+        for name in self.outputs:
+            with suppress(Exception):
+                self.output_msm_ids.add(AtlasResultsMeta.from_filename(name).msm_id)
+        for job in jobs:
+            for part in self.parts(job):
+                self.push(part)
+
+    def __len__(self):
+        return len(self.queue)
+
+    def cost(self, job: FetchJob) -> float:
+        """Estimated size of the results, in bytes."""
+        seconds = (job.meta.stop_date - job.meta.start_date).total_seconds()
+        # An empty probes list means all the probes of the measurement.
+        if not job.probes:
+            return seconds * self.rates.total(job.meta.msm_id)
+        return len(job.probes) * seconds * self.rates[job.meta.msm_id]
+
+    def push(self, job: FetchJob):
+        heapq.heappush(self.queue, (-self.cost(job), next(self.counter), job))
+
+    def pop(self) -> FetchJob:
+        return heapq.heappop(self.queue)[2]
+
+    def exists(self, job: FetchJob) -> bool:
+        """Whether the output of `job` existed when the scheduler was created."""
+        return job.meta.filename in self.outputs
+
+    def split(self, job: FetchJob) -> Optional[Tuple[FetchJob, FetchJob]]:
+        """
+        Split the window of `job` in two, on a boundary aligned on `min_window`,
+        if both halves are at least `min_window` long, and if its output does not exist.
+        """
+        if not self.min_window or self.exists(job):
+            return None
+        start, stop = job.meta.start_timestamp, job.meta.stop_timestamp
+        step = int(self.min_window.total_seconds())
+        mid = (start + (stop - start) // 2) // step * step
+        if mid - start < step or stop - mid < step:
+            return None
+        # The bounds of the Atlas API are inclusive,
+        # so the second half starts one second after the first one.
+        return (
+            replace(job, meta=replace(job.meta, stop_date=fromtimestamp(mid))),
+            replace(job, meta=replace(job.meta, start_date=fromtimestamp(mid + 1))),
+        )
+
+    def has_parts(self, job: FetchJob) -> bool:
+        """Whether the output of `job`, or of one of its parts, exists."""
+        if job.meta.msm_id not in self.output_msm_ids:
+            return False
+        if self.exists(job):
+            return True
+        return any(self.has_parts(x) for x in self.split(job) or ())
+
+    def parts(self, job: FetchJob) -> List[FetchJob]:
+        """Split `job` as a previous run did, if the outputs of some of its parts exist."""
+        halves = self.split(job)
+        if halves and any(self.has_parts(x) for x in halves):
+            return [part for half in halves for part in self.parts(half)]
+        return [job]
+
+    def balance(self, idle: int) -> int:
+        """
+        Split the largest jobs until there is at least one job for each of
+        the `idle` workers. Return the number of jobs added to the queue.
+        """
+        added = 0
+        while 0 < len(self.queue) < idle:
+            # The queue is short here, so we can afford to sort it.
+            for item in sorted(self.queue):
+                halves = self.split(item[2])
+                if halves:
+                    break
+            else:
+                break
+            self.queue.remove(item)
+            heapq.heapify(self.queue)
+            for half in halves:
+                self.push(half)
+            added += 1
+        return added
@@ -0,0 +1,217 @@
+"""
+Local store of measurement results, shared between fetches.
+
+The results are fetched and kept in chunks aligned on multiples of the chunk duration (UTC),
+and addressed by measurement ID and chunk start, so that the fetches of overlapping windows
+download only the chunks (or the probes of a chunk) that are not already in the store.
+The probes covered by each chunk are recorded in a ``coverage.json`` file per measurement.
+The results of a window are then read from the chunks, see :any:`ResultStore.view`.
+
+.. code-block:: text
+
+    store/
+      store.json                # Duration of the chunks
+      staging/                  # Chunks being fetched
+      23449934/
+        coverage.json           # Probes covered, by chunk start
+        ping_v4_1599523200_1599609599_23449934.ndjson.zst
+        ping_v4_1599523200_1599609599_23449934.ndjson.zst.log
+"""
+
+import datetime as dt
+import json
+import shutil
+import time
+from dataclasses import dataclass, field, replace
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Union
+
+from pytz import UTC
+
+from .compact import copy_range
+from .controller import AIMDController
+from .fetcher import FetchJob, SimpleFetcher
+from .filters import ProbeIDRecordFilter, TimeRangeRecordFilter
+from .io import AtlasRecordsReader, AtlasRecordsWriter
+from .meta import AtlasResultsMeta
+
+DEFAULT_CHUNK = 24 * 3600
+
+Coverage = Dict[int, Optional[List[int]]]
+"""Probes covered (``None`` for all the probes), by chunk start."""
+
+
+def append_file(src: Path, dst: Path):
+    with src.open("rb", buffering=0) as f, dst.open("ab", buffering=0) as g:
+        copy_range(f, g, src.stat().st_size)
+
+
+@dataclass
+class ResultStore:
+    """
+    Results store, with chunks of `chunk` seconds.
+    The store is meant to be written by a single process at a time.
+
+    .. code-block:: python
+
+        from fetchmesh.store import ResultStore
+
+        store = ResultStore("store/")
+        fetcher = store.fetcher()
+        for job in store.missing(meta, probes):
+            store.commit(fetcher.fetch(job))
+        store.materialize(meta, probes, Path("results/"))
+    """
+
+    root: Path
+
+    chunk: Optional[int] = None
+    """
+    Duration of the chunks, in seconds. It is set when the store is created,
+    by default to one day, and it cannot be changed afterwards.
+    """
+
+    settle_time: int = 3600
+    """
+    Delay after the end of a chunk after which its results are considered final,
+    since probes can report their results late. The chunks that are not final are
+    fetched again by each fetch.
+    """
+
+    fetch_time: Optional[float] = field(default=None, init=False)
+    """Start of the current fetch (see :any:`fetcher`)."""
+
+    def __post_init__(self):
+        self.root = Path(self.root)
+        config = self.root / "store.json"
+        if config.exists():
+            chunk = json.loads(config.read_text())["chunk"]
+            if self.chunk and self.chunk != chunk:
+                raise ValueError(f"the store uses chunks of {chunk} seconds")
+            self.chunk = chunk
+        else:
+            self.chunk = self.chunk or DEFAULT_CHUNK
+            self.root.mkdir(exist_ok=True, parents=True)
+            config.write_text(json.dumps({"chunk": self.chunk}))
+
+    @property
+    def staging(self) -> Path:
+        return self.root / "staging"
+
+    def chunks(self, meta: AtlasResultsMeta) -> List[AtlasResultsMeta]:
+        """Chunks covering the window of `meta` (bounds included, as in the Atlas API)."""
+        chunk: int = self.chunk  # type: ignore
+        first = meta.start_timestamp // chunk * chunk
+        return [
+            replace(
+                meta,
+                start_date=dt.datetime.fromtimestamp(start, UTC),
+                stop_date=dt.datetime.fromtimestamp(start + chunk - 1, UTC),
+                compressed=True,
+            )
+            for start in range(first, meta.stop_timestamp + 1, chunk)
+        ]
+
+    def file(self, chunk: AtlasResultsMeta) -> Path:
+        return self.root / str(chunk.msm_id) / chunk.filename
+
+    def is_final(self, chunk: AtlasResultsMeta) -> bool:
+        """Whether the results of `chunk` were final when the current fetch started."""
+        now = self.fetch_time or time.time()
+        return chunk.stop_timestamp + self.settle_time <= now
+
+    def coverage(self, msm_id: int) -> Coverage:
+        file = self.root / str(msm_id) / "coverage.json"
+        if not file.exists():
+            return {}
+        return {int(k): v for k, v in json.loads(file.read_text()).items()}
+
+    def save_coverage(self, msm_id: int, coverage: Coverage):
+        file = self.root / str(msm_id) / "coverage.json"
+        tmp = file.with_suffix(".json.tmp")
+        tmp.write_text(json.dumps(coverage))
+        tmp.replace(file)
+
+    def missing(self, meta: AtlasResultsMeta, probes: List[int]) -> List[FetchJob]:
+        """
+        Jobs to fetch the results of `probes` (all the probes if empty) in the window of `meta`,
+        that are not in the store. A job fetches either a whole chunk, or the missing
+        probes of a chunk.
+        """
+        coverage = self.coverage(meta.msm_id)
+        jobs = []
+        for chunk in self.chunks(meta):
+            covered = coverage.get(chunk.start_timestamp, [])
+            if chunk.start_timestamp in coverage and covered is None:
+                continue
+            missing = sorted(set(probes) - set(covered or []))
+            if probes and not missing:
+                continue
+            jobs.append(FetchJob(chunk, missing if covered else probes))
+        return jobs
+
+    def fetcher(self, controller: Optional[AIMDController] = None) -> SimpleFetcher:
+        """
+        Return a fetcher writing the chunks in the staging directory,
+        to be added to the store with :any:`commit`.
+        """
+        self.fetch_time = time.time()
+        # The staged files of a previous run may be incomplete.
+        if self.staging.exists():
+            shutil.rmtree(self.staging)
+        return SimpleFetcher(self.staging, controller=controller, log=True)
+
+    def commit(self, job: FetchJob):
+        """Add a chunk fetched by :any:`fetcher` to the store."""
+        staged = self.staging / job.meta.filename
+        # The fetcher always writes a file (possibly empty) for a successful job,
+        # so a missing file is a failed fetch: the chunk is left as is.
+        if not staged.exists():
+            return
+        staged_log = AtlasRecordsWriter(staged).log_file
+        file = self.file(job.meta)
+        log_file = AtlasRecordsWriter(file).log_file
+        file.parent.mkdir(exist_ok=True, parents=True)
+
+        start = job.meta.start_timestamp
+        coverage = self.coverage(job.meta.msm_id)
+        # A job with probes, for a chunk already covered, contains only the missing probes.
+        covered = coverage.get(start) if job.probes else None
+        if covered:
+            append_file(staged, file)
+            append_file(staged_log, log_file)
+            staged.unlink()
+            staged_log.unlink()
+        else:
+            staged.replace(file)
+            staged_log.replace(log_file)
+
+        if self.is_final(job.meta):
+            coverage[start] = sorted(set(covered or []) | set(job.probes)) or None
+        else:
+            coverage.pop(start, None)
+        self.save_coverage(job.meta.msm_id, coverage)
+
+    def view(self, meta: AtlasResultsMeta, probes: List[int]) -> Iterator[dict]:
+        """Records of `probes` (all the probes if empty) in the window of `meta`."""
+        files = [self.file(x) for x in self.chunks(meta)]
+        filters = [TimeRangeRecordFilter(meta.start_timestamp, meta.stop_timestamp)]
+        if probes:
+            filters.append(ProbeIDRecordFilter(set(probes)))
+        # We skip `None` records.
+        records = AtlasRecordsReader.all(
+            (x for x in files if x.exists()), filters=filters
+        )
+        return (x for x in records if x)
+
+    def materialize(
+        self, meta: AtlasResultsMeta, probes: List[int], directory: Union[Path, str]
+    ) -> Path:
+        """Write the :any:`view` of `meta` to ``directory / meta.filename``."""
+        file = Path(directory) / meta.filename
+        file.parent.mkdir(exist_ok=True, parents=True)
+        tmp = file.with_name(file.name + ".tmp")
+        with AtlasRecordsWriter(tmp, compression=meta.compressed) as w:
+            w.writeall(self.view(meta, probes))
+        tmp.replace(file)
+        return file
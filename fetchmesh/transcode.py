@@ -0,0 +1,118 @@
+"""
+Conversion of results files to the compressed and indexed format
+(one zstandard frame per record, and a ``.log`` sidecar, see :any:`AtlasRecordsWriter`).
+"""
+
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Iterable, Iterator, Optional, Union
+
+from mbox.magic import CompressionFormat, detect_compression
+
+from .io import AtlasRecordsReader, AtlasRecordsWriter, LogEntry
+
+
+@dataclass(frozen=True)
+class TranscodeResult:
+    src: Path
+    dst: Optional[Path] = None
+    status: str = "transcoded"
+    """``transcoded``, ``skipped`` or ``failed``."""
+    records: int = 0
+    src_bytes: int = 0
+    dst_bytes: int = 0
+    seconds: float = 0.0
+    error: str = ""
+
+
+def transcoded_name(file: Path) -> Path:
+    if file.name.endswith(".zst"):
+        return file
+    return file.with_name(file.name + ".zst")
+
+
+def is_indexed(file: Path) -> bool:
+    """Whether `file` is compressed, and has a log."""
+    return (
+        detect_compression(file) == CompressionFormat.Zstandard
+        and AtlasRecordsWriter(file).log_file.exists()
+    )
+
+
+def count_records(records: Iterable[Optional[dict]], counter: list) -> Iterator[dict]:
+    """Count the valid records in ``counter[0]``, and the invalid ones in ``counter[1]``."""
+    # We skip `None` records.
+    for record in records:
+        if record:
+            counter[0] += 1
+            yield record
+        else:
+            counter[1] += 1
+
+
+def transcode(
+    file: Union[Path, str], level: int = 3, force: bool = False
+) -> TranscodeResult:
+    """
+    Convert `file` to the compressed and indexed format, with a bounded memory usage.
+    The records are written to a temporary file, which is read back and replaces the original
+    file (and its log) only if it contains the same number of records, and if the original
+    file does not contain invalid records (which would be lost).
+    The compressed files with a log are skipped, unless `force` is set.
+    """
+    src = Path(file)
+    src_bytes = src.stat().st_size
+    if not force and is_indexed(src):
+        return TranscodeResult(src, src, "skipped", src_bytes=src_bytes)
+
+    start = time.monotonic()
+    dst = transcoded_name(src)
+    tmp = dst.with_name(dst.name + ".tmp")
+    writer = AtlasRecordsWriter(
+        tmp, compression=True, compression_level=level, log=True
+    )
+
+    counter = [0, 0]
+    with writer:
+        with AtlasRecordsReader(src) as r:
+            writer.writeall(count_records(r, counter))
+
+    def failed(error):
+        for x in (tmp, writer.log_file):
+            if x.exists():
+                x.unlink()
+        return TranscodeResult(src, None, "failed", counter[0], src_bytes, error=error)
+
+    if not tmp.exists():
+        return failed("write error")
+
+    # (1) Verify the output before replacing the original file.
+    if counter[1]:
+        return failed(f"{counter[1]} invalid records read")
+    n_logs = writer.log_file.stat().st_size // LogEntry.size
+    with AtlasRecordsReader(tmp) as r:
+        n_records = sum(1 for x in r if x)
+    if not n_logs == n_records == counter[0]:
+        return failed(
+            f"{counter[0]} records read, {n_records} records written, {n_logs} log entries"
+        )
+
+    # (2) Replace the original file
+    tmp.replace(dst)
+    writer.log_file.replace(AtlasRecordsWriter(dst).log_file)
+    if dst != src:
+        src.unlink()
+        src_log = AtlasRecordsWriter(src).log_file
+        if src_log.exists():
+            src_log.unlink()
+
+    return TranscodeResult(
+        src,
+        dst,
+        "transcoded",
+        counter[0],
+        src_bytes,
+        dst.stat().st_size,
+        time.monotonic() - start,
+    )
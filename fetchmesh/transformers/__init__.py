@@ -1 +1,3 @@
+from .enrich import *
+from .packed import *
 from .record import *
@@ -0,0 +1,155 @@
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from ipaddress import ip_address
+from typing import Dict, List, Optional, Tuple, Union
+
+from radix import Radix
+
+from ..bgp import PrefixTable
+from .record import RecordTransformer
+
+AddressInfo = Tuple[Optional[int], Optional[str], Optional[bool]]
+"""Origin AS, IX name, and private status of an address."""
+
+
+@dataclass
+class TracerouteEnrichTransformer(RecordTransformer):
+    """
+    Annotate the traceroute replies with the origin AS (``asn``), the IX (``ix``),
+    and the private status (``private``) of their address.
+
+    The distinct addresses of a batch are resolved once, through a bounded cache shared
+    by the three lookups, and the results are written back in a single pass.
+    Since traceroute hops addresses repeat heavily, most of the lookups are cache hits.
+
+    .. code-block:: python
+
+        from fetchmesh.bgp import ASNDB
+        from fetchmesh.peeringdb import PeeringDB
+        from fetchmesh.transformers import TracerouteEnrichTransformer
+
+        enrich = TracerouteEnrichTransformer(
+            asn=ASNDB.from_file("ipasn.txt").prefix_table(),
+            ix=PeeringDB.from_api().radix_tree(),
+        )
+        with AtlasRecordsReader("results.ndjson", transformers=[enrich]) as r:
+            for record in r:
+                print(record["result"][0]["result"][0])
+                # {'from': '...', 'asn': 3215, 'ix': None, 'private': False, ...}
+    """
+
+    asn: Optional[Union[PrefixTable, Radix]] = None
+    """IP-to-ASN table (or radix tree built by :any:`ASNDB`). If None, ``asn`` is not set."""
+
+    ix: Optional[Union[PrefixTable, Radix]] = None
+    """
+    IP-to-IX table (see :any:`PeeringDBStore`) or radix tree (built by :any:`PeeringDB`).
+    If None, ``ix`` is not set.
+    """
+
+    ix_names: Dict[int, str] = field(default_factory=dict)
+    """Names of the IXs by ID, when `ix` is a :any:`PrefixTable`."""
+
+    private: bool = True
+    """Whether to set ``private``."""
+
+    cache_size: int = 2**20
+    """Maximum number of addresses in the cache."""
+
+    cache: Dict[str, AddressInfo] = field(
+        default_factory=OrderedDict, init=False, repr=False
+    )
+    hits: int = field(default=0, init=False)
+    misses: int = field(default=0, init=False)
+
+    def transform(self, record: dict) -> dict:
+        return self.transform_batch([record])[0]
+
+    def transform_batch(self, records: List[dict]) -> List[dict]:
+        new_records = [record.copy() for record in records]
+        replies = [
+            reply
+            for record in new_records
+            for hop in record.get("result", [])
+            for reply in hop.get("result", [])
+            if reply
+        ]
+        # Distinct addresses, in order of appearance.
+        infos = self.resolve(dict.fromkeys(x["from"] for x in replies if x.get("from")))
+        for reply in replies:
+            asn, ix, private = infos.get(reply.get("from"), (None, None, None))
+            if self.asn is not None:
+                reply["asn"] = asn
+            if self.ix is not None:
+                reply["ix"] = ix
+            if self.private:
+                reply["private"] = private
+        return new_records
+
+    def resolve(self, addrs) -> Dict[str, AddressInfo]:
+        """Return the information for each address, from the cache if possible."""
+        infos = {}
+        missing = []
+        for addr in addrs:
+            info = self.cache.get(addr)
+            if info is None:
+                missing.append(addr)
+            else:
+                self.cache.move_to_end(addr)  # type: ignore
+                infos[addr] = info
+        self.hits += len(infos)
+        self.misses += len(missing)
+
+        asns = self.lookup_asns(missing)
+        ixs = self.lookup_ixs(missing)
+        for addr, asn, ix in zip(missing, asns, ixs):
+            info = (asn, ix, self.lookup_private(addr))
+            infos[addr] = info
+            self.cache[addr] = info
+
+        while len(self.cache) > self.cache_size:
+            self.cache.popitem(last=False)  # type: ignore
+
+        return infos
+
+    def lookup_asns(self, addrs: List[str]) -> List[Optional[int]]:
+        """Origin AS of each address (the first one, for the prefixes with several origins)."""
+        if isinstance(self.asn, PrefixTable):
+            return [x or None for x in self.asn.lookup_first(addrs).tolist()]
+        asns = []
+        for addr in addrs:
+            node = None
+            if self.asn is not None:
+                node = self.search_best(self.asn, addr)
+            asns.append(node.data["origins"][0] if node else None)
+        return asns
+
+    def lookup_ixs(self, addrs: List[str]) -> List[Optional[str]]:
+        if isinstance(self.ix, PrefixTable):
+            return [
+                self.ix_names.get(x, str(x)) if x else None
+                for x in self.ix.lookup_first(addrs).tolist()
+            ]
+        ixs = []
+        for addr in addrs:
+            node = None
+            if self.ix is not None:
+                node = self.search_best(self.ix, addr)
+            ixs.append(node.data["ix"].name if node else None)
+        return ixs
+
+    def lookup_private(self, addr: str) -> Optional[bool]:
+        if not self.private:
+            return None
+        try:
+            return ip_address(addr).is_private
+        except ValueError:
+            return None
+
+    @staticmethod
+    def search_best(tree: Radix, addr: str):
+        try:
+            return tree.search_best(addr)
+        except ValueError:
+            # Invalid address
+            return None
@@ -0,0 +1,210 @@
+from dataclasses import dataclass, field
+from ipaddress import ip_address
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Union
+
+import numpy as np
+
+DUP = 1
+"""Flag set for duplicate replies."""
+
+LATE = 2
+"""Flag set for late replies."""
+
+
+class AddressTable:
+    """
+    Interning table mapping IP addresses to integer IDs.
+    The ID 0 is reserved for missing addresses (timeouts, empty replies...).
+
+    .. code-block:: python
+
+        table = AddressTable()
+        table.intern("8.8.8.8")
+        # 1
+        table[1]
+        # '8.8.8.8'
+    """
+
+    def __init__(self, addresses: Optional[List[str]] = None):
+        self.addresses: List[Optional[str]] = [None]
+        self.ids: Dict[str, int] = {}
+        self._private = np.zeros(1, dtype=bool)
+        for addr in addresses or []:
+            self.intern(addr)
+
+    def __len__(self):
+        return len(self.addresses)
+
+    def __getitem__(self, id_: int) -> Optional[str]:
+        return self.addresses[id_]
+
+    def intern(self, addr: Optional[str]) -> int:
+        if not addr:
+            return 0
+        id_ = self.ids.get(addr)
+        if id_ is None:
+            id_ = len(self.addresses)
+            self.ids[addr] = id_
+            self.addresses.append(addr)
+        return id_
+
+    def private_mask(self) -> np.ndarray:
+        """Boolean array indexed by ID, true for the private addresses."""
+        n = len(self._private)
+        if n < len(self.addresses):
+            new = np.zeros(len(self.addresses) - n, dtype=bool)
+            for i, addr in enumerate(self.addresses[n:]):
+                try:
+                    new[i] = ip_address(addr).is_private
+                except ValueError:
+                    pass
+            self._private = np.concatenate([self._private, new])
+        return self._private
+
+    def save(self, file: Union[Path, str]):
+        """Write the addresses (one per line, in ID order) to `file`."""
+        with open(file, "w") as f:
+            for addr in self.addresses[1:]:
+                f.write(f"{addr}\n")
+
+    @classmethod
+    def load(cls, file: Union[Path, str]) -> "AddressTable":
+        with open(file) as f:
+            return cls([line.rstrip("\n") for line in f])
+
+
+@dataclass
+class PackedTraceroutes:
+    """
+    Traceroutes packed into fixed-shape arrays.
+    ``hops[i, j, k]`` is the ID (in `table`) of the address of the k-th reply
+    at the j-th hop of the i-th record, and ``flags[i, j, k]`` its flags (:any:`DUP`, :any:`LATE`).
+    """
+
+    table: AddressTable
+    timestamps: np.ndarray
+    msm_ids: np.ndarray
+    prb_ids: np.ndarray
+    hops: np.ndarray
+    flags: np.ndarray
+
+    def __len__(self):
+        return len(self.timestamps)
+
+    def masked_hops(
+        self,
+        drop_dup: bool = True,
+        drop_late: bool = True,
+        drop_private: bool = False,
+    ) -> np.ndarray:
+        """Return a copy of `hops` where the dropped replies are replaced by 0."""
+        mask = (DUP if drop_dup else 0) | (LATE if drop_late else 0)
+        hops = np.where(self.flags & mask, 0, self.hops)
+        if drop_private:
+            hops[self.table.private_mask()[hops]] = 0
+        return hops
+
+    def addresses(self, hops: np.ndarray) -> List[List[Optional[str]]]:
+        """Decode the hops of a single record (e.g. ``masked_hops()[i]``)."""
+        return [[self.table[x] for x in hop] for hop in hops]
+
+    def save(self, file: Union[Path, str]):
+        """Save the arrays to `file` (``.npz``), and the addresses to `file` + ``.addrs``."""
+        np.savez(
+            file,
+            timestamps=self.timestamps,
+            msm_ids=self.msm_ids,
+            prb_ids=self.prb_ids,
+            hops=self.hops,
+            flags=self.flags,
+        )
+        self.table.save(f"{file}.addrs")
+
+    @classmethod
+    def load(cls, file: Union[Path, str]) -> "PackedTraceroutes":
+        with np.load(file) as arrays:
+            return cls(AddressTable.load(f"{file}.addrs"), **arrays)
+
+
+@dataclass
+class TraceroutePacker:
+    """
+    Pack traceroute records into a :any:`PackedTraceroutes`, interning the addresses
+    in a shared :any:`AddressTable`. This is the array counterpart of
+    :any:`TracerouteFlatIPTransformer`: a record takes ``max_hops * max_replies * 5`` bytes,
+    and the dup/late/private filters are applied afterwards, with vectorized operations.
+
+    .. code-block:: python
+
+        from fetchmesh.io import AtlasRecordsReader
+        from fetchmesh.transformers import TraceroutePacker
+
+        packer = TraceroutePacker()
+        packed = packer.pack(AtlasRecordsReader.all(files))
+        hops = packed.masked_hops(drop_private=True)
+        # Records whose path changed between two consecutive traceroutes:
+        changed = (hops[1:] != hops[:-1]).any(axis=(1, 2))
+    """
+
+    max_hops: int = 32
+    max_replies: int = 3
+    table: AddressTable = field(default_factory=AddressTable)
+    chunk_size: int = 65536
+    """Number of records packed at once, before being copied in the arrays."""
+
+    def pack(self, records: Iterable[dict]) -> PackedTraceroutes:
+        chunks = []
+        chunk: List[dict] = []
+        for record in records:
+            chunk.append(record)
+            if len(chunk) >= self.chunk_size:
+                chunks.append(self.pack_chunk(chunk))
+                chunk = []
+        if chunk or not chunks:
+            chunks.append(self.pack_chunk(chunk))
+        if len(chunks) == 1:
+            return chunks[0]
+        return PackedTraceroutes(
+            self.table,
+            *(
+                np.concatenate([getattr(x, name) for x in chunks])
+                for name in ("timestamps", "msm_ids", "prb_ids", "hops", "flags")
+            ),
+        )
+
+    def pack_chunk(self, records: List[dict]) -> PackedTraceroutes:
+        n = len(records)
+        shape = (n, self.max_hops, self.max_replies)
+        intern = self.table.intern
+        indices, ids, flag_indices, flag_values = [], [], [], []
+        for i, record in enumerate(records):
+            for j, hop in enumerate(record.get("result", [])[: self.max_hops]):
+                # Sometimes results contains an empty object {}
+                replies = [x for x in hop.get("result", []) if x]
+                for k, reply in enumerate(replies[: self.max_replies]):
+                    index = (i * self.max_hops + j) * self.max_replies + k
+                    id_ = intern(reply.get("from"))
+                    if id_:
+                        indices.append(index)
+                        ids.append(id_)
+                    flags = (DUP if reply.get("dup") else 0) | (
+                        LATE if reply.get("late") else 0
+                    )
+                    if flags:
+                        flag_indices.append(index)
+                        flag_values.append(flags)
+
+        hops = np.zeros(shape, dtype=np.uint32)
+        hops.flat[indices] = ids
+        flags_ = np.zeros(shape, dtype=np.uint8)
+        flags_.flat[flag_indices] = flag_values
+
+        return PackedTraceroutes(
+            self.table,
+            np.array([x["timestamp"] for x in records], dtype=np.int64),
+            np.array([x["msm_id"] for x in records], dtype=np.uint32),
+            np.array([x["prb_id"] for x in records], dtype=np.uint32),
+            hops,
+            flags_,
+        )
@@ -1,18 +1,29 @@
 from abc import ABC, abstractmethod
 from collections import defaultdict
 from dataclasses import dataclass
+from datetime import datetime, timezone
 from functools import lru_cache
 from ipaddress import ip_address
-from typing import Tuple
+from typing import List, Tuple
 
 from radix import Radix
 
+from ..bgp import ASNSnapshots
+
 
 class RecordTransformer(ABC):
     @abstractmethod
     def transform(self, record: dict) -> dict:
         pass
 
+    def transform_batch(self, records: List[dict]) -> List[dict]:
+        """
+        Transform a batch of records.
+        Transformers that benefit from seeing several records at once
+        (e.g. to group lookups) override this method.
+        """
+        return [self.transform(record) for record in records]
+
     def __call__(self, record: dict) -> dict:
         return self.transform(record)
 
@@ -44,6 +55,39 @@ class TracerouteMapASNTransformer(RecordTransformer):
         return new_record
 
 
+@dataclass
+class TracerouteMapASNSnapshotsTransformer(RecordTransformer):
+    """
+    Map the replies addresses to their origin AS, using the IP-to-ASN snapshot
+    nearest to the timestamp of each record.
+    The lookups of a batch are grouped by snapshot, so that each snapshot is loaded
+    (and searched) once per batch.
+    As for :any:`TracerouteMapASNTransformer`, only the first origin of the prefixes
+    announced by several ASes is used.
+    """
+
+    snapshots: ASNSnapshots
+
+    def transform(self, record: dict) -> dict:
+        return self.transform_batch([record])[0]
+
+    def transform_batch(self, records: List[dict]) -> List[dict]:
+        new_records = [record.copy() for record in records]
+        replies_by_snapshot = defaultdict(list)
+        for record in new_records:
+            t = datetime.fromtimestamp(record["timestamp"], timezone.utc)
+            index = self.snapshots.index(t)
+            for hop in record.get("result", []):
+                for reply in hop.get("result", []):
+                    replies_by_snapshot[index].append(reply)
+        for index, replies in sorted(replies_by_snapshot.items()):
+            table = self.snapshots.load(index)
+            asns = table.lookup_first([reply.get("from") for reply in replies])
+            for reply, asn in zip(replies, asns.tolist()):
+                reply["asn"] = asn or None
+        return new_records
+
+
 @dataclass
 class TracerouteMapIXTransformer(RecordTransformer):
     tree: Radix
@@ -125,8 +169,13 @@ class TracerouteFlatIPTransformer(RecordTransformer):
                 if self.drop_late and reply.get("late"):
                     continue
                 addr = reply.get("from")
-                if self.drop_private and addr and self.is_private(addr):
-                    addr = None
+                if self.drop_private and addr:
+                    # Use the status set by `TracerouteEnrichTransformer`, if any.
+                    private = reply.get("private")
+                    if private is None:
+                        private = self.is_private(addr)
+                    if private:
+                        addr = None
                 if self.insert_none or addr is not None:
                     addrs.append(addr)
                 for field in self.extras_fields:
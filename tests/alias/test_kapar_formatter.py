@@ -0,0 +1,39 @@
+import io
+
+from fetchmesh.alias import KaparFormatter
+from fetchmesh.bloom import BloomFilter
+
+
+def make_record(*addrs, src="192.0.2.1", dst="198.51.100.1"):
+    return {
+        "timestamp": 0,
+        "msm_id": 1,
+        "prb_id": 2,
+        "from": src,
+        "src_addr": src,
+        "dst_addr": dst,
+        "paris_id": 0,
+        "result": [{"result": [{"from": addr}]} for addr in addrs],
+    }
+
+
+def test_kapar_formatter():
+    formatter = KaparFormatter()
+    records = [
+        make_record("10.0.0.1", "8.8.8.8"),
+        make_record("10.0.0.2", "8.8.8.8", src="192.0.2.2"),
+        make_record("8.8.4.4"),
+    ]
+    assert formatter.format_records(records) == (
+        "# trace: 192.0.2.1 -> 198.51.100.1\n0.0.0.0\n8.8.8.8\n"
+        "# trace: 192.0.2.2 -> 198.51.100.1\n0.0.0.0\n8.8.8.8\n"
+        "# trace: 192.0.2.1 -> 198.51.100.1\n8.8.4.4"
+    )
+
+    # The second record has the same path once the private addresses are removed.
+    f = io.StringIO()
+    assert formatter.write_records(records, f, seen=BloomFilter(100)) == 2
+    assert f.getvalue() == (
+        "# trace: 192.0.2.1 -> 198.51.100.1\n0.0.0.0\n8.8.8.8\n"
+        "# trace: 192.0.2.1 -> 198.51.100.1\n8.8.4.4\n"
+    )
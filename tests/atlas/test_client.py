@@ -0,0 +1,26 @@
+import pickle
+
+from fetchmesh.atlas import AtlasClient
+
+
+def test_iter_pages():
+    client = AtlasClient(progress=False)
+    pages = list(client.iter_pages("anchors"))
+    assert len(pages) > 1
+    assert [x for page in pages for x in page] == client.get_all("anchors")
+
+
+def test_iter_anchoring_measurements():
+    client = AtlasClient(progress=False)
+    records = list(client.iter_anchoring_measurements())
+    assert records == client.fetch_anchoring_measurements()
+    assert all(x["measurement"]["target"] == x["target"]["fqdn"] for x in records)
+
+
+def test_pickle():
+    client = AtlasClient(progress=False)
+    session = client.session
+    assert client.session is session
+    client_ = pickle.loads(pickle.dumps(client))
+    assert client_.session is not session
+    assert client_.get_all("anchors") == client.get_all("anchors")
@@ -0,0 +1,38 @@
+from fetchmesh.atlas import AtlasClient, MeasurementStore
+
+PARAMS = {"description__startswith": "Anchoring Mesh Measurement:"}
+
+
+def test_sync(tmp_path):
+    client = AtlasClient(progress=False)
+    store = MeasurementStore(tmp_path / "measurements.json")
+
+    report = store.sync(client, PARAMS)
+    assert report.full
+    assert len(report.added) == len(store) > 0
+    assert not report.updated
+
+    # The store is persisted on disk
+    store = MeasurementStore(tmp_path / "measurements.json")
+    assert store.last_sync is not None
+    assert len(store) == len(report.added)
+
+    # The mock API returns the same measurements: nothing should change
+    report = store.sync(client, PARAMS)
+    assert not report.full
+    assert not report.added
+    assert not report.updated
+    assert report.unchanged > 0
+
+
+def test_upsert(tmp_path):
+    client = AtlasClient(progress=False)
+    store = MeasurementStore(tmp_path / "measurements.json")
+    store.sync(client, PARAMS)
+
+    msm_id = next(iter(store.measurements))
+    store.measurements[msm_id] = {**store[msm_id], "description": "Outdated"}
+
+    report = store.sync(client, PARAMS)
+    assert report.updated == [msm_id]
+    assert store[msm_id]["description"] != "Outdated"
@@ -0,0 +1,116 @@
+import io
+import re
+
+import pytest
+from requests import Response
+
+from fetchmesh.bgp import RIBDownloader
+
+CONTENT = bytes(range(256)) * 1000
+
+
+class FlakyIO(io.BytesIO):
+    """Raise an error after `limit` bytes."""
+
+    def __init__(self, data, limit):
+        super().__init__(data)
+        self.limit = limit
+
+    def read(self, n=-1):
+        if self.tell() >= self.limit and self.limit < len(self.getbuffer()):
+            raise ConnectionResetError()
+        return super().read(min(n, self.limit - self.tell()))
+
+
+class RangeServer:
+    def __init__(self, ranges=True, fail_after=None, partial=True):
+        self.ranges = ranges
+        self.partial = partial
+        self.fail_after = fail_after
+        self.requests = []
+
+    def request(self, method, url, headers=None, **kwargs):
+        method, headers = method.upper(), headers or {}
+        self.requests.append((method, headers.get("Range")))
+        res = Response()
+        res.url = url
+        res.status_code = 200
+        if self.ranges:
+            res.headers["Accept-Ranges"] = "bytes"
+        data = CONTENT
+        m = re.match(r"bytes=(\d+)-(\d*)", headers.get("Range", ""))
+        if self.ranges and self.partial and m:
+            start, end = int(m.group(1)), m.group(2)
+            data = CONTENT[start : int(end) + 1 if end else None]
+            res.status_code = 206
+        res.headers["Content-Length"] = str(len(data))
+        if method == "HEAD":
+            data = b""
+        limit = len(data)
+        if self.fail_after is not None and method == "GET":
+            limit, self.fail_after = self.fail_after, None
+        res.raw = FlakyIO(data, limit)
+        return res
+
+
+@pytest.fixture
+def server(monkeypatch):
+    def make(**kwargs):
+        server = RangeServer(**kwargs)
+        monkeypatch.setattr("requests.sessions.Session.request", server.request)
+        return server
+
+    return make
+
+
+def test_download_segments(server, tmp_path):
+    server()
+    downloader = RIBDownloader(segments=4, segment_size=50_000, chunk_size=4096)
+    tasks = [(f"http://example.org/{i}", tmp_path / f"rib{i}") for i in range(3)]
+    report = downloader.download(tasks)
+    assert len(report.downloaded) == 3
+    assert report.size == 3 * len(CONTENT)
+    for _, file in tasks:
+        assert file.read_bytes() == CONTENT
+    assert not list(tmp_path.glob("*.part*"))
+
+    report = downloader.download(tasks)
+    assert len(report.skipped) == 3
+
+
+def test_download_resume(server, tmp_path):
+    s = server(fail_after=100_000)
+    downloader = RIBDownloader(segments=1, chunk_size=4096)
+    file = tmp_path / "rib"
+
+    report = downloader.download([("http://example.org/rib", file)])
+    assert report.failed == [file]
+    assert not file.exists()
+    assert (tmp_path / "rib.part").stat().st_size == 100_000
+
+    report = downloader.download([("http://example.org/rib", file)])
+    assert report.downloaded == [file]
+    assert report.size == len(CONTENT) - 100_000
+    assert file.read_bytes() == CONTENT
+    assert s.requests[-1] == ("GET", f"bytes=100000-{len(CONTENT) - 1}")
+
+
+def test_download_no_ranges(server, tmp_path):
+    server(ranges=False, fail_after=100_000)
+    downloader = RIBDownloader(chunk_size=4096)
+    file = tmp_path / "rib"
+    assert downloader.download([("http://example.org/rib", file)]).failed
+    assert downloader.download([("http://example.org/rib", file)]).downloaded
+    assert file.read_bytes() == CONTENT
+
+
+def test_download_ignored_ranges(server, tmp_path):
+    # The server advertises range requests, but replies with the whole file.
+    s = server(partial=False)
+    downloader = RIBDownloader(segments=4, segment_size=50_000, chunk_size=4096)
+    file = tmp_path / "rib"
+    report = downloader.download([("http://example.org/rib", file)])
+    assert report.downloaded == [file]
+    assert file.read_bytes() == CONTENT
+    assert not list(tmp_path.glob("*.part*"))
+    assert ("GET", None) in s.requests
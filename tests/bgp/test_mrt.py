@@ -0,0 +1,22 @@
+from pathlib import Path
+
+from fetchmesh.bgp import ASNDB
+from fetchmesh.bgp.mrt import rib_origins, rib_timestamp
+
+MOCKS = Path(__file__).parent.parent.parent / "fetchmesh" / "mocks"
+
+
+def test_rib_origins():
+    file = MOCKS / "bview.20190417.0800.gz"
+    origins = dict(rib_origins(file, processes=2, chunk_size=100))
+    assert origins["1.0.0.0/24"] == [13335]
+    assert origins["2c0f:fb50:4002::/48"] == [15169]
+    assert any(len(x) > 1 for x in origins.values())
+    assert rib_timestamp(file) == 1555488000
+
+
+def test_from_rib(tmp_path):
+    db = ASNDB.from_rib(MOCKS / "rib.20180131.0800.bz2", processes=1)
+    db.to_file(tmp_path / "ipasn.txt")
+    assert ASNDB.from_file(tmp_path / "ipasn.txt") == db
+    assert db.prefix_table().search("8.17.115.1") == [13886]
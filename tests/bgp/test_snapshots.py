@@ -0,0 +1,58 @@
+from datetime import datetime
+
+from pytz import UTC
+
+from fetchmesh.bgp import ASNDB, ASNSnapshots
+from fetchmesh.io import AtlasRecordsReader, AtlasRecordsWriter
+from fetchmesh.transformers import TracerouteMapASNSnapshotsTransformer
+
+
+def make_snapshots(directory):
+    # Two text snapshots, and a compiled one.
+    (directory / "ipasn_rrc00.ripe.net_202001010000.txt").write_text(
+        "; IP-ASN32-DAT file\n1.0.0.0/8\t1\n"
+    )
+    (directory / "ipasn_rrc00.ripe.net_202001010800.txt").write_text(
+        "; IP-ASN32-DAT file\n1.0.0.0/8\t2\n"
+    )
+    file = directory / "ipasn_rrc00.ripe.net_202001011600.txt"
+    file.write_text("1.0.0.0/8\t3,4\n")
+    ASNDB.from_file(file).compile(directory / "ipasn_rrc00.ripe.net_202001011600.tbl")
+    (directory / "README").write_text("not a snapshot")
+
+
+def test_snapshots(tmp_path):
+    make_snapshots(tmp_path)
+    snapshots = ASNSnapshots(tmp_path, max_loaded=1)
+    assert len(snapshots) == 3
+    assert snapshots.files[-1].suffix == ".tbl"
+
+    assert snapshots.index(datetime(2019, 1, 1, tzinfo=UTC)) == 0
+    assert snapshots.index(datetime(2020, 1, 1, 3, tzinfo=UTC)) == 0
+    assert snapshots.index(datetime(2020, 1, 1, 5, tzinfo=UTC)) == 1
+    assert snapshots.index(datetime(2021, 1, 1, tzinfo=UTC)) == 2
+
+    table = snapshots.nearest(datetime(2020, 1, 1, 15, tzinfo=UTC))
+    assert table.search("1.1.1.1") == [3, 4]
+    snapshots.nearest(datetime(2020, 1, 1, tzinfo=UTC))
+    assert len(snapshots.loaded) == 1
+
+
+def test_snapshots_transformer(tmp_path, tmpfile):
+    make_snapshots(tmp_path)
+    transformer = TracerouteMapASNSnapshotsTransformer(ASNSnapshots(tmp_path))
+
+    records = []
+    for hour, asn in [(0, 1), (9, 2), (17, 3), (1, 1)]:
+        timestamp = int(datetime(2020, 1, 1, hour, tzinfo=UTC).timestamp())
+        result = [{"result": [{"from": "1.2.3.4"}, {"from": "8.8.8.8"}, {}]}]
+        records.append({"timestamp": timestamp, "result": result})
+
+    with AtlasRecordsWriter(tmpfile) as w:
+        w.writeall(records)
+
+    with AtlasRecordsReader(tmpfile, transformers=[transformer], batch_size=3) as r:
+        records_ = list(r)
+
+    assert [x["result"][0]["result"][0]["asn"] for x in records_] == [1, 2, 3, 1]
+    assert all(x["result"][0]["result"][1]["asn"] is None for x in records_)
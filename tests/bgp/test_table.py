@@ -0,0 +1,65 @@
+import pickle
+from pathlib import Path
+
+from fetchmesh.bgp import ASNDB, PrefixTable
+from fetchmesh.bgp.table import flatten
+
+
+def test_flatten():
+    prefixes = [(0, 255, 1), (16, 31, 2), (20, 23, 3), (64, 127, 1), (300, 310, 4)]
+    assert flatten(prefixes) == [
+        (0, 15, 1),
+        (16, 19, 2),
+        (20, 23, 3),
+        (24, 31, 2),
+        (32, 255, 1),
+        (300, 310, 4),
+    ]
+
+
+def test_prefix_table(tmp_path):
+    table = PrefixTable.from_prefixes(
+        [
+            ("1.0.0.0/8", [1]),
+            ("1.1.0.0/16", [2, 3]),
+            ("1.1.1.0/24", [4]),
+            ("2001:db8::/32", [5]),
+            ("2001:db8::/48", [6]),
+            ("2001:db8:0:0:8000::/65", [7]),
+        ]
+    )
+    addrs = [
+        "1.1.1.1",
+        "1.1.2.1",
+        "1.2.3.4",
+        "8.8.8.8",
+        "2001:db8::1",
+        "2001:db8:0:0:8000::1",
+        "2001:db8:1::1",
+        "2001:db9::1",
+        "invalid",
+        None,
+    ]
+    expected = [4, 2, 1, 0, 6, 7, 5, 0, 0, 0]
+
+    assert table.search("1.1.2.1") == [2, 3]
+    assert table.search("8.8.8.8") is None
+    assert table.lookup_first(addrs).tolist() == expected
+
+    table.save(tmp_path / "table.tbl")
+    loaded = PrefixTable.load(tmp_path / "table.tbl")
+    assert len(loaded) == len(table)
+    assert loaded.lookup_first(addrs).tolist() == expected
+
+    unpickled = pickle.loads(pickle.dumps(loaded))
+    assert unpickled.lookup_first(addrs).tolist() == expected
+
+
+def test_asndb_compile(tmp_path):
+    db = ASNDB.from_file(Path(__file__).parent / "data" / "rib.txt")
+    table = PrefixTable.load(db.compile(tmp_path / "rib.tbl"))
+    tree = db.radix_tree()
+    addrs = ["1.23.220.42", "8.8.8.8", "1.0.0.1", "2001:db8::1"]
+    for addr, asn in zip(addrs, table.lookup_first(addrs)):
+        node = tree.search_best(addr)
+        assert asn == (node.data["origins"][0] if node else 0)
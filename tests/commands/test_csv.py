@@ -0,0 +1,45 @@
+import csv
+from collections import defaultdict
+from pathlib import Path
+
+from fetchmesh.commands import main
+from fetchmesh.io import AtlasRecordsReader
+
+
+def test_csv_ping(runner):
+    fetch_dir = Path("fetch_dir")
+    args = f"fetch --af 4 --type ping --dir {fetch_dir} --sample-pairs 2"
+    runner.invoke(main, args)
+    files = sorted(fetch_dir.glob("*.ndjson*"))
+
+    # Minimum RTT of each pair, by 240s bin
+    expected = defaultdict(dict)
+    for record in AtlasRecordsReader.all(files):
+        if not record or record["type"] != "ping" or record["min"] <= 0:
+            continue
+        rtts = expected[record["msm_id"], record["prb_id"]]
+        ts = record["timestamp"] // 240 * 240
+        rtts[ts] = min(rtts.get(ts, record["min"]), record["min"])
+    assert expected
+
+    files = " ".join(str(x) for x in files)
+    runner.invoke(main, f"csv ping --dir csv --jobs 2 --memory 1 {files}")
+    outputs = sorted(Path("csv").glob("*.csv"))
+    assert len(outputs) == len(expected)
+    for file in outputs:
+        with file.open() as f:
+            rows = list(csv.DictReader(f))
+        pair = tuple(int(x) for x in file.stem.split("_"))
+        assert {int(x["timestamp"]): float(x["min"]) for x in rows if x["min"]} == (
+            expected[pair]
+        )
+
+    runner.invoke(main, f"csv ping --dir merge --mode merge {files}")
+    (output,) = Path("merge").glob("merge_*.csv")
+    with output.open() as f:
+        rows = list(csv.reader(f))
+    timestamps = [int(x) for x in rows[0][4:]]
+    assert [tuple(int(x) for x in row[:2]) for row in rows[1:]] == sorted(expected)
+    for row in rows[1:]:
+        rtts = {ts: float(x) for ts, x in zip(timestamps, row[4:]) if x}
+        assert rtts == expected[int(row[0]), int(row[1])]
@@ -3,3 +3,7 @@ from fetchmesh.commands import main
 
 def test_describe(runner):
     runner.invoke(main, ["describe"])
+
+
+def test_describe_range(runner):
+    runner.invoke(main, ["describe", "--date", "2019-01-01", "--until", "2019-03-01"])
@@ -0,0 +1,30 @@
+import os
+from pathlib import Path
+
+from click.testing import CliRunner
+
+from fetchmesh.commands import main
+from fetchmesh.commands.graph import source_key
+from fetchmesh.graph import Graph
+
+
+def test_graph(runner):
+    fetch_dir = Path("fetch_dir")
+    args = f"fetch --af 4 --type traceroute --dir {fetch_dir} --sample-pairs 2"
+    runner.invoke(main, args)
+    files = sorted(fetch_dir.glob("*.ndjson*"))
+
+    runner.invoke(main, f"graph --output graph.npz {files[0]}")
+    n_edges = Graph.load("graph.npz").n_edges
+    runner.invoke(main, "graph --output graph.npz " + " ".join(map(str, files)))
+    graph = Graph.load("graph.npz")
+    assert graph.sources == [source_key(x) for x in files]
+    assert graph.n_edges >= n_edges > 0
+
+    # A modified file is rejected, since its records would be counted twice
+    stat = files[0].stat()
+    os.utime(files[0], ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    result = CliRunner.invoke(runner, main, f"graph --output graph.npz {files[0]}")
+    assert result.exit_code != 0
+    assert "rebuild the graph" in result.output
+    assert Graph.load("graph.npz").sources == graph.sources
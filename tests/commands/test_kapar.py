@@ -0,0 +1,19 @@
+from pathlib import Path
+
+from fetchmesh.commands import main
+
+
+def test_kapar(runner):
+    fetch_dir = Path("fetch_dir")
+
+    args = f"fetch --af 4 --type traceroute --dir {fetch_dir} --sample-pairs 2"
+    runner.invoke(main, args)
+    files = " ".join(str(x) for x in fetch_dir.glob("*.ndjson*"))
+    # The same files twice: the second copy only contains duplicate paths.
+    runner.invoke(main, f"kapar --output paths.txt --jobs 2 {files} {files}")
+    runner.invoke(main, f"kapar --output paths1.txt --jobs 1 {files}")
+
+    lines = Path("paths.txt").read_text().splitlines()
+    traces = [x for x in lines if x.startswith("# trace")]
+    assert traces
+    assert lines == Path("paths1.txt").read_text().splitlines()
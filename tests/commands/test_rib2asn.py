@@ -0,0 +1,23 @@
+from pathlib import Path
+from shutil import copy
+
+from fetchmesh.bgp import ASNDB
+from fetchmesh.commands import main
+
+MOCKS = Path(__file__).parent.parent.parent / "fetchmesh" / "mocks"
+
+
+def test_rib2asn(runner):
+    copy(MOCKS / "bview.20190417.0800.gz", "rib_rrc00.ripe.net_201904170800.gz")
+    runner.invoke(main, "rib2asn rib_rrc00.ripe.net_201904170800.gz")
+    runner.invoke(
+        main,
+        [
+            "rib2asn",
+            str(MOCKS / "rib.20180131.0800.bz2"),
+            "--collector",
+            "route-views2.routeviews.org",
+        ],
+    )
+    assert ASNDB.from_file("ipasn_rrc00.ripe.net_201904170800.txt")
+    assert ASNDB.from_file("ipasn_route-views2.routeviews.org_201801310800.txt")
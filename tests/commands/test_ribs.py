@@ -0,0 +1,15 @@
+from pathlib import Path
+
+from fetchmesh.commands import main
+
+
+def test_ribs(runner):
+    args = """
+    ribs --collector rrc00.ripe.net --collector route-views2.routeviews.org
+         --start-date 2019-04-17T07:00 --stop-date 2019-04-17T16:00
+    """
+    runner.invoke(main, args)
+    assert Path("rib_rrc00.ripe.net_201904170800.gz").exists()
+    assert Path("rib_rrc00.ripe.net_201904171600.gz").exists()
+    assert Path("rib_route-views2.routeviews.org_201904170800.bz2").exists()
+    assert not list(Path().glob("*.part*"))
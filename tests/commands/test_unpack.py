@@ -1,6 +1,7 @@
 from pathlib import Path
 
 from fetchmesh.commands import main
+from fetchmesh.io import AtlasPairsReader, AtlasPairsWriter, AtlasRecordsReader
 
 
 def test_unpack(runner):
@@ -64,3 +65,58 @@ def test_unpack(runner):
 
     assert mtime4 != mtime3
     assert size4 != size3
+
+
+def test_unpack_paths(runner):
+    fetch_dir = Path("fetch_dir")
+    pairs_dir = Path("pairs_dir")
+
+    args = f"fetch --af 4 --type traceroute --dir {fetch_dir} --sample-pairs 2"
+    runner.invoke(main, args)
+
+    args = f"unpack --format paths {fetch_dir} {pairs_dir}"
+    runner.invoke(main, args)
+
+    files = list(pairs_dir.glob("*.tpd"))
+    assert files
+    for file in files:
+        assert file.with_suffix(".tpd.paths").exists()
+
+
+def test_unpack_measurement(runner):
+    fetch_dir = Path("fetch_dir")
+    pairs_dir = Path("pairs_dir")
+
+    args = f"fetch --af 4 --type ping --dir {fetch_dir} --sample-pairs 2"
+    runner.invoke(main, args)
+
+    args = f"unpack --layout measurement {fetch_dir} {pairs_dir}"
+    runner.invoke(main, args)
+
+    files = list(pairs_dir.glob("*.ndjson.zst"))
+    assert files
+    assert sorted(pairs_dir.glob("*.idx")) == sorted(
+        AtlasPairsWriter(x).index_file for x in files
+    )
+    assert not list(pairs_dir.glob("*.tmp")) and not list(pairs_dir.glob("*.sorted"))
+    for file in files:
+        reader = AtlasPairsReader(file)
+        records = []
+        for prb_id in reader.probes():
+            records_ = reader.read(prb_id)
+            assert {x["prb_id"] for x in records_} == {prb_id}
+            records += records_
+        assert records == sorted(records, key=lambda x: (x["prb_id"], x["timestamp"]))
+        with AtlasRecordsReader(file) as r:
+            assert list(r) == records
+
+    # In skip mode, a file without index is written again
+    AtlasPairsWriter(files[0]).index_file.unlink()
+    mtimes = {x: x.stat().st_mtime_ns for x in files}
+    runner.invoke(
+        main, f"unpack --layout measurement --mode skip {fetch_dir} {pairs_dir}"
+    )
+    assert AtlasPairsWriter(files[0]).index_file.exists()
+    assert {x: x.stat().st_mtime_ns for x in files[1:]} == {
+        x: mtimes[x] for x in files[1:]
+    }
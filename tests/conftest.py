@@ -12,11 +12,18 @@ class Runner(CliRunner):
 
 @pytest.fixture(autouse=True)
 def no_requests(monkeypatch):
-    cache_get = lambda self, key, fn, *args, **kwargs: fn()
-    monkeypatch.setattr("mbox.cache.Cache.get", cache_get)
+    cache_get = lambda self, url, fn: fn({})
+    monkeypatch.setattr("fetchmesh.cache.HTTPCache.get", cache_get)
     monkeypatch.setattr("requests.sessions.Session.request", requests_mock())
 
 
+@pytest.fixture(autouse=True)
+def no_user_data(monkeypatch, tmp_path):
+    monkeypatch.setattr(
+        "fetchmesh.scheduler.DEFAULT_RATES_FILE", tmp_path / "rates.json"
+    )
+
+
 @pytest.fixture
 def runner():
     cli = Runner()
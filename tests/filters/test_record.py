@@ -6,6 +6,12 @@ def test_probe_record_filter():
     r1 = {"prb_id": 1001}
     r2 = {"prb_id": 1002}
     assert f([r1, r2]) == [r1]
+    assert f.prefilter(b'{"msm_id": 1, "prb_id": 1001, "timestamp": 0}')
+    assert not f.prefilter(b'{"msm_id": 1, "prb_id":1002, "timestamp": 0}')
+    assert f.prefilter(b'{"msm_id": 1}')
+    # A nested field does not reject the record
+    assert f.prefilter(b'{"meta": {"prb_id": 1002}, "prb_id": 1001}')
+    assert not f.prefilter(b'{"meta": {"prb_id": 1002}, "prb_id": 1003}')
 
 
 def test_self_record_filter():
@@ -0,0 +1,60 @@
+import json
+import time
+from pathlib import Path
+
+from fetchmesh.peeringdb import PeeringDB, PeeringDBStore
+
+MOCKS = Path(__file__).parent.parent.parent / "fetchmesh" / "mocks"
+
+
+class FakeClient:
+    def __init__(self):
+        self.tables = {
+            table: json.loads((MOCKS / f"{table}.json").read_text())["data"]
+            for table in ("ix", "ixlan", "ixpfx")
+        }
+        self.changes = {"ix": [], "ixlan": [], "ixpfx": []}
+        self.calls = []
+
+    def fetch(self, table, since=None):
+        self.calls.append((table, since))
+        if since is None:
+            return self.tables[table]
+        return self.changes[table]
+
+
+def test_sync(tmp_path, monkeypatch):
+    client = FakeClient()
+    store = PeeringDBStore(tmp_path)
+
+    report = store.sync(client)
+    assert report.full
+    assert report.added["ixpfx"] == len(client.tables["ixpfx"])
+
+    table, names = store.prefix_table()
+    ix_id = table.lookup_first(["206.126.236.1"])[0]
+    assert names[ix_id] == "Equinix Ashburn"
+
+    # Nothing changed: no new version.
+    report = PeeringDBStore(tmp_path).sync(client)
+    assert not report.full
+    assert report.version is None
+    assert client.calls[-1][1] is not None
+
+    # Rename an IX and delete a prefix.
+    ix = {**client.tables["ix"][0], "name": "Equinix Ashburn (renamed)"}
+    pfx = {**client.tables["ixpfx"][1], "status": "deleted"}
+    client.changes = {"ix": [ix], "ixlan": [], "ixpfx": [pfx]}
+    now = time.time()
+    monkeypatch.setattr("time.time", lambda: now + 60)
+    store = PeeringDBStore(tmp_path)
+    report = store.sync(client)
+    assert report.updated["ix"] == 1
+    assert report.deleted["ixpfx"] == 1
+    assert len(store.versions()) == 2
+
+    peeringdb = store.peeringdb()
+    assert isinstance(peeringdb, PeeringDB)
+    assert peeringdb.ix_names()[ix["id"]] == "Equinix Ashburn (renamed)"
+    assert table.search(pfx["prefix"].split("/")[0]) is not None
+    assert store.prefix_table()[0].search(pfx["prefix"].split("/")[0]) is None
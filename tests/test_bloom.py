@@ -0,0 +1,28 @@
+import pytest
+
+from fetchmesh.bloom import BloomFilter
+
+
+def test_bloom_filter():
+    bf = BloomFilter(capacity=1000, error_rate=1e-3)
+    assert bf.add("a")
+    assert not bf.add("a")
+    assert bf.add(b"b")
+    assert "a" in bf and b"b" in bf
+    assert "c" not in bf
+    assert len(bf) == 2
+
+
+def test_bloom_filter_error_rate():
+    bf = BloomFilter(capacity=10_000, error_rate=1e-2)
+    bf.update(str(i) for i in range(10_000))
+    assert all(str(i) in bf for i in range(10_000))
+    false_positives = sum(str(i) in bf for i in range(10_000, 20_000))
+    assert false_positives < 300
+
+
+def test_bloom_filter_invalid():
+    with pytest.raises(ValueError):
+        BloomFilter(capacity=0)
+    with pytest.raises(ValueError):
+        BloomFilter(error_rate=1)
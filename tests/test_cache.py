@@ -0,0 +1,98 @@
+import time
+
+import pytest
+from requests import Response
+
+from fetchmesh.cache import HTTPCache
+
+# The cache is disabled for the other tests (see conftest.py).
+HTTPCACHE_GET = HTTPCache.get
+
+
+@pytest.fixture(autouse=True)
+def enable_cache(no_requests, monkeypatch):
+    monkeypatch.setattr(HTTPCache, "get", HTTPCACHE_GET)
+
+
+class Server:
+    def __init__(self, etag=None, size=16):
+        self.etag = etag
+        self.size = size
+        self.requests = []
+
+    def __call__(self, headers):
+        self.requests.append(headers)
+        r = Response()
+        if self.etag and headers.get("If-None-Match") == self.etag:
+            r.status_code = 304
+            r._content = b""
+        else:
+            r.status_code = 200
+            r._content = b"x" * self.size
+            if self.etag:
+                r.headers["ETag"] = self.etag
+        return r
+
+
+def test_hit(tmp_path):
+    cache = HTTPCache(tmp_path, default_ttl=3600)
+    server = Server()
+    r1 = cache.get("http://example.org/a", server)
+    r2 = cache.get("http://example.org/a", server)
+    assert r1.content == r2.content == b"x" * 16
+    assert len(server.requests) == 1
+    stats = cache.stats()
+    assert (stats.hits, stats.misses, stats.entries) == (1, 1, 1)
+
+
+def test_revalidation(tmp_path):
+    cache = HTTPCache(tmp_path, default_ttl=0)
+    server = Server(etag='"v1"')
+    cache.get("http://example.org/a", server)
+    r = cache.get("http://example.org/a", server)
+    assert r.status_code == 200
+    assert r.content == b"x" * 16
+    assert server.requests[1] == {"If-None-Match": '"v1"'}
+    assert cache.stats().revalidations == 1
+
+
+def test_ttls(tmp_path):
+    cache = HTTPCache(tmp_path, ttls=[(r"/anchors", 3600)], default_ttl=0)
+    assert cache.ttl("https://atlas.ripe.net/api/v2/anchors?page=2") == 3600
+    assert cache.ttl("https://atlas.ripe.net/api/v2/measurements") == 0
+
+
+def test_eviction(tmp_path):
+    server = Server(size=4096)
+    # Size of a compressed entry
+    cache = HTTPCache(tmp_path / "probe")
+    cache.get("http://example.org/probe", server)
+    size = cache.stats().size
+
+    cache = HTTPCache(tmp_path / "cache", max_size=2 * size)
+    cache.get("http://example.org/a", server)
+    time.sleep(0.01)
+    cache.get("http://example.org/b", server)
+    time.sleep(0.01)
+    cache.get("http://example.org/a", server)  # a is now more recent than b
+    time.sleep(0.01)
+    cache.get("http://example.org/c", server)
+
+    stats = cache.stats()
+    assert stats.entries == 2
+    assert stats.evictions == 1
+    assert stats.size <= 2 * size
+
+    n = len(server.requests)
+    cache.get("http://example.org/a", server)
+    assert len(server.requests) == n
+    cache.get("http://example.org/b", server)
+    assert len(server.requests) == n + 1
+
+
+def test_clear(tmp_path):
+    cache = HTTPCache(tmp_path)
+    cache.get("http://example.org/a", Server())
+    assert cache.clear() == 1
+    assert cache.stats().entries == 0
+    assert not list(tmp_path.glob("*.zst"))
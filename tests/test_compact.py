@@ -0,0 +1,122 @@
+import datetime as dt
+from pathlib import Path
+
+from pytz import UTC
+
+from fetchmesh.atlas import MeasurementAF, MeasurementType
+from fetchmesh.commands import main
+from fetchmesh.compact import compact, copy_range, split_file
+from fetchmesh.io import AtlasRecordsReader, AtlasRecordsWriter, LogEntry
+from fetchmesh.meta import AtlasResultsMeta
+
+
+def write_window(directory, hour, records, compressed=True, hours=1):
+    meta = AtlasResultsMeta(
+        MeasurementAF.IPv4,
+        MeasurementType.Ping,
+        1001,
+        dt.datetime(2020, 1, 1, hour, tzinfo=UTC),
+        dt.datetime(2020, 1, 1, hour + hours, tzinfo=UTC),
+        compressed,
+    )
+    file = directory / meta.filename
+    with AtlasRecordsWriter(file, compression=compressed, log=True) as w:
+        w.writeall(records)
+    return file
+
+
+def make_records(n, offset=0):
+    return [{"msm_id": 1001, "prb_id": offset + i} for i in range(n)]
+
+
+def test_copy_range(tmp_path):
+    (tmp_path / "src").write_bytes(bytes(range(256)) * 10)
+    with (tmp_path / "src").open("rb", buffering=0) as src:
+        with (tmp_path / "dst").open("wb", buffering=0) as dst:
+            src.seek(10)
+            assert copy_range(src, dst, 100) == 100
+            assert copy_range(src, dst, 10_000) == 2450
+    assert (tmp_path / "dst").read_bytes() == (bytes(range(256)) * 10)[10:]
+
+
+def test_compact(tmp_path):
+    files = [
+        write_window(tmp_path, 1, make_records(3)),
+        write_window(tmp_path, 0, make_records(2, 10)),
+    ]
+    output = compact(files)
+    assert output.name == "ping_v4_1577836800_1577844000_1001.ndjson.zst"
+    with AtlasRecordsReader(output) as r:
+        assert list(r) == make_records(2, 10) + make_records(3)
+
+    log = LogEntry.iter_unpack(AtlasRecordsWriter(output).log_file.read_bytes())
+    assert [prb_id for _, _, prb_id in log] == [10, 11, 0, 1, 2]
+    assert output.stat().st_size == sum(x.stat().st_size for x in files)
+
+    # Re-compression
+    output = compact([output], tmp_path / "level", level=19)
+    with AtlasRecordsReader(output) as r:
+        assert list(r) == make_records(2, 10) + make_records(3)
+
+
+def test_compact_mixed(tmp_path):
+    files = [
+        write_window(tmp_path, 0, make_records(2), compressed=False),
+        write_window(tmp_path, 1, make_records(2, 10)),
+    ]
+    output = compact(files, tmp_path / "out")
+    assert output.name.endswith(".ndjson.zst")
+    with AtlasRecordsReader(output) as r:
+        assert list(r) == make_records(2) + make_records(2, 10)
+
+
+def test_split_file(tmp_path):
+    start = 1577836800
+    records = [
+        {"msm_id": 1001, "prb_id": 1, "timestamp": start + i * 1800} for i in range(6)
+    ]
+    file = write_window(tmp_path, 0, records, hours=3)
+    # A file within a single window is not split
+    assert split_file(file, 3 * 3600, tmp_path / "parts") == [file]
+
+    (tmp_path / "parts").mkdir()
+    parts = split_file(file, 2 * 3600, tmp_path / "parts")
+    assert [x.name for x in parts] == [
+        f"ping_v4_{start}_{start + 7199}_1001.ndjson.zst",
+        f"ping_v4_{start + 7200}_{start + 10800}_1001.ndjson.zst",
+    ]
+    assert list(AtlasRecordsReader.all(parts)) == records
+    assert AtlasRecordsWriter(parts[0]).log_file.stat().st_size == 4 * LogEntry.size
+
+
+def test_compact_command(runner):
+    src = Path("src")
+    src.mkdir()
+    for hour in range(4):
+        write_window(src, hour, make_records(1, hour))
+
+    runner.invoke(main, f"compact --window 2 --delete {src}")
+    assert sorted(x.name for x in src.glob("*.zst")) == [
+        "ping_v4_1577836800_1577844000_1001.ndjson.zst",
+        "ping_v4_1577844000_1577851200_1001.ndjson.zst",
+    ]
+    assert len(list(src.glob("*.log"))) == 2
+
+    # The files spanning several windows are re-chunked
+    start = 1577836800
+    records = [
+        {"msm_id": 1002, "prb_id": 1, "timestamp": start + i * 1800} for i in range(8)
+    ]
+    meta = AtlasResultsMeta.from_filename(
+        f"ping_v4_{start}_{start + 4 * 3600}_1002.ndjson.zst"
+    )
+    with AtlasRecordsWriter(src / meta.filename, compression=True, log=True) as w:
+        w.writeall(records)
+    runner.invoke(main, f"compact --window 2 --delete {src}")
+    files = sorted(src.glob("*_1002.ndjson.zst"))
+    assert [x.name for x in files] == [
+        f"ping_v4_{start}_{start + 7199}_1002.ndjson.zst",
+        f"ping_v4_{start + 7200}_{start + 14399}_1002.ndjson.zst",
+    ]
+    assert list(AtlasRecordsReader.all(files)) == records
+    assert not list(src.glob(".compact_*"))
@@ -0,0 +1,108 @@
+import os
+import time
+from datetime import datetime
+
+import pytest
+from pytz import UTC
+from requests import HTTPError, Response
+from requests.exceptions import ReadTimeout
+
+from fetchmesh.atlas import AtlasClient, MeasurementAF, MeasurementType
+from fetchmesh.controller import AIMDController, is_congestion, retry_after
+from fetchmesh.fetcher import FetchJob, SimpleFetcher
+from fetchmesh.meta import AtlasResultsMeta
+from fetchmesh.mocks import ThrottlingMock, requests_mock
+
+
+def http_error(status, retry_after=None):
+    r = Response()
+    r.status_code = status
+    if retry_after is not None:
+        r.headers["Retry-After"] = str(retry_after)
+    return HTTPError(response=r)
+
+
+def test_is_congestion():
+    assert is_congestion(ReadTimeout())
+    assert is_congestion(http_error(429))
+    assert is_congestion(http_error(503))
+    assert not is_congestion(http_error(404))
+    assert not is_congestion(ValueError())
+
+
+def test_retry_after():
+    assert retry_after(http_error(429)) is None
+    assert retry_after(http_error(429, 10)) == 10.0
+    assert retry_after(http_error(429, "Wed, 21 Oct 2015 07:28:00 GMT")) == 0.0
+    assert retry_after(ValueError()) is None
+
+
+def test_aimd(tmp_path):
+    controller = AIMDController(tmp_path / "ctl", max_limit=8, cooldown=0)
+
+    # Slow start
+    for _ in range(4):
+        with controller.slot():
+            pass
+    assert controller.state()["limit"] == 5.0
+
+    # Multiplicative decrease
+    with pytest.raises(HTTPError):
+        with controller.slot():
+            raise http_error(503)
+    state = controller.state()
+    assert state["limit"] == 2.5
+    assert state["inflight"] == {}
+
+    # Additive increase
+    with controller.slot():
+        pass
+    assert controller.state()["limit"] == pytest.approx(2.9)
+
+
+def test_limit(tmp_path):
+    controller = AIMDController(tmp_path / "ctl", initial_limit=2)
+    assert controller.try_acquire()
+    assert controller.try_acquire()
+    assert not controller.try_acquire()
+    controller.release()
+    assert controller.try_acquire()
+
+
+def test_dead_process(tmp_path):
+    controller = AIMDController(tmp_path / "ctl")
+    with controller._state() as state:
+        # PIDs are not recycled that fast.
+        state["inflight"] = {"999999999": 1}
+    assert controller.try_acquire()
+    assert controller.state()["inflight"] == {str(os.getpid()): 1}
+
+
+def test_retry_after_pause(tmp_path):
+    controller = AIMDController(tmp_path / "ctl")
+    with pytest.raises(HTTPError):
+        with controller.slot():
+            raise http_error(429, 60)
+    assert not controller.try_acquire()
+    assert controller.state()["until"] > time.time() + 50
+
+
+def test_fetch_throttled(monkeypatch, tmp_path):
+    mock = ThrottlingMock(requests_mock(), every=2, retry_after=0)
+    monkeypatch.setattr("requests.sessions.Session.request", mock.request)
+
+    controller = AIMDController(tmp_path / "ctl", max_limit=4)
+    fetcher = SimpleFetcher(
+        tmp_path / "results", AtlasClient(progress=False), controller=controller
+    )
+
+    start = datetime(2020, 9, 8, tzinfo=UTC)
+    stop = datetime(2020, 9, 9, tzinfo=UTC)
+    meta = AtlasResultsMeta(
+        MeasurementAF.IPv4, MeasurementType.Ping, 1001, start, stop, False
+    )
+    fetcher.fetch(FetchJob(meta, [1, 2, 3]))
+
+    assert (tmp_path / "results" / meta.filename).exists()
+    assert mock.throttled > 0
+    assert controller.state()["inflight"] == {}
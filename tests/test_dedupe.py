@@ -0,0 +1,78 @@
+from pathlib import Path
+
+from fetchmesh.commands import main
+from fetchmesh.commands.dedupe import dedupe_file
+from fetchmesh.dedupe import RecordDeduplicator, find_candidates
+from fetchmesh.io import AtlasRecordsReader, AtlasRecordsWriter
+
+
+def make_records(timestamps, prb_id=1):
+    return [{"msm_id": 1001, "prb_id": prb_id, "timestamp": t} for t in timestamps]
+
+
+def test_deduplicator():
+    records = make_records([0, 1, 1, 2]) + make_records([1, 0, 1], prb_id=2)
+    for ordered in (False, True):
+        dedupe = RecordDeduplicator(ordered=ordered, capacity=100)
+        assert list(dedupe(records + [None])) == (
+            make_records([0, 1, 2]) + make_records([1, 0][: 2 - ordered], prb_id=2)
+        ) + [None]
+        assert dedupe.dropped == 2 + ordered
+
+
+def test_deduplicator_candidates():
+    records = make_records(range(100)) + make_records([1, 1, 2])
+    # A tiny Bloom filter reports many false positives...
+    candidates = find_candidates(records, capacity=1, error_rate=0.5)
+    assert len(candidates) > 2
+    # ...but the records are deduplicated exactly.
+    dedupe = RecordDeduplicator(candidates=candidates)
+    assert list(dedupe(records)) == make_records(range(100))
+    assert dedupe.dropped == 3
+
+
+def test_deduplicator_reader(tmp_path):
+    files = [tmp_path / "1.ndjson", tmp_path / "2.ndjson"]
+    for file, timestamps in zip(files, ([0, 1, 2], [2, 3])):
+        with AtlasRecordsWriter(file) as w:
+            w.writeall(make_records(timestamps))
+    dedupe = RecordDeduplicator(ordered=True)
+    records = list(AtlasRecordsReader.all(files, deduplicator=dedupe))
+    assert records == make_records([0, 1, 2, 3])
+
+
+def test_dedupe_command(runner):
+    src = Path("src")
+    src.mkdir()
+    windows = [(0, 3600, [0, 3600]), (3600, 7200, [3600, 7000])]
+    for start, stop, timestamps in windows:
+        file = src / f"ping_v4_{start}_{stop}_1001.ndjson.zst"
+        with AtlasRecordsWriter(file, compression=True, log=True) as w:
+            w.writeall(make_records(timestamps))
+
+    runner.invoke(main, f"dedupe {src}")
+    records = list(AtlasRecordsReader.glob(src, "*.zst"))
+    assert sorted(x["timestamp"] for x in records) == [0, 3600, 7000]
+    log = src / "ping_v4_3600_7200_1001.ndjson.zst.log"
+    assert log.stat().st_size == 24
+    assert not list(src.glob("*.tmp*"))
+
+
+def test_dedupe_file_error(tmp_path):
+    file = tmp_path / "ping_v4_0_3600_1001.ndjson.zst"
+    file.write_bytes(b"invalid")
+    dedupe = RecordDeduplicator(ordered=True)
+    assert dedupe_file(file, dedupe) == (0, 1)
+    assert file.read_bytes() == b"invalid"
+    assert not list(tmp_path.glob("*.tmp*"))
+
+
+def test_dedupe_file_invalid(tmp_path):
+    file = tmp_path / "ping_v4_0_3600_1001.ndjson"
+    data = '{"msm_id": 1001, "prb_id": 1, "timestamp": 0}\n' * 2 + "{invalid\n"
+    file.write_text(data)
+    dedupe = RecordDeduplicator(ordered=True)
+    # The duplicate is not removed, since the invalid record would be lost.
+    assert dedupe_file(file, dedupe) == (0, 1)
+    assert file.read_text() == data
+    assert not list(tmp_path.glob("*.tmp*"))
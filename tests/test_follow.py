@@ -0,0 +1,94 @@
+import datetime as dt
+import json
+from pathlib import Path
+
+from pytz import UTC
+
+from fetchmesh.atlas import MeasurementAF, MeasurementType
+from fetchmesh.commands import main
+from fetchmesh.follow import Follower
+from fetchmesh.io import AtlasRecordsReader, LogEntry
+from fetchmesh.meta import AtlasResultsMeta
+
+
+def make_meta(start, stop):
+    return AtlasResultsMeta(
+        MeasurementAF.IPv4,
+        MeasurementType.Ping,
+        1001,
+        dt.datetime.fromtimestamp(start, UTC),
+        dt.datetime.fromtimestamp(stop, UTC),
+        False,
+    )
+
+
+def make_records(prb_id, timestamps):
+    return [{"msm_id": 1001, "prb_id": prb_id, "timestamp": t} for t in timestamps]
+
+
+def test_follower(tmp_path):
+    follower = Follower(tmp_path, split=3600, settle_lag=100, max_lag=1200)
+    meta = make_meta(1000, 10000)
+    stop_date = dt.datetime.fromtimestamp(5000, UTC)
+
+    job = follower.job(meta, [1, 2], stop_date)
+    assert job.meta.start_timestamp == 1000
+    assert job.meta.stop_timestamp == 5000
+    records = make_records(1, [4000, 3000]) + make_records(2, [4900])
+    assert follower.add(records, job.meta) == 3
+
+    # The next poll starts `settle_lag` seconds before the end of the previous poll,
+    # and only the records after the last record of each probe are added.
+    follower = Follower(tmp_path, split=3600, settle_lag=100, max_lag=1200, buffer=1)
+    job = follower.job(meta, [1, 2], dt.datetime.fromtimestamp(5500, UTC))
+    assert job.meta.start_timestamp == 5001 - 100
+    records = make_records(1, [3000, 4000, 5000]) + make_records(2, [4900, 5400])
+    assert follower.add(records, job.meta) == 2
+
+    # Every `max_lag` seconds, a poll starts `max_lag` seconds before the previous one.
+    job = follower.job(meta, [1, 2, 3], dt.datetime.fromtimestamp(6500, UTC))
+    assert job.meta.start_timestamp == 5501 - 1200
+    assert follower.add(make_records(3, [4500]), job.meta) == 1
+    job = follower.job(meta, [1, 2, 3], dt.datetime.fromtimestamp(7000, UTC))
+    assert job.meta.start_timestamp == 6501 - 100
+
+    files = sorted(tmp_path.glob("*.zst"))
+    assert [AtlasResultsMeta.from_filename(x.name).start_timestamp for x in files] == [
+        0,
+        3600,
+    ]
+    records = list(AtlasRecordsReader.all(files))
+    assert sorted(x["timestamp"] for x in records) == [
+        3000,
+        4000,
+        4500,
+        4900,
+        5000,
+        5400,
+    ]
+    log = AtlasRecordsReader(files[1]).file.with_suffix(".zst.log")
+    assert log.stat().st_size == 5 * LogEntry.size
+
+
+def test_fetch_follow(runner, monkeypatch):
+    sleeps = []
+
+    def sleep(seconds):
+        sleeps.append(seconds)
+        if len(sleeps) == 2:
+            raise KeyboardInterrupt
+
+    monkeypatch.setattr("time.sleep", sleep)
+    args = "fetch --af 4 --type ping --start-date 2020-09-08 --dir results"
+    runner.invoke(main, args + " --sample-pairs 2 --save-pairs --dry-run")
+    runner.invoke(main, args + " --load-pairs results.pairs --follow --compress")
+
+    assert sleeps == [300, 300]
+    assert Path("results/follow.json").exists()
+    files = list(Path("results").glob("*.ndjson.zst"))
+    assert files
+    # The second poll does not add the records of the first poll again
+    # (the mocked API returns the same 2000 records for each measurement).
+    state = json.loads(Path("results/follow.json").read_text())
+    records = list(AtlasRecordsReader.all(files))
+    assert len(records) == 2000 * len(state["polled"])
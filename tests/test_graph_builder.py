@@ -0,0 +1,65 @@
+import pytest
+
+from fetchmesh.graph import Graph, GraphBuilder
+
+
+def make_record(timestamp, *hops):
+    return {
+        "type": "traceroute",
+        "timestamp": timestamp,
+        "msm_id": 1,
+        "prb_id": 2,
+        "from": "",
+        "src_addr": "",
+        "dst_addr": "",
+        "paris_id": 0,
+        "result": [
+            {"result": [{"from": addr, "asn": asn} for addr, asn in hop]}
+            for hop in hops
+        ],
+    }
+
+
+A, B, C, P = ("1.0.0.1", 1), ("2.0.0.1", 2), ("2.0.0.2", 2), ("10.0.0.1", None)
+
+
+def test_graph_builder(tmp_path):
+    builder = GraphBuilder()
+    builder.add_records(
+        [
+            make_record(10, [A], [B, C], [A]),
+            make_record(20, [A], [B], [P], [C]),
+            make_record(5, [A, A], [B]),
+        ]
+    )
+    graph = builder.freeze()
+    assert len(graph) == 3
+    assert sorted(graph.edges()) == [
+        ("1.0.0.1", "2.0.0.1", 3, 5, 20),
+        ("1.0.0.1", "2.0.0.2", 1, 10, 10),
+        ("2.0.0.1", "1.0.0.1", 1, 10, 10),
+        ("2.0.0.2", "1.0.0.1", 1, 10, 10),
+    ]
+    assert sorted(graph.successors("1.0.0.1")) == ["2.0.0.1", "2.0.0.2"]
+    assert graph.out_degrees().tolist() == [2, 1, 1]
+
+    graph.save(tmp_path / "graph.npz")
+    graph = Graph.load(tmp_path / "graph.npz")
+    assert graph.level == "ip"
+
+    # Incremental update
+    builder = graph.builder()
+    builder.add_records([make_record(30, [B], [C])])
+    graph = builder.freeze()
+    assert ("2.0.0.1", "2.0.0.2", 1, 30, 30) in list(graph.edges())
+    assert graph.n_edges == 5
+
+
+def test_graph_builder_asn():
+    builder = GraphBuilder(level="asn")
+    builder.add_record(make_record(10, [A], [B], [C], [P], [A]))
+    graph = builder.freeze()
+    assert list(graph.edges()) == [(1, 2, 1, 10, 10)]
+
+    with pytest.raises(ValueError):
+        GraphBuilder(level="router")
@@ -3,7 +3,19 @@ from pathlib import Path
 
 from zstandard import ZstdCompressionDict, ZstdDecompressor
 
-from fetchmesh.io import AtlasRecordsReader, AtlasRecordsWriter, LogEntry, dictionary
+from fetchmesh.filters import ProbeIDRecordFilter
+from fetchmesh.io import (
+    AtlasPairsReader,
+    AtlasPairsWriter,
+    AtlasRecordsReader,
+    AtlasRecordsWriter,
+    AtlasRecordsWriterPool,
+    LogEntry,
+    TraceroutePathsReader,
+    TraceroutePathsWriter,
+    dictionary,
+)
+from fetchmesh.transformers import TracerouteFlatIPTransformer
 
 
 class BlackholeFilter:
@@ -122,6 +134,20 @@ def test_filters(tmpfile):
     assert records_ == []
 
 
+def test_prefilters(tmpfile):
+    records = [{"prb_id": i, "timestamp": i} for i in range(100)]
+
+    for compression in [False, True]:
+        with AtlasRecordsWriter(tmpfile, compression=compression) as w:
+            w.writeall(records)
+
+        filters = [ProbeIDRecordFilter({1, 42})]
+        with AtlasRecordsReader(tmpfile, filters=filters) as r:
+            records_ = list(r)
+
+        assert records_ == [records[1], records[42]]
+
+
 def test_exception(tmpfile):
     filters = [BlackholeFilter()]
     records = [{"test": "test"}]
@@ -130,3 +156,67 @@ def test_exception(tmpfile):
             w.write(record)
         raise ValueError()
     assert not tmpfile.exists()
+
+
+def test_traceroute_paths(tmpfile):
+
+    with AtlasRecordsReader(
+        Path(__file__).parent.parent / "fetchmesh/mocks/results.ndjson"
+    ) as r:
+        records = [x for x in r if x and x["type"] == "traceroute"]
+
+    with TraceroutePathsWriter(tmpfile) as w:
+        w.writeall(records[:500])
+    with TraceroutePathsWriter(tmpfile, append=True) as w:
+        w.writeall(records[500:])
+
+    reader = TraceroutePathsReader(tmpfile)
+    with reader as r:
+        records_ = list(r)
+    n_paths = len(reader.paths)
+
+    assert len(records_) == len(records)
+    assert n_paths < len(records)
+
+    flat = TracerouteFlatIPTransformer(drop_dup=True, drop_late=True)
+    for record, record_ in zip(records, records_):
+        assert flat(record) == flat(record_)
+        rtts = [x.get("rtt") for hop in record["result"] for x in hop.get("result", [])]
+        rtts_ = [
+            x.get("rtt") for hop in record_["result"] for x in hop.get("result", [])
+        ]
+        assert rtts_ == rtts
+
+    with reader:
+        entries = list(reader.entries())
+    assert [entry[:3] for entry, _ in entries] == [
+        (x["timestamp"], x["msm_id"], x["prb_id"]) for x in records
+    ]
+
+
+def test_writer_pool(tmp_path):
+
+    records = [{"msm_id": i % 5, "prb_id": i} for i in range(100)]
+    with AtlasRecordsWriterPool(max_open=2, buffer_size=3, compression=True) as pool:
+        for record in records:
+            pool.write(tmp_path / f"{record['msm_id']}.ndjson.zst", record)
+    assert len(pool.writers) == 0
+    assert pool.opened < len(records)
+
+    for i in range(5):
+        with AtlasRecordsReader(tmp_path / f"{i}.ndjson.zst") as r:
+            assert list(r) == [x for x in records if x["msm_id"] == i]
+
+
+def test_pairs(tmpfile):
+
+    with AtlasPairsWriter(tmpfile) as w:
+        w.write_pair(2, [{"prb_id": 2, "timestamp": 2}, {"prb_id": 2, "timestamp": 1}])
+        w.write_pair(1, [{"prb_id": 1, "timestamp": 3}])
+
+    r = AtlasPairsReader(tmpfile)
+    assert r.probes() == [1, 2]
+    assert r.read(2) == [{"prb_id": 2, "timestamp": 1}, {"prb_id": 2, "timestamp": 2}]
+    with AtlasRecordsReader(tmpfile) as records:
+        assert [x["prb_id"] for x in records] == [1, 2, 2]
+    assert not w.tmp_file.exists()
@@ -1,10 +1,10 @@
-from datetime import datetime
+from datetime import datetime, timedelta
 
 from pytz import UTC
 
 from fetchmesh.atlas import MeasurementAF, MeasurementType
 from fetchmesh.filters import HalfPairFilter, MeasurementDateFilter, SelfPairFilter
-from fetchmesh.mesh import AnchoringMesh, AnchoringMeshPairs
+from fetchmesh.mesh import AnchoringMesh, AnchoringMeshIndex, AnchoringMeshPairs
 
 
 def test_pairs_indexing():
@@ -53,6 +53,23 @@ def test_pairs_filter():
     assert p1 == p2
 
 
+def test_mesh_index():
+    mesh = AnchoringMesh.from_api()
+    index = AnchoringMeshIndex(mesh)
+    dates = [
+        datetime(2015, 1, 1, tzinfo=UTC) + timedelta(days=90 * i) for i in range(28)
+    ]
+    for date, n_anchors, n_measurements in index.series(dates):
+        expected = mesh.filter(MeasurementDateFilter.running(date, date))
+        assert index.running(date) == expected
+        assert index.count(date) == n_measurements == len(expected.measurements)
+        assert n_anchors == len(expected.anchors)
+    for a, b in zip(dates, dates[3:]):
+        expected = mesh.filter(MeasurementDateFilter.running(b, a))
+        assert index.running(a, b) == expected
+        assert index.count(a, b) == len(expected.measurements)
+
+
 # TODO: Check that we find only one measurement
 def test_find_measurement():
     pass
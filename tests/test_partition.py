@@ -0,0 +1,36 @@
+from fetchmesh.partition import HashPartitioner, partition_groups
+
+
+def count(file):
+    return sum(len(records) for _, records in partition_groups(file, ("a",)))
+
+
+def test_partitioner(tmp_path):
+    records = [{"a": i % 7, "b": i} for i in range(1000)]
+    # A small memory budget forces several flushes (and frames) per partition.
+    with HashPartitioner(("a",), partitions=4, memory=1000) as p:
+        p.addall(records)
+        groups = dict(p.groups())
+        files = p.files()
+        # The partitions larger than the memory budget are partitioned again,
+        # until they contain a single key.
+        assert len(files) == 7
+        assert sorted(p.map(count, jobs=2)) == sorted(map(count, files))
+        # The records added afterwards go to the same partition as their key.
+        p.add({"a": 1, "b": 1000})
+        assert p.files() == files
+        assert sum(map(count, files)) == 1001
+    assert not any(file.exists() for file in files)
+    assert not any(file.parent.exists() for file in files)
+
+    assert sorted(groups) == [(i,) for i in range(7)]
+    for (a,), records_ in groups.items():
+        # The records of a group keep their order.
+        assert records_ == [x for x in records if x["a"] == a]
+
+
+def test_partitioner_directory(tmp_path):
+    with HashPartitioner(("a", "b"), directory=tmp_path / "parts") as p:
+        p.add({"a": 1, "b": "x"})
+        assert list(p.groups()) == [((1, "x"), [{"a": 1, "b": "x"}])]
+    assert not list((tmp_path / "parts").iterdir())
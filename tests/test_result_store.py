@@ -0,0 +1,151 @@
+import datetime as dt
+from pathlib import Path
+
+import pytest
+from pytz import UTC
+from requests.exceptions import ConnectionError
+from tenacity import wait_none
+
+from fetchmesh.atlas import MeasurementAF, MeasurementType
+from fetchmesh.commands import main
+from fetchmesh.fetcher import SimpleFetcher
+from fetchmesh.io import AtlasRecordsReader, AtlasRecordsWriter
+from fetchmesh.meta import AtlasResultsMeta
+from fetchmesh.store import ResultStore
+
+
+def make_meta(start, stop):
+    return AtlasResultsMeta(
+        MeasurementAF.IPv4,
+        MeasurementType.Ping,
+        1001,
+        dt.datetime.fromtimestamp(start, UTC),
+        dt.datetime.fromtimestamp(stop, UTC),
+        False,
+    )
+
+
+def stage(store, job):
+    """Simulate the fetcher, with one record per probe and per 10 minutes."""
+    with AtlasRecordsWriter(store.staging / job.meta.filename, log=True) as w:
+        for timestamp in range(job.meta.start_timestamp, job.meta.stop_timestamp, 600):
+            w.writeall(
+                {"msm_id": 1001, "prb_id": prb_id, "timestamp": timestamp}
+                for prb_id in job.probes or [1, 2, 3]
+            )
+
+
+def test_result_store(tmp_path):
+    store = ResultStore(tmp_path, chunk=3600)
+    store.fetcher()
+    meta = make_meta(1800, 5400)
+
+    jobs = store.missing(meta, [1, 2])
+    assert [(x.meta.start_timestamp, x.meta.stop_timestamp) for x in jobs] == [
+        (0, 3599),
+        (3600, 7199),
+    ]
+    for job in jobs:
+        stage(store, job)
+        store.commit(job)
+    assert store.coverage(1001) == {0: [1, 2], 3600: [1, 2]}
+    assert store.missing(meta, [1, 2]) == []
+
+    records = list(store.view(meta, [2]))
+    assert {x["prb_id"] for x in records} == {2}
+    assert [x["timestamp"] for x in records] == list(range(1800, 5401, 600))
+
+    # Only the missing probes are fetched, and appended to the chunks.
+    jobs = store.missing(meta, [2, 3])
+    assert [x.probes for x in jobs] == [[3], [3]]
+    for job in jobs:
+        stage(store, job)
+        store.commit(job)
+    assert store.coverage(1001) == {0: [1, 2, 3], 3600: [1, 2, 3]}
+    assert len(list(store.view(meta, []))) == 3 * 7
+
+    file = store.materialize(meta, [1], tmp_path / "out")
+    assert file.name == meta.filename
+    assert len(list(AtlasRecordsReader.all([file]))) == 7
+    assert not list(store.staging.iterdir())
+
+    with pytest.raises(ValueError):
+        ResultStore(tmp_path, chunk=60)
+
+
+def test_result_store_not_final(tmp_path):
+    store = ResultStore(tmp_path, chunk=3600)
+    store.fetcher()
+    now = int(dt.datetime.now(UTC).timestamp())
+    meta = make_meta(now - 3600, now)
+    for job in store.missing(meta, [1]):
+        stage(store, job)
+        store.commit(job)
+    # The last chunk is fetched again, with all the requested probes.
+    jobs = store.missing(meta, [1, 2])
+    assert [x.probes for x in jobs[-1:]] == [[1, 2]]
+    assert jobs[-1].meta.stop_timestamp >= now
+
+
+def test_result_store_fetch_time(tmp_path):
+    store = ResultStore(tmp_path, chunk=3600, settle_time=600)
+    meta = make_meta(0, 3599)
+    # The chunk was not final when the fetch started.
+    store.fetcher()
+    store.fetch_time = 3599 + 600 - 1
+    (job,) = store.missing(meta, [1])
+    stage(store, job)
+    store.commit(job)
+    assert store.coverage(1001) == {}
+
+    # A final chunk without results is recorded in the coverage.
+    store.fetcher()
+    (job,) = store.missing(meta, [1])
+    with AtlasRecordsWriter(store.staging / job.meta.filename, log=True):
+        pass
+    store.commit(job)
+    assert store.coverage(1001) == {0: [1]}
+    assert store.missing(meta, [1]) == []
+    assert list(store.view(meta, [1])) == []
+
+
+def test_result_store_fetch_error(tmp_path, monkeypatch):
+    store = ResultStore(tmp_path, chunk=3600)
+    fetcher = store.fetcher()
+    (job,) = store.missing(make_meta(0, 3599), [1, 2])
+    stage(store, job)
+    store.commit(job)
+    coverage = store.coverage(1001)
+    file, log = store.file(job.meta), AtlasRecordsWriter(store.file(job.meta)).log_file
+    data, log_data = file.read_bytes(), log.read_bytes()
+
+    def stream(path):
+        yield {"msm_id": 1001, "prb_id": 1, "timestamp": 0}
+        raise ConnectionError("connection reset")
+
+    monkeypatch.setattr(fetcher.client, "fetch_results_stream", stream)
+    monkeypatch.setattr(SimpleFetcher._fetch.retry, "wait", wait_none())
+    # The response fails mid-stream: the fetch fails, and the chunk is left as is.
+    with pytest.raises(ConnectionError):
+        fetcher.fetch(job)
+    store.commit(job)
+    assert store.coverage(1001) == coverage
+    assert file.read_bytes() == data and log.read_bytes() == log_data
+
+
+def test_fetch_store(runner):
+    args = """
+    fetch --af 4 --type ping --store store --store-chunk 1
+          --start-date 2020-09-08T00:00 --stop-date 2020-09-08T02:00
+    """
+    runner.invoke(main, args + " --sample-pairs 2 --save-pairs --dir a")
+    # The two sampled pairs may have the same target.
+    targets = len(list(Path("a").glob("*.ndjson")))
+    chunks = {x: x.stat().st_mtime_ns for x in Path("store").glob("*/*.zst")}
+    assert len(chunks) == targets * 3
+
+    # The overlapping window is served from the store.
+    args = args.replace("T00:00", "T00:30").replace("T02:00", "T01:30")
+    runner.invoke(main, args + " --load-pairs a.pairs --dir b")
+    assert {x: x.stat().st_mtime_ns for x in Path("store").glob("*/*.zst")} == chunks
+    assert len(list(Path("b").glob("*.ndjson"))) == targets
@@ -0,0 +1,107 @@
+import datetime as dt
+
+from pytz import UTC
+
+from fetchmesh.atlas import MeasurementAF, MeasurementType
+from fetchmesh.fetcher import FetchJob
+from fetchmesh.meta import AtlasResultsMeta
+from fetchmesh.scheduler import ByteRates, FetchScheduler
+
+START = dt.datetime(2020, 9, 8, tzinfo=UTC)
+
+
+def make_job(msm_id, hours, probes):
+    meta = AtlasResultsMeta(
+        MeasurementAF.IPv4,
+        MeasurementType.Ping,
+        msm_id,
+        START,
+        START + dt.timedelta(hours=hours),
+        False,
+    )
+    return FetchJob(meta, list(range(probes)))
+
+
+def test_largest_first():
+    jobs = [make_job(1, 1, 10), make_job(2, 24, 10), make_job(3, 1, 100)]
+    scheduler = FetchScheduler(jobs, ByteRates())
+    assert [scheduler.pop().meta.msm_id for _ in jobs] == [2, 3, 1]
+
+
+def test_rates():
+    rates = ByteRates()
+    rates.update(1, 100 * 10 * 3600, 10, 3600)
+    assert rates[1] == 100
+    # Unknown measurements get the median rate
+    assert rates[2] == 100
+
+    jobs = [make_job(1, 1, 10), make_job(2, 1, 10)]
+    rates.update(2, 10 * 10 * 3600, 10, 3600)
+    scheduler = FetchScheduler(jobs, rates)
+    assert scheduler.pop().meta.msm_id == 1
+
+
+def test_rates_file(tmp_path):
+    rates = ByteRates.load(tmp_path / "rates.json")
+    rates.update(1, 1000, 1, 1)
+    rates.save()
+    rates.update(1, 1000, 0, 1)
+    rates.save()
+    rates = ByteRates.load(tmp_path / "rates.json")
+    assert rates.rates == {1: 1000.0}
+    assert rates.totals == {1: 1000.0}
+
+
+def test_rates_all_probes():
+    rates = ByteRates()
+    rates.update(1, 10 * 3600, 10, 3600)
+    # Before any job of all the probes, DEFAULT_PROBES probes are assumed.
+    assert rates.total(1) == 1000 * 1
+    rates.update(1, 500 * 3600, 0, 3600)
+    assert rates.total(1) == 500
+    assert rates[1] == 1
+    job = make_job(1, 2, 0)
+    assert FetchScheduler([job], rates).cost(job) == 500 * 2 * 3600
+
+
+def windows(scheduler):
+    metas = sorted((x[2].meta for x in scheduler.queue), key=lambda m: m.start_date)
+    return [(m.msm_id, m.start_date - START, m.stop_date - START) for m in metas]
+
+
+def test_balance():
+    jobs = [make_job(1, 24, 10), make_job(2, 1, 10)]
+    scheduler = FetchScheduler(jobs, ByteRates())
+    assert scheduler.balance(4) == 2
+    assert len(scheduler) == 4
+
+    # Sub-windows are aligned on the hour, and do not overlap (the bounds are inclusive)
+    h, s = dt.timedelta(hours=1), dt.timedelta(seconds=1)
+    assert windows(scheduler) == [
+        (1, 0 * h, 6 * h),
+        (2, 0 * h, 1 * h),
+        (1, 6 * h + s, 12 * h),
+        (1, 12 * h + s, 24 * h),
+    ]
+
+
+def test_balance_existing(tmp_path):
+    job = make_job(1, 24, 10)
+    first = FetchScheduler([job], ByteRates())
+    first.balance(2)
+    # The output of the job exists: it is not split
+    (tmp_path / job.meta.filename).touch()
+    scheduler = FetchScheduler([job], ByteRates(), directory=tmp_path)
+    assert scheduler.balance(2) == 0
+    # The outputs of a previous split exist: the job is split the same way
+    (tmp_path / job.meta.filename).unlink()
+    (tmp_path / first.queue[0][2].meta.filename).touch()
+    scheduler = FetchScheduler([job], ByteRates(), directory=tmp_path)
+    assert windows(scheduler) == windows(first)
+
+
+def test_balance_min_window():
+    jobs = [make_job(1, 1, 10)]
+    scheduler = FetchScheduler(jobs, ByteRates())
+    assert scheduler.balance(4) == 0
+    assert len(scheduler) == 1
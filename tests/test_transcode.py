@@ -0,0 +1,72 @@
+from pathlib import Path
+
+from zstandard import ZstdCompressor
+
+from fetchmesh.commands import main
+from fetchmesh.io import AtlasRecordsReader, AtlasRecordsWriter, LogEntry
+from fetchmesh.transcode import transcode, transcoded_name
+
+RECORDS = [{"msm_id": 1001, "prb_id": i} for i in range(10)]
+
+
+def check(file):
+    with AtlasRecordsReader(file) as r:
+        assert list(r) == RECORDS
+    log = AtlasRecordsWriter(file).log_file.read_bytes()
+    assert len(log) == len(RECORDS) * LogEntry.size
+
+
+def test_transcode(tmp_path):
+    # Uncompressed file
+    file = tmp_path / "ping_v4_0_3600_1001.ndjson"
+    with AtlasRecordsWriter(file, log=True) as w:
+        w.writeall(RECORDS)
+    result = transcode(file)
+    assert result.status == "transcoded"
+    assert result.records == len(RECORDS)
+    assert result.dst == tmp_path / "ping_v4_0_3600_1001.ndjson.zst"
+    assert not file.exists() and not AtlasRecordsWriter(file).log_file.exists()
+    check(result.dst)
+
+    # Already compressed and indexed
+    assert transcode(result.dst).status == "skipped"
+    assert transcode(result.dst, level=19, force=True).status == "transcoded"
+    check(result.dst)
+
+    # Compressed as a single frame, without log
+    file = tmp_path / "ping_v4_0_3600_1002.ndjson.zst"
+    data = "".join(f'{{"msm_id": 1001, "prb_id": {i}}}\n' for i in range(10))
+    file.write_bytes(ZstdCompressor().compress(data.encode()))
+    assert transcode(file).dst == file
+    check(file)
+
+    # Invalid records are not dropped silently
+    file = tmp_path / "ping_v4_0_3600_1003.ndjson"
+    file.write_text('{"msm_id": 1001, "prb_id": 0}\n{"msm_id": 1001,\n')
+    result = transcode(file)
+    assert result.status == "failed"
+    assert result.error == "1 invalid records read"
+    assert file.exists() and not transcoded_name(file).exists()
+
+
+def test_transcode_command(runner):
+    src = Path("src")
+    src.mkdir()
+    for i in range(3):
+        with AtlasRecordsWriter(src / f"ping_v4_0_3600_{i}.ndjson") as w:
+            w.writeall(RECORDS)
+    runner.invoke(main, f"transcode --jobs 2 {src}")
+    files = sorted(src.glob("*"))
+    assert [x.name for x in files if x.suffix == ".zst"] == [
+        f"ping_v4_0_3600_{i}.ndjson.zst" for i in range(3)
+    ]
+    for file in files:
+        if file.suffix == ".zst":
+            check(file)
+
+    # The uncompressed file would overwrite the compressed one
+    with AtlasRecordsWriter(src / "ping_v4_0_3600_0.ndjson") as w:
+        w.writeall(RECORDS[:1])
+    runner.invoke(main, f"transcode --force {src}")
+    assert (src / "ping_v4_0_3600_0.ndjson").exists()
+    check(src / "ping_v4_0_3600_0.ndjson.zst")
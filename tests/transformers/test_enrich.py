@@ -0,0 +1,59 @@
+from radix import Radix
+
+from fetchmesh.bgp import PrefixTable
+from fetchmesh.peeringdb.objects import IX
+from fetchmesh.transformers import (
+    TracerouteEnrichTransformer,
+    TracerouteFlatIPTransformer,
+)
+
+
+def make_record(*addrs):
+    return {
+        "timestamp": 0,
+        "msm_id": 1,
+        "prb_id": 2,
+        "from": "",
+        "src_addr": "",
+        "dst_addr": "",
+        "paris_id": 0,
+        "result": [{"result": [{"from": addr} for addr in addrs] + [{}]}],
+    }
+
+
+def test_enrich():
+    ix = Radix()
+    ix.add("80.81.192.0/21").data["ix"] = IX(1, "DE-CIX Frankfurt")
+    asn = PrefixTable.from_prefixes([("8.8.8.0/24", [15169])])
+    transformer = TracerouteEnrichTransformer(asn=asn, ix=ix, cache_size=3)
+
+    records = [
+        make_record("8.8.8.8", "192.168.1.1", "80.81.192.1"),
+        make_record("8.8.8.8", "192.168.1.1", "invalid"),
+    ]
+    records = transformer.transform_batch(records)
+    replies = records[0]["result"][0]["result"]
+    assert replies[0] == {
+        "from": "8.8.8.8",
+        "asn": 15169,
+        "ix": None,
+        "private": False,
+    }
+    assert replies[1]["private"]
+    assert replies[2]["ix"] == "DE-CIX Frankfurt"
+    assert replies[3] == {}
+
+    # 4 distinct addresses, resolved once.
+    assert (transformer.hits, transformer.misses) == (0, 4)
+    assert len(transformer.cache) == 3
+
+    # The least recently used address (8.8.8.8) was evicted.
+    transformer.transform(make_record("192.168.1.1"))
+    assert (transformer.hits, transformer.misses) == (1, 4)
+
+
+def test_enrich_flat_ip():
+    enrich = TracerouteEnrichTransformer()
+    flat = TracerouteFlatIPTransformer(drop_private=True)
+    record = flat(enrich(make_record("8.8.8.8", "10.0.0.1")))
+    assert record["hops"] == [["8.8.8.8", None]]
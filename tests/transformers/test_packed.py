@@ -0,0 +1,42 @@
+import json
+from pathlib import Path
+
+from fetchmesh.transformers import (
+    PackedTraceroutes,
+    TracerouteFlatIPTransformer,
+    TraceroutePacker,
+)
+
+MOCKS = Path(__file__).parent.parent.parent / "fetchmesh" / "mocks"
+
+
+def traceroutes():
+    with (MOCKS / "results.ndjson").open() as f:
+        records = [json.loads(line) for line in f]
+    return [x for x in records if x["type"] == "traceroute"]
+
+
+def test_packer(tmp_path):
+    records = traceroutes()
+    packed = TraceroutePacker(chunk_size=100).pack(records)
+    assert len(packed) == len(records)
+    assert packed.hops.shape == (len(records), 32, 3)
+
+    # Same hops as the flat transformer (without padding).
+    for drop_private in (False, True):
+        flat = TracerouteFlatIPTransformer(
+            drop_dup=True, drop_late=True, drop_private=drop_private, insert_none=False
+        )
+        hops = packed.masked_hops(drop_private=drop_private)
+        for i, record in enumerate(records[:500]):
+            expected = [[x for x in hop[:3]] for hop in flat(record)["hops"][:32]]
+            actual = [
+                [x for x in hop if x]
+                for hop in packed.addresses(hops[i])[: len(expected)]
+            ]
+            assert actual == expected
+
+    packed.save(tmp_path / "packed.npz")
+    loaded = PackedTraceroutes.load(tmp_path / "packed.npz")
+    assert (loaded.hops == packed.hops).all()
+    assert loaded.table.addresses == packed.table.addresses